@@ -20,6 +20,34 @@ connect(config.MONGODB_DB, host=config.MONGODB_HOST + config.MONGODB_USERNAME +
 # Declare database for MongoEngine
 db = MongoEngine(app)
 
+# Create process-wide sentiment analysis pool (concurrency limit defined in config.py)
+from app.pool import AnalysisPool
+analysis_pool = AnalysisPool(config.ALCHEMY_THREAD_LIMIT)
+
+# Create process-wide sentiment result cache (size and TTL defined in config.py)
+from app.cache import SentimentCache
+sentiment_cache = SentimentCache(config.SENTIMENT_CACHE_SIZE, config.SENTIMENT_CACHE_TTL, config.SENTIMENT_BACKEND)
+
+# Create process-wide geocode cache (size and TTLs defined in config.py)
+from app.cache import GeocodeCache
+geocode_cache = GeocodeCache(config.GEOCODE_CACHE_SIZE, config.GEOCODE_CACHE_TTL, config.GEOCODE_NEGATIVE_TTL)
+
+# Create process-wide search results page cache (size and TTL defined in config.py)
+from app.cache import ResponseCache
+response_cache = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL)
+
+# Create process-wide pool of authenticated Twitter clients (size defined in config.py)
+from app.twitter_pool import TwitterPool, twitter_auth
+twitter_pool = TwitterPool(config.TWITTER_POOL_SIZE, twitter_auth)
+
+# Create upstream API rate limit scheduler (quotas defined in config.py)
+from app.scheduler import Scheduler
+scheduler = Scheduler(config.RATE_LIMITS, config.RATE_LIMIT_LOW_PRIORITY_RESERVE, config.RATE_LIMIT_MAX_WAIT)
+
+# Fail at startup if the configured sentiment backend (defined in config.py) doesn't exist
+from app.manager import check_backend
+check_backend()
+
 # Configure logging if not running in debug mode
 if config.DEBUG_MODE is False:
     import logging
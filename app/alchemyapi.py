@@ -133,12 +133,19 @@ class AlchemyAPI:
 
     s = requests.Session()
 
-    def __init__(self):
+    def __init__(self, transport=None):
         """	
         Initializes the SDK so it can send requests to AlchemyAPI for analysis.
         It loads the API key from alchemyapi_key.txt and configures the endpoints.
+
+        INPUT:
+        transport -> optional object with a post(endpoint, url, data) method returning a requests response, used
+        instead of the shared session, e.g. to add pooling, timeouts and retries. Exception types listed in its
+        optional passthrough_errors tuple are raised to the caller instead of being reported as network errors.
         """
 
+        self.transport = transport
+
         import sys
         try:
             # Open the key file and read the key
@@ -318,6 +325,100 @@ class AlchemyAPI:
         options['target'] = target
         return self.__analyze(AlchemyAPI.ENDPOINTS['sentiment_targeted'][flavor], {}, options)
 
+    # Prefix of the markers identifying each text in a combined document, followed by a fixed width number
+    # so no marker is a substring of another (e.g. the markers of texts 1 and 10)
+    BATCH_MARKER = 'TVDOC%04dX'
+
+    def sentiment_batch(self, texts, max_docs=20, max_chars=6000):
+        """
+        Calculates the sentiment for many short texts using as few requests as possible.
+        Texts are packed into combined documents, each text prefixed with a unique marker, and the targeted
+        sentiment of every marker is requested in a single call. This approximates the document sentiment of
+        each text, check it with validate_batch() before relying on it.
+        Texts whose marker is missing from a successful response fall back to a single document sentiment call.
+        When a combined request fails its texts get the error response, rather than being retried one by one.
+
+        INPUT:
+        texts -> list of texts to analyze.
+        max_docs -> maximum number of texts packed into one request.
+        max_chars -> maximum length of a combined document.
+
+        OUTPUT:
+        List of responses in the same order as texts, each shaped like the sentiment() response
+        (i.e. with 'docSentiment' 'type' and 'score'), or an error response.
+        """
+
+        results = [None] * len(texts)
+
+        # Pack texts into chunks of (index, text) pairs
+        chunks = []
+        chunk = []
+        size = 0
+        for i, text in enumerate(texts):
+            if chunk and (len(chunk) >= max_docs or size + len(text) > max_chars):
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+            chunk.append((i, text))
+            size += len(text) + 16
+        if chunk:
+            chunks.append(chunk)
+
+        for chunk in chunks:
+            if len(chunk) == 1:
+                i, text = chunk[0]
+                results[i] = self.sentiment('text', text, {})
+                continue
+
+            markers = dict((AlchemyAPI.BATCH_MARKER % n, i) for n, (i, text) in enumerate(chunk))
+            combined = '\n\n'.join('%s: %s' % (AlchemyAPI.BATCH_MARKER % n, text.replace('\n', ' '))
+                                    for n, (i, text) in enumerate(chunk))
+            response = self.__analyze(AlchemyAPI.ENDPOINTS['sentiment_targeted']['text'], {},
+                                      {'text': combined, 'targets': '|'.join(sorted(markers))})
+
+            if response.get('status') != 'OK':
+                for i, text in chunk:
+                    results[i] = response
+                continue
+
+            for result in response.get('results', []):
+                i = markers.get(str(result.get('text', '')).strip().upper())
+                if i is not None and 'sentiment' in result:
+                    results[i] = {'status': 'OK', 'docSentiment': result['sentiment']}
+
+        # Fall back to document sentiment for texts missing from successful batch responses
+        for i, text in enumerate(texts):
+            if results[i] is None:
+                results[i] = self.sentiment('text', text, {})
+
+        return results
+
+    def validate_batch(self, texts, max_docs=20):
+        """
+        Compares sentiment_batch() results to single document sentiment calls for a sample of texts.
+        Costs one request per text plus the batch requests.
+
+        INPUT:
+        texts -> sample of texts to compare.
+        max_docs -> maximum number of texts packed into one request.
+
+        OUTPUT:
+        Fraction of the texts both calls analyzed which were given the same sentiment type, or None if none were.
+        """
+
+        batch = self.sentiment_batch(texts, max_docs=max_docs)
+        single = [self.sentiment('text', text, {}) for text in texts]
+
+        compared = 0
+        agreed = 0
+        for a, b in zip(batch, single):
+            if 'docSentiment' in a and 'docSentiment' in b:
+                compared += 1
+                if a['docSentiment'].get('type') == b['docSentiment'].get('type'):
+                    agreed += 1
+
+        return float(agreed) / compared if compared else None
+
     def text(self, flavor, data, options={}):
         """
         Extracts the cleaned text (removes ads, navigation, etc.) for text, a URL or HTML.
@@ -746,7 +847,13 @@ class AlchemyAPI:
 
         results = ""
         try:
-            results = self.s.post(url=post_url, data=post_data)
+            if self.transport is not None:
+                results = self.transport.post(endpoint, post_url, post_data)
+            else:
+                results = self.s.post(url=post_url, data=post_data)
+        except getattr(self.transport, 'passthrough_errors', ()):
+            # Errors the injected transport raises for its caller, eg a call refused for lack of quota
+            raise
         except Exception as e:
             print(e)
             return {'status': 'ERROR', 'statusInfo': 'network-error'}
@@ -0,0 +1,408 @@
+from app.models import CachedSentiment, GeocodedPlace, Place, SearchState
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import re
+import threading
+
+
+# Retweet prefix and links, which differ between otherwise identical Tweets
+RETWEET_PATTERN = re.compile(r"^rt @\w+:\s*")
+URL_PATTERN = re.compile(r"https?://\S+")
+SPACE_PATTERN = re.compile(r"\s+")
+COMMA_PATTERN = re.compile(r"\s*,\s*")
+
+
+class LRU(object):
+    """
+    Thread safe in-process map which evicts its least recently used entry when full, with named hit/miss counters.
+    Used as the in-process tier of the caches below.
+    """
+
+    def __init__(self, max_size, counters):
+        """
+        :param max_size: Maximum number of entries held
+        :param counters: Names of the counters, including "misses"
+        """
+
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.counters = dict((name, 0) for name in counters)
+
+    def get(self, key, valid):
+        """
+        :param key: Entry key
+        :param valid: Function returning True if an entry hasn't expired
+        :return: The entry, or None if there is none or it has expired (expired entries are dropped)
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if not valid(entry):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        """
+        Adds an entry, evicting the least recently used entry when full.
+        """
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key, entry):
+        """
+        Drops an entry, unless it has been replaced since it was read.
+        """
+
+        with self.lock:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+
+    def count(self, **increments):
+        """
+        Adds to the named counters, eg count(hits=1).
+        """
+
+        with self.lock:
+            for name, increment in increments.items():
+                self.counters[name] += increment
+
+    def metrics(self, hits):
+        """
+        :param hits: Names of the counters counting hits
+        :return: Dictionary with size, counters and hit ratio
+        """
+
+        with self.lock:
+            found = sum(self.counters[name] for name in hits)
+            lookups = found + self.counters["misses"]
+            metrics = dict(self.counters, size=len(self.entries), max_size=self.max_size)
+            metrics["hit_ratio"] = float(found) / lookups if lookups else 0.0
+            return metrics
+
+
+def normalize_text(text):
+    """
+    Normalizes Tweet text so retweets and copies of the same Tweet share a cache entry.
+
+    :param text: Tweet text
+    :return: Lowercased text without retweet prefix, links or repeated whitespace
+    """
+
+    text = text.lower().strip()
+    text = RETWEET_PATTERN.sub("", text)
+    text = URL_PATTERN.sub("", text)
+    return SPACE_PATTERN.sub(" ", text).strip()
+
+
+class SentimentCache(object):
+    """
+    Two tier cache of sentiment results keyed by a hash of the normalized Tweet text.
+    An in-process LRU sits in front of a MongoDB collection shared by all processes.
+    """
+
+    def __init__(self, max_size, ttl, namespace):
+        """
+        :param max_size: Maximum number of entries held in the in-process tier
+        :param ttl: Seconds a cached result remains valid
+        :param namespace: Name of the sentiment backend, so results of different backends are kept apart
+        """
+
+        self.namespace = namespace
+        self.ttl = ttl
+        # Maps key to (sentiment type, sentiment score, stored at)
+        self.lru = LRU(max_size, ("memory_hits", "db_hits", "misses"))
+
+    def key(self, text):
+        """
+        :param text: Tweet text
+        :return: Cache key for the text
+        """
+
+        return hashlib.sha1((self.namespace + ":" + normalize_text(text)).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Looks up cached results, checking the in-process tier first and the database tier with a single query.
+
+        :param keys: Iterable of cache keys
+        :return: Dictionary mapping each found key to a (sentiment type, sentiment score) tuple
+        """
+
+        keys = set(keys)
+        found = {}
+        oldest = datetime.utcnow() - timedelta(seconds=self.ttl)
+
+        for key in keys:
+            entry = self.lru.get(key, lambda entry: entry[2] >= oldest)
+            if entry:
+                found[key] = entry[:2]
+        memory_hits = len(found)
+
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            try:
+                for cached in CachedSentiment.objects(key__in=remaining, stored_at__gte=oldest):
+                    found[cached.key] = (cached.sentiment_type, cached.sentiment_score)
+                    self.remember(cached.key, cached.sentiment_type, cached.sentiment_score, cached.stored_at)
+            except Exception:
+                # Database tier unavailable, treat as misses
+                pass
+
+        self.lru.count(memory_hits=memory_hits, db_hits=len(found) - memory_hits, misses=len(keys) - len(found))
+
+        return found
+
+    def set_many(self, results):
+        """
+        Stores results in both tiers.
+
+        :param results: Dictionary mapping cache key to a (sentiment type, sentiment score) tuple
+        """
+
+        if not results:
+            return
+
+        now = datetime.utcnow()
+
+        for key, (sentiment_type, sentiment_score) in results.items():
+            self.remember(key, sentiment_type, sentiment_score, now)
+
+        try:
+            bulk = CachedSentiment._get_collection().initialize_unordered_bulk_op()
+            for key, (sentiment_type, sentiment_score) in results.items():
+                bulk.find({"key": key}).upsert().update_one({"$set": {
+                    "sentiment_type": sentiment_type,
+                    "sentiment_score": sentiment_score,
+                    "stored_at": now
+                }})
+            bulk.execute()
+        except Exception:
+            # The in-process tier still holds the results
+            pass
+
+    def remember(self, key, sentiment_type, sentiment_score, stored_at):
+        """
+        Adds an entry to the in-process tier.
+        """
+
+        self.lru.put(key, (sentiment_type, sentiment_score, stored_at))
+
+    def metrics(self):
+        """
+        :return: Dictionary with cache size, hit/miss counters and hit ratio
+        """
+
+        return self.lru.metrics(("memory_hits", "db_hits"))
+
+
+def normalize_place(place_name):
+    """
+    Normalizes a place name so different spellings of the same search share a cache entry.
+
+    :param place_name: Place name, eg " San Francisco ,CA"
+    :return: Lowercased place name with consistent spacing and punctuation, eg "san francisco, ca"
+    """
+
+    place_name = SPACE_PATTERN.sub(" ", place_name.lower())
+    place_name = COMMA_PATTERN.sub(", ", place_name)
+    return place_name.strip(" ,.")
+
+
+class GeocodeCache(object):
+    """
+    Two tier cache of geocoding results keyed by normalized place name.
+    An in-process LRU sits in front of a MongoDB collection shared by all processes.
+    Unknown places are cached too, with their own (usually shorter) TTL.
+    """
+
+    def __init__(self, max_size, ttl, negative_ttl):
+        """
+        :param max_size: Maximum number of entries held in the in-process tier
+        :param ttl: Seconds a found place remains valid
+        :param negative_ttl: Seconds an unknown place remains valid
+        """
+
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Maps normalized place name to (Place or None, stored at)
+        self.lru = LRU(max_size, ("memory_hits", "db_hits", "misses"))
+
+    def valid(self, place, stored_at):
+        """
+        :return: True if an entry stored at the given time hasn't expired
+        """
+
+        ttl = self.ttl if place is not None else self.negative_ttl
+        return stored_at >= datetime.utcnow() - timedelta(seconds=ttl)
+
+    def lookup(self, place_name, geocode):
+        """
+        Gets a place from the cache, geocoding and caching it on a miss.
+        Errors raised by 'geocode' are not cached.
+
+        :param place_name: Place name entered by user
+        :param geocode: Function geocoding a normalized place name, returning an object with latitude,
+            longitude and address attributes, or None if the place is unknown
+        :return: Place, or None if the place is unknown
+        """
+
+        key = normalize_place(place_name)
+
+        entry = self.lru.get(key, lambda entry: self.valid(*entry))
+        if entry:
+            self.lru.count(memory_hits=1)
+            return entry[0]
+
+        try:
+            cached = GeocodedPlace.objects(name=key).first()
+        except Exception:
+            # Database tier unavailable, treat as a miss
+            cached = None
+
+        if cached:
+            place = Place(cached.latitude, cached.longitude, cached.address) if cached.found else None
+            if self.valid(place, cached.stored_at):
+                self.remember(key, place, cached.stored_at)
+                self.lru.count(db_hits=1)
+                return place
+
+        self.lru.count(misses=1)
+
+        location = geocode(key)
+        place = Place(float(location.latitude), float(location.longitude), location.address) if location else None
+        now = datetime.utcnow()
+        self.remember(key, place, now)
+
+        try:
+            GeocodedPlace.objects(name=key).update_one(
+                upsert=True,
+                set__found=place is not None,
+                set__latitude=place.latitude if place else None,
+                set__longitude=place.longitude if place else None,
+                set__address=place.address if place else None,
+                set__stored_at=now
+            )
+        except Exception:
+            # The in-process tier still holds the result
+            pass
+
+        return place
+
+    def remember(self, key, place, stored_at):
+        """
+        Adds an entry to the in-process tier.
+        """
+
+        self.lru.put(key, (place, stored_at))
+
+    def metrics(self):
+        """
+        :return: Dictionary with cache size, hit/miss counters and hit ratio
+        """
+
+        return self.lru.metrics(("memory_hits", "db_hits"))
+
+
+class ResponseCache(object):
+    """
+    In-process cache of rendered search results pages keyed by (keyword, location, count).
+    Each entry records the generation of its search when it was rendered (see manager.bump_generations),
+    so pages are dropped as soon as any process stores new Tweets for the search.
+    Pages are served as rendered, so their search time and relative time labels are up to 'ttl' seconds old.
+    """
+
+    def __init__(self, max_size, ttl):
+        """
+        :param max_size: Maximum number of pages held
+        :param ttl: Seconds a page remains valid
+        """
+
+        self.ttl = ttl
+        # Maps key to (body, ETag, keyword, location address, generation, stored at)
+        self.lru = LRU(max_size, ("hits", "misses", "invalidations", "not_modified"))
+
+    def generation(self, keyword, location_address=None):
+        """
+        :param keyword: A given search keyword
+        :param location_address: A given location address (optional)
+        :return: Current generation of the search, or None if it couldn't be read
+        """
+
+        try:
+            state = SearchState.objects(keyword_search_term=keyword, location_address=location_address) \
+                .only("generation").first()
+        except Exception:
+            return None
+
+        if state is None:
+            return 0
+        return state.generation or 0
+
+    def get(self, key):
+        """
+        :param key: Tuple of keyword, location search term and count
+        :return: Tuple with the cached page and its ETag, or None
+        """
+
+        oldest = datetime.utcnow() - timedelta(seconds=self.ttl)
+
+        entry = self.lru.get(key, lambda entry: entry[5] >= oldest)
+        if entry is None:
+            self.lru.count(misses=1)
+            return None
+
+        # Check no new Tweets were stored for the search since the page was rendered
+        generation = self.generation(entry[2], entry[3])
+
+        if generation is None or generation != entry[4]:
+            self.lru.discard(key, entry)
+            self.lru.count(invalidations=1, misses=1)
+            return None
+
+        self.lru.count(hits=1)
+        return entry[0], entry[1]
+
+    def set(self, key, body, keyword, location_address, generation):
+        """
+        Adds a page, evicting the least recently used page when full.
+
+        :param key: Tuple of keyword, location search term and count
+        :param body: Rendered page
+        :param keyword: Search keyword the page shows results for
+        :param location_address: Location address the page shows results for, or None
+        :param generation: Generation of the search read before the page was rendered
+        :return: ETag of the page
+        """
+
+        etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+        # Pages whose generation couldn't be read can't be invalidated, don't keep them
+        if generation is None:
+            return etag
+
+        self.lru.put(key, (body, etag, keyword, location_address, generation, datetime.utcnow()))
+        return etag
+
+    def record_not_modified(self):
+        """
+        Counts a repeat request answered with 304 Not Modified.
+        """
+
+        self.lru.count(not_modified=1)
+
+    def metrics(self):
+        """
+        :return: Dictionary with cache size, hit/miss counters and hit ratio
+        """
+
+        return self.lru.metrics(("hits",))
@@ -1,6 +1,11 @@
 from mongoengine import *
 from app.models import *
+from app.rollup import day_of
+from app.series import sentiment_series, series_averages, chart_points
+from app.timeago import time_ago_labels
+from array import array
 from datetime import datetime, timedelta
+import config
 
 
 def tweet_collection_size():
@@ -8,7 +13,23 @@ def tweet_collection_size():
     :return: Number total number of documents in the database's Tweet collection
     """
 
-    return len(Tweet.objects())
+    return Tweet.objects().count()
+
+
+def search_match(search_term, location=None):
+    """
+    Builds a raw MongoDB query matching a given search_term (and location, if provided).
+
+    :param search_term: A given search term
+    :param location: A given location address (optional)
+    :return: Dictionary for use in 'find' queries or a '$match' aggregation stage
+    """
+
+    match = {"keyword_search_term": search_term}
+    if location:
+        match["location_address"] = location
+
+    return match
 
 
 def count_tweets(search_term, location=None):
@@ -21,9 +42,74 @@ def count_tweets(search_term, location=None):
     """
 
     if location:
-        return len(Tweet.objects(Q(keyword_search_term=search_term) & Q(location_address=location)))
+        return Tweet.objects(Q(keyword_search_term=search_term) & Q(location_address=location)).count()
     else:
-        return len(Tweet.objects(keyword_search_term=search_term))
+        return Tweet.objects(keyword_search_term=search_term).count()
+
+
+def get_historical_groups(search_term, location=None):
+    """
+    Counts and sums sentiment scores for each sentiment type of a keyword (restricted within a location, if provided).
+    Calculated server side with a single aggregation.
+
+    :param search_term: A given search term
+    :param location: A given location address (optional)
+    :return: Dictionary mapping sentiment type to a dictionary with 'count' and 'total' score
+    """
+
+    # Get raw PyMongo collection
+    collection = Tweet._get_collection()
+
+    # Count and sum tweets of each sentiment type in one round trip
+    result = collection.aggregate([
+        {
+            "$match": search_match(search_term, location)
+        },
+        {
+            "$group":
+                {
+                    "_id": "$sentiment_type",
+                    "count":
+                    {
+                        "$sum": 1
+                    },
+                    "total":
+                    {
+                        "$sum": "$sentiment_score"
+                    }
+                }
+        }
+    ])
+
+    return dict((i['_id'], {"count": i['count'], "total": i['total']}) for i in result['result'])
+
+
+def historical_sentiment_from_groups(groups):
+    """
+    :param groups: Sentiment groups as returned by 'get_historical_groups'
+    :return: List with number of positive, negative and neutral results
+    """
+
+    def count(sentiment_type):
+        return groups.get(sentiment_type, {}).get("count", 0)
+
+    return [["Positive", count("positive")], ["Neutral", count("neutral")], ["Negative", count("negative")]]
+
+
+def historical_avg_from_groups(groups):
+    """
+    :param groups: Sentiment groups as returned by 'get_historical_groups'
+    :return: Average sentiment score across all groups
+    """
+
+    count = sum(group["count"] for group in groups.values())
+    total = sum(group["total"] for group in groups.values())
+
+    # Calculate average
+    avg = total / count
+    avg = float("{0:.2f}".format((float(avg))))
+
+    return avg
 
 
 def get_historical_sentiment(search_term, location=None):
@@ -35,17 +121,7 @@ def get_historical_sentiment(search_term, location=None):
     :return: List with number of positive, negative and neutral results matching the query parameters
     """
 
-    if location:
-        positive = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(location_address=location) & Q(sentiment_type="positive")))
-        negative = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(location_address=location) & Q(sentiment_type="negative")))
-        neutral = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(location_address=location) & Q(sentiment_type="neutral")))
-    else:
-        positive = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(sentiment_type="positive")))
-        negative = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(sentiment_type="negative")))
-        neutral = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(sentiment_type="neutral")))
-
-    result = [["Positive", positive], ["Neutral", neutral], ["Negative", negative]]
-    return result
+    return historical_sentiment_from_groups(get_historical_groups(search_term, location))
 
 
 def get_historical_sentiment_avg(search_term, location=None):
@@ -57,86 +133,120 @@ def get_historical_sentiment_avg(search_term, location=None):
     :return: Average sentiment score for all tweets matching the query parameters
     """
 
-    total = 0
+    return historical_avg_from_groups(get_historical_groups(search_term, location))
 
-    if location:
-        tweets = Tweet.objects(Q(keyword_search_term=search_term) & Q(location_address=location))
-        count = len(tweets)
-    else:
-        tweets = Tweet.objects(Q(keyword_search_term=search_term))
-        count = len(tweets)
 
-    for tweet in tweets:
-        total += tweet.sentiment_score
+# Small-int codes of sentiment types in a SentimentFrame, in the order counts are reported
+SENTIMENT_CODES = {"positive": 0, "neutral": 1, "negative": 2}
 
-    # Calculate average
-    avg = total / count
-    avg = float("{0:.2f}".format((float(avg))))
 
-    return avg
+class SentimentFrame(object):
+    """
+    Columnar copy of the sentiment of a result set, built in a single pass over the results.
+    Scores are held in a double array and sentiment types as small-int codes, so every statistic
+    on the results page is computed over the arrays rather than by iterating the results again.
+    """
+
+    def __init__(self, tweets):
+        """
+        :param tweets: Iterable of pre-analyzed Tweets
+        """
+
+        self.scores = array("d")
+        self.codes = array("b")
+
+        for tweet in tweets:
+            self.scores.append(tweet.sentiment_score)
+            # Anything that isn't positive or negative counts as neutral
+            self.codes.append(SENTIMENT_CODES.get(tweet.sentiment_type, 1))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def aggregate(self):
+        """
+        :return: List with number of positive, neutral and negative Tweets
+        """
+
+        return [["Positive", self.codes.count(0)], ["Neutral", self.codes.count(1)],
+                ["Negative", self.codes.count(2)]]
+
+    def mean(self):
+        """
+        :return: Average sentiment score, to 2 decimal places
+        """
+
+        avg = sum(self.scores) / len(self.scores)
+        return float("{0:.2f}".format((float(avg))))
+
+    def statistics(self, sentiment_aggregate_list=None):
+        """
+        :param sentiment_aggregate_list: Result of 'aggregate', if already calculated (optional)
+        :return: Dictionary with total number of tweets and percentage break down of sentiment types
+        """
+
+        if sentiment_aggregate_list is None:
+            sentiment_aggregate_list = self.aggregate()
+
+        total = len(self)
+        positive_percentage = float("{0:.2f}".format((float(sentiment_aggregate_list[0][1]/total*100))))
+        neutral_percentage = float("{0:.2f}".format((float(sentiment_aggregate_list[1][1]/total*100))))
+        negative_percentage = float("{0:.2f}".format((float(sentiment_aggregate_list[2][1]/total*100))))
+
+        result = {"%Positive": positive_percentage, "%Neutral": neutral_percentage, "%Negative": negative_percentage, "Total": total}
+        return result
+
+    def predominant(self):
+        """
+        :return: The predominant sentiment type of the results
+        """
+
+        return predominant_sentiment(self.aggregate())
+
+
+def sentiment_frame(tweets):
+    """
+    :param tweets: A query set of pre-analyzed Tweets, or a SentimentFrame
+    :return: SentimentFrame of the Tweets, reusing the given one
+    """
+
+    if isinstance(tweets, SentimentFrame):
+        return tweets
+    return SentimentFrame(tweets)
 
 
 def get_query_sentiment_avg(tweets):
     """
     Calculates the average sentiment score in a given query set of Tweets.
 
-    :param tweets: A query set of tweet data
+    :param tweets: A query set of tweet data, or a SentimentFrame
     :return: The average sentiment score in the query set
     """
 
-    total = 0
-    count = len(tweets)
-
-    for tweet in tweets:
-        total += tweet.sentiment_score
-
-    # Calculate average
-    avg = total / count
-    avg = float("{0:.2f}".format((float(avg))))
-
-    return avg
+    return sentiment_frame(tweets).mean()
 
 
 def get_query_statistics(tweets, sentiment_aggregate_list):
     """
     Generates basic statistics for a given query set of Tweets.
 
-    :param tweets: A query set of Tweets
+    :param tweets: A query set of Tweets, or a SentimentFrame
     :param sentiment_aggregate_list: A list with number of positive, negative and neutral Tweets in the query set
     :return: Dictionary with total number of tweets and percentage break down of sentiment types
     """
 
-    total = len(tweets)
-    positive_percentage = float("{0:.2f}".format((float(sentiment_aggregate_list[0][1]/total*100))))
-    neutral_percentage = float("{0:.2f}".format((float(sentiment_aggregate_list[1][1]/total*100))))
-    negative_percentage = float("{0:.2f}".format((float(sentiment_aggregate_list[2][1]/total*100))))
-
-    result = {"%Positive": positive_percentage, "%Neutral": neutral_percentage, "%Negative": negative_percentage, "Total": total}
-    return result
+    return sentiment_frame(tweets).statistics(sentiment_aggregate_list)
 
 
 def aggregate_sentiment(tweets):
     """
     Aggregates sentiment types for a given tweet collection.
 
-    :param tweets: A query set of pre-analyzed Tweets
+    :param tweets: A query set of pre-analyzed Tweets, or a SentimentFrame
     :return: List with number of positive, negative and neutral Tweets
     """
 
-    positive = 0
-    negative = 0
-    neutral = 0
-
-    for tweet in tweets:
-        if tweet.sentiment_type == "positive":
-            positive += 1
-        elif tweet.sentiment_type == "negative":
-            negative += 1
-        else:
-            neutral += 1
-
-    result = [["Positive", positive], ["Neutral", neutral], ["Negative", negative]]
-    return result
+    return sentiment_frame(tweets).aggregate()
 
 
 def predominant_sentiment(sentiment_aggregate_list):
@@ -162,105 +272,76 @@ def predominant_sentiment(sentiment_aggregate_list):
         return "mixed"
 
 
-def get_sentiment_overtime(keyword, location=None):
+def get_sentiment_overtime(keyword, location=None, granularity="day", periods=10, tz_offset=None):
     """
-    Gets sentiment statistics for average sentiment for a given keyword (and location, if specified) over the past 10 days.
+    Gets average sentiment for a given keyword (and location, if specified) over time, by default over the past 10 days.
+    Every bucket of the window is included, in order, with an average of None when it has no Tweets.
 
     :param keyword: A given search keyword
     :param location: A given location address (optional)
-    :return: List containing results
+    :param granularity: "hour", "day" or "week"
+    :param periods: Number of buckets
+    :param tz_offset: Offset from UTC in minutes the buckets are aligned to (optional, defined in config.py)
+    :return: List of [label, average score] pairs
     """
 
-    # Get date 10 days ago
-    ten_days_ago = datetime.now() - timedelta(days=10)
-
-    # Get raw PyMongo collection
-    collection = Tweet._get_collection()
-
-    if location:
-        match = {
-            "$match":
-                {
-                    "keyword_search_term": keyword,
-                    "location_address": location,
-                    "tweet_time": {"$gt": ten_days_ago}
-                }
-            }
-    else:
-        match = {
-            "$match":
-                {
-                    "keyword_search_term": keyword,
-                    "tweet_time": {"$gt": ten_days_ago}
-                }
-            }
-
-    project = {
-            "$project":
-                {
-                    "sentiment_score": 1,
-                    "day":
-                    {
-                        "$substr": ["$tweet_time", 0, 10]
-                    }
-                }
-            }
+    if tz_offset is None:
+        tz_offset = config.SENTIMENT_SERIES_TZ_OFFSET
 
-    group = {
-            "$group":
-                {
-                    "_id": "$day",
-                    "average":
-                    {
-                        "$avg": "$sentiment_score"
-                    }
-                }
-            }
-
-    limit = {"$limit": 10}
-
-    # Perform aggregate query
-    result = collection.aggregate([match, project, group, limit])
-
-    # Add query results to list
-    l = []
-    for i in result['result']:
-        average = "{0:.2f}".format(i['average'])
-        t = [i['_id'], average]
-        l.append(t)
-
-    return l
+    series = sentiment_series(search_match(keyword, location), granularity, periods, tz_offset)
+    return series_averages(series, granularity)
 
 
 def get_sentiment_trends(order):
     """
     Gets the top 10 most positive / negative sentiment triggers from the past 7 days.
+    Reads the pre-aggregated daily rollups rather than raw Tweets.
 
     :param order: Indicate whether to return most positive (-1) or most negative (1) tweets
     :return: Query set of results
     """
 
-    # Get date seven days ago
-    seven_days_ago = datetime.now() - timedelta(days=7)
+    # Get start of the day seven days ago
+    seven_days_ago = day_of(datetime.now() - timedelta(days=7))
 
     # Get raw PyMongo collection
-    collection = Tweet._get_collection()
+    collection = SentimentRollup._get_collection()
 
     # Perform aggregate query
     result = collection.aggregate([
         {
             "$match":
                 {
-                    "tweet_time": {"$gt": seven_days_ago}
+                    "day": {"$gte": seven_days_ago}
                 }
         },
         {
             "$group":
                 {
                     "_id": "$keyword_search_term",
+                    "count":
+                    {
+                        "$sum": "$count"
+                    },
+                    "total":
+                    {
+                        "$sum": "$total_score"
+                    }
+                }
+        },
+        {
+            # Rollups emptied by a reconcile have no average
+            "$match":
+                {
+                    "count": {"$gt": 0}
+                }
+        },
+        {
+            "$project":
+                {
                     "average":
                     {
-                        "$avg": "$sentiment_score"
+                        "$divide": ["$total", "$count"]
                     }
                 }
         },
@@ -275,4 +356,128 @@ def get_sentiment_trends(order):
         }
     ])
 
-    return result
\ No newline at end of file
+    return result
+
+
+def refresh_trends_snapshot():
+    """
+    Recomputes the materialized top 10 positive / negative sentiment trends and releases the refresh claim.
+
+    :return: The new trends snapshot
+    """
+
+    positive = list(get_sentiment_trends(-1)['result'])
+    negative = list(get_sentiment_trends(1)['result'])
+
+    TrendsSnapshot.objects(name="trends").update_one(
+        upsert=True,
+        set__positive=positive,
+        set__negative=negative,
+        set__computed_at=datetime.utcnow(),
+        set__pending_tweets=0,
+        set__refreshing_until=None
+    )
+
+    return TrendsSnapshot.objects(name="trends").first()
+
+
+def claim_trends_refresh():
+    """
+    Atomically claims the trends snapshot refresh, so only one process recomputes an expired snapshot.
+    A claim lapses after TRENDS_REFRESH_CLAIM_TIMEOUT seconds (defined in config.py) in case its holder dies.
+
+    :return: True if this process should refresh the snapshot
+    """
+
+    from pymongo.errors import DuplicateKeyError
+
+    now = datetime.utcnow()
+
+    try:
+        result = TrendsSnapshot._get_collection().update(
+            {"name": "trends", "$or": [{"refreshing_until": None}, {"refreshing_until": {"$lt": now}}]},
+            {"$set": {"refreshing_until": now + timedelta(seconds=config.TRENDS_REFRESH_CLAIM_TIMEOUT)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The snapshot exists and another process holds the claim
+        return False
+
+    return result['n'] == 1
+
+
+def get_trends_snapshot():
+    """
+    Gets the materialized sentiment trends. Once they are older than the configured TTL, or once enough new Tweets
+    have been ingested since they were computed, the first request to claim the refresh recomputes them while
+    concurrent requests keep serving the previous snapshot.
+
+    :return: Trends snapshot with 'positive' and 'negative' result lists
+    """
+
+    snapshot = TrendsSnapshot.objects(name="trends").first()
+    computed = snapshot is not None and snapshot.computed_at is not None
+
+    if not computed or snapshot.age() > config.TRENDS_SNAPSHOT_TTL \
+            or snapshot.pending_tweets >= config.TRENDS_SNAPSHOT_THRESHOLD:
+        if claim_trends_refresh():
+            snapshot = refresh_trends_snapshot()
+        elif not computed:
+            # Another request is computing the very first snapshot, compute these results without storing them
+            snapshot = TrendsSnapshot(name="trends", positive=list(get_sentiment_trends(-1)['result']),
+                                      negative=list(get_sentiment_trends(1)['result']),
+                                      computed_at=datetime.utcnow())
+
+    return snapshot
+
+
+class SearchSummary(object):
+    """
+    All statistics shown on the search results page, computed from one historical aggregation,
+    one time series aggregation and a single fetch of the current results.
+    """
+
+    def __init__(self, keyword, results, location=None):
+        """
+        :param keyword: A given search keyword
+        :param results: Current search results (TweetRow or Tweet objects)
+        :param location: A given location address (optional)
+        """
+
+        # Fetch current results once so the statistics below don't re-execute a query
+        self.results = list(results)
+
+        # Historical counts and average from a single aggregation
+        groups = get_historical_groups(keyword, location)
+        self.hist_data = historical_sentiment_from_groups(groups)
+        self.hist_avg = historical_avg_from_groups(groups)
+        self.dom_sentiment = predominant_sentiment(self.hist_data)
+
+        # Daily average sentiment of the past 10 days, charted for the days with Tweets
+        self.overtime_data = chart_points(get_sentiment_overtime(keyword, location))
+
+        # Current result statistics, all computed from one columnar copy of the results
+        self.frame = SentimentFrame(self.results)
+        self.search_aggregate = self.frame.aggregate()
+        self.search_avg = self.frame.mean()
+        self.search_stats = self.frame.statistics(self.search_aggregate)
+
+        # Relative time labels of the current results, in result order
+        self.time_ago = time_ago_labels([tweet.tweet_time for tweet in self.results])
+
+    def context(self):
+        """
+        :return: Dictionary of template variables for the search results page
+        """
+
+        return {
+            "results": self.results,
+            "search_aggregate": self.search_aggregate,
+            "search_avg": self.search_avg,
+            "search_stats": self.search_stats,
+            "dom_sentiment": self.dom_sentiment,
+            "hist_data": self.hist_data,
+            "hist_avg": self.hist_avg,
+            "overtime_data": self.overtime_data,
+            "time_ago": self.time_ago
+        }
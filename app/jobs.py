@@ -0,0 +1,90 @@
+from app import app, manager, helper
+from app.models import SearchJob, Tweet
+from datetime import datetime, timedelta
+import time
+import config
+
+
+def claim_job():
+    """
+    Atomically claims the oldest queued job, or a running job abandoned by a worker which died.
+
+    :return: Claimed job, or None if there is nothing to do
+    """
+
+    now = datetime.utcnow()
+    abandoned = now - timedelta(seconds=config.JOB_TIMEOUT)
+
+    document = SearchJob._get_collection().find_and_modify(
+        query={"$or": [{"status": "queued"}, {"status": "running", "heartbeat_at": {"$lt": abandoned}}]},
+        update={"$set": {"status": "running", "started_at": now, "heartbeat_at": now}},
+        sort=[("created_at", 1)],
+        new=True
+    )
+
+    if document is None:
+        return None
+
+    return SearchJob.objects(id=document['_id']).first()
+
+
+def run_job(job):
+    """
+    Runs a queued search, recording progress so any dyno can report the job's status.
+    Each progress update also refreshes the job's heartbeat, so long searches aren't reclaimed by another worker.
+
+    :param job: Claimed job
+    """
+
+    def progress(analyzed, total, tweet_ids):
+        SearchJob.objects(id=job.id).update_one(set__analyzed=analyzed, set__total=total,
+                                                push_all__tweet_ids=tweet_ids, set__heartbeat_at=datetime.utcnow())
+
+    try:
+        location = None
+        if job.location_search_term:
+            location = manager.get_geo_info(job.location_search_term)
+            SearchJob.objects(id=job.id).update_one(
+                set__location_address=location.address,
+                set__location_latitude=float(location.latitude),
+                set__location_longitude=float(location.longitude)
+            )
+        manager.run_search(job.keyword, job.count, location, job.location_search_term, progress)
+    except Exception as e:
+        app.logger.warning("Search job %s failed: %s", job.id, e)
+        job.reload()
+        # Complete with the Tweets saved before the failure, or stored results when out of upstream quota
+        if saved_tweets(job) > 0 or \
+                (str(e) in manager.RATE_LIMIT_ERRORS and helper.count_tweets(job.keyword, job.location_address) > 0):
+            status = "done"
+        else:
+            status = "failed"
+        SearchJob.objects(id=job.id).update_one(set__status=status, set__error=str(e),
+                                                set__finished_at=datetime.utcnow())
+    else:
+        SearchJob.objects(id=job.id).update_one(set__status="done", set__finished_at=datetime.utcnow())
+
+
+def saved_tweets(job):
+    """
+    :param job: Search job
+    :return: Number of the Tweets found by the job which were analyzed and saved
+    """
+
+    if not job.tweet_ids:
+        return 0
+
+    return Tweet.objects(tweet_id__in=job.tweet_ids).count()
+
+
+def run():
+    """
+    Background worker loop, runs queued searches one at a time.
+    """
+
+    while True:
+        job = claim_job()
+        if job is None:
+            time.sleep(config.JOB_POLL_INTERVAL)
+        else:
+            run_job(job)
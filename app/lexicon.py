@@ -0,0 +1,77 @@
+import math
+import re
+
+
+# Word valence scores (-4 very negative to +4 very positive), in the style of the AFINN word list
+WORDS = {
+    "abandon": -2, "abuse": -3, "accept": 1, "admire": 3, "adore": 3, "afraid": -2, "agree": 1, "alarm": -2,
+    "amazing": 4, "angry": -3, "annoy": -2, "annoyed": -2, "annoying": -2, "anxious": -2, "appreciate": 2,
+    "awesome": 4, "awful": -3, "bad": -3, "beautiful": 3, "best": 3, "better": 2, "bitter": -2, "bless": 2,
+    "blessed": 3, "bored": -2, "boring": -3, "brilliant": 4, "broken": -1, "calm": 2, "cancel": -1,
+    "care": 2, "celebrate": 3, "cheer": 2, "clean": 2, "clever": 2, "comfortable": 2, "confused": -2,
+    "congrats": 2, "congratulations": 2, "cool": 1, "crap": -3, "crash": -2, "crazy": -2, "crisis": -3,
+    "cry": -1, "cute": 2, "damn": -4, "danger": -2, "dead": -3, "death": -2, "delay": -1, "delight": 3,
+    "delighted": 3, "depressed": -2, "destroy": -3, "die": -3, "disappoint": -2, "disappointed": -2,
+    "disappointing": -2, "disaster": -2, "disgusting": -3, "dislike": -2, "dreadful": -3, "easy": 1,
+    "enjoy": 2, "excellent": 3, "excited": 3, "exciting": 3, "fail": -2, "failed": -2, "failure": -2,
+    "fair": 2, "fake": -3, "fantastic": 4, "fear": -2, "fine": 2, "free": 1, "fresh": 1, "friendly": 2,
+    "fun": 4, "funny": 4, "glad": 3, "good": 3, "gorgeous": 3, "great": 3, "greatest": 3, "grief": -2,
+    "happy": 3, "hate": -3, "hated": -3, "hates": -3, "healthy": 2, "help": 2, "helpful": 2, "hero": 2,
+    "honest": 2, "hope": 2, "hopeful": 2, "horrible": -3, "hurt": -2, "ill": -2, "incredible": 3,
+    "injured": -2, "inspiring": 3, "interesting": 2, "joy": 3, "kill": -3, "killed": -3, "kind": 2,
+    "lame": -2, "laugh": 1, "lol": 3, "lose": -3, "loser": -3, "loss": -3, "lost": -3, "love": 3,
+    "loved": 3, "lovely": 3, "loves": 3, "luck": 3, "lucky": 3, "mad": -3, "mess": -2, "miss": -2,
+    "mistake": -2, "nice": 3, "outstanding": 4, "pain": -2, "panic": -3, "perfect": 3, "pleasant": 3,
+    "please": 1, "pleased": 3, "poor": -2, "popular": 3, "positive": 2, "pretty": 1, "problem": -2,
+    "proud": 2, "rage": -2, "recommend": 2, "regret": -2, "rich": 2, "rude": -2, "sad": -2, "safe": 1,
+    "scared": -2, "scary": -2, "shame": -2, "shit": -4, "sick": -2, "smart": 1, "smile": 2, "sorry": -1,
+    "stupid": -2, "success": 2, "successful": 3, "suck": -3, "sucks": -3, "super": 3, "support": 2,
+    "sweet": 2, "terrible": -3, "terrific": 4, "thank": 2, "thanks": 2, "tired": -2, "top": 2,
+    "tragedy": -2, "trouble": -2, "ugly": -3, "unhappy": -2, "upset": -2, "useful": 2, "useless": -2,
+    "victory": 3, "violence": -3, "war": -2, "weak": -2, "welcome": 2, "win": 4, "winner": 4, "wins": 4,
+    "won": 3, "wonderful": 4, "worried": -3, "worse": -3, "worst": -3, "worthless": -2, "wow": 4,
+    "wrong": -2, "yay": 2, "yes": 1
+}
+
+# Words which flip the valence of the word that follows them
+NEGATIONS = set(["not", "no", "never", "dont", "don't", "isnt", "isn't", "cant", "can't", "wont", "won't",
+                 "didnt", "didn't", "doesnt", "doesn't", "aint", "ain't"])
+
+# Normalized scores with a smaller magnitude than this are classed as neutral
+NEUTRAL_THRESHOLD = 0.05
+
+# Normalization constant, approximates the maximum expected summed valence of a Tweet
+ALPHA = 15
+
+TOKEN_PATTERN = re.compile(r"[a-z']+")
+
+
+def score_texts(texts):
+    """
+    Scores a batch of texts in a single pass using the word valence lexicon.
+
+    :param texts: List of texts
+    :return: List of AlchemyAPI style responses, eg {"docSentiment": {"type": "positive", "score": 0.43}}
+    """
+
+    results = []
+
+    for text in texts:
+        total = 0
+        negate = False
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            valence = WORDS.get(token, 0)
+            total += -valence if negate else valence
+            negate = token in NEGATIONS
+
+        # Normalize summed valence into the range -1 to 1
+        score = total / math.sqrt(total * total + ALPHA)
+
+        if score >= NEUTRAL_THRESHOLD:
+            results.append({"docSentiment": {"type": "positive", "score": score}})
+        elif score <= -NEUTRAL_THRESHOLD:
+            results.append({"docSentiment": {"type": "negative", "score": score}})
+        else:
+            results.append({"docSentiment": {"type": "neutral"}})
+
+    return results
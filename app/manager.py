@@ -1,109 +1,185 @@
-from twython import Twython, TwythonAuthError
 from app.alchemyapi import AlchemyAPI
-from app.models import Tweet
-from datetime import datetime
+from app.transport import HTTPTransport, CallRejected
+from app import lexicon
+from app.models import Tweet, TrendsSnapshot, SearchState, StreamCheckpoint, BatchValidation
+from app.rollup import update_rollups
+from app.scheduler import RateLimitExceeded
+from app.helper import search_match
+from app import app, analysis_pool, sentiment_cache, geocode_cache, twitter_pool, scheduler
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import wait, FIRST_COMPLETED
+from functools import partial
+from datetime import datetime, timedelta
+import threading
 import config
 
 
+def existing_tweet_ids(tweet_ids):
+    """
+    Finds which of the given Tweet ids are already stored, using a single projected query.
+
+    :param tweet_ids: List of Tweet ids
+    :return: Set of Tweet ids already in the database
+    """
+
+    if not tweet_ids:
+        return set()
+
+    return set(Tweet.objects(tweet_id__in=list(tweet_ids)).scalar('tweet_id'))
+
+
+def filter_new_statuses(statuses):
+    """
+    Removes statuses already stored in the database from a list of raw Twitter statuses.
+
+    :param statuses: List of statuses returned by the Twitter API
+    :return: Tuple with list of statuses not yet in the database and whether any status was already stored
+    """
+
+    existing = existing_tweet_ids([status['id'] for status in statuses])
+    new_statuses = [status for status in statuses if status['id'] not in existing]
+
+    return new_statuses, bool(existing)
+
+
+def build_record(status, search_term, location_search_term=None):
+    """
+    Builds an unsaved Tweet document from analyzed Tweet data.
+
+    :param status: Analyzed Tweet data dictionary
+    :param search_term: Search term entered by user
+    :param location_search_term: Location search term entered by user (optional)
+    :return: Validated Tweet document
+    """
+
+    record = Tweet(
+        tweet_id=status['tweet_id'],
+        tweet_time=status['created_at'],
+        tweet_text=status['text'],
+        tweet_user=status['user'],
+        tweet_user_fullname=status['user_fullname'],
+        profile_image_url=status['profile_image_url'],
+        sentiment_type=status['sentiment'],
+        sentiment_score=status['sentimentScore'],
+        keyword_search_term=search_term
+    )
+
+    if location_search_term:
+        record.location_geo = status['location_geo']
+        record.location_address = status['location_address']
+        record.location_search_term = location_search_term
+
+    # Perform the same field validation 'save' would
+    record.validate()
+
+    return record
+
+
+def bulk_insert(records):
+    """
+    Writes Tweet documents to the database with a single unordered bulk insert.
+    Duplicate key errors from the unique 'tweet_id' index (eg a concurrent request saving the same Tweet) are tolerated.
+
+    :param records: List of unsaved Tweet documents
+    :return: List of the documents actually inserted
+    """
+
+    from pymongo.errors import BulkWriteError
+
+    if not records:
+        return []
+
+    bulk = Tweet._get_collection().initialize_unordered_bulk_op()
+    for record in records:
+        bulk.insert(record.to_mongo())
+
+    try:
+        bulk.execute()
+    except BulkWriteError as e:
+        # Only duplicate key errors (code 11000) are expected, anything else is a genuine failure
+        if any(error['code'] != 11000 for error in e.details['writeErrors']):
+            raise
+        failed = set(error['index'] for error in e.details['writeErrors'])
+        return [record for i, record in enumerate(records) if i not in failed]
+
+    return records
+
+
 def save_tweets(tweets, search_term, location_search_term=None):
     """
     Saves given tweet data in MongoDB database.
+    Tweets already in the database are found with a single query, new Tweets are written with one bulk insert.
 
     :param tweets: Tweet data
     :param search_term: Search term entered by user
     :param location_search_term: Location search term entered by user (optional)
+    :return: Tuple with number of Tweets inserted and number of Tweets skipped
     """
 
+    if not tweets:
+        return 0, 0
+
     try:
-        if location_search_term:
-            # Cycle through list of Tweets
-            for status in tweets:
-                tweet_id = status['tweet_id']
-                # Check if tweet already exists in db, skip this iteration if it does
-                id_query = len(Tweet.objects(tweet_id=tweet_id))
-                if id_query >= 1:
-                    continue
-                # Define record to save to db
-                record = Tweet(
-                    tweet_id=status['tweet_id'],
-                    tweet_time=status['created_at'],
-                    tweet_text=status['text'],
-                    tweet_user=status['user'],
-                    tweet_user_fullname=status['user_fullname'],
-                    profile_image_url=status['profile_image_url'],
-                    sentiment_type=status['sentiment'],
-                    sentiment_score=status['sentimentScore'],
-                    location_geo=status['location_geo'],
-                    location_address=status['location_address'],
-                    keyword_search_term=search_term,
-                    location_search_term=location_search_term
-                )
-                # Save to DB
-                record.save()
-        else:
-            # Cycle through list of processed Tweets
-            for status in tweets:
-                tweet_id = status['tweet_id']
-                # Check if tweet already exists in db, skip this iteration if it does
-                id_query = len(Tweet.objects(tweet_id=tweet_id))
-                if id_query >= 1:
-                    continue
-                # Define record to save to db
-                record = Tweet(
-                    tweet_id=status['tweet_id'],
-                    tweet_time=status['created_at'],
-                    tweet_text=status['text'],
-                    tweet_user=status['user'],
-                    tweet_user_fullname=status['user_fullname'],
-                    profile_image_url=status['profile_image_url'],
-                    sentiment_type=status['sentiment'],
-                    sentiment_score=status['sentimentScore'],
-                    keyword_search_term=search_term
-                )
-                # Save to DB
-                record.save()
+        # Check which tweets already exist in db using a single query
+        existing = existing_tweet_ids([status['tweet_id'] for status in tweets])
+
+        # Define records to save to db, skipping existing and repeated tweets
+        records = []
+        for status in tweets:
+            tweet_id = status['tweet_id']
+            if tweet_id in existing:
+                continue
+            existing.add(tweet_id)
+            records.append(build_record(status, search_term, location_search_term))
+
+        # Save to DB and update daily sentiment rollups for the new tweets
+        inserted = bulk_insert(records)
+        update_rollups(inserted)
+        # Invalidate cached results pages of the searches that gained tweets
+        bump_generations(inserted)
+        # Count new tweets towards the trends snapshot refresh threshold
+        if inserted:
+            TrendsSnapshot.objects(name="trends").update(inc__pending_tweets=len(inserted))
     except Exception:
         raise Exception("Database error")
 
+    return len(inserted), len(tweets) - len(inserted)
+
+
+# Geocoder shared by all requests, created on first use
+geo_locator = None
+
 
-def twitter_auth():
+def geocode(place_name):
     """
-    Imports Twitter API credentials from config file and performs OAuth2 using app credentials from config.py
+    Geocodes a place name using geopy.
 
-    :return: Authorized instance of Twython
+    :param place_name: Name of place to search for, eg "san francisco"
+    :return: Location object with latitude, longitude and address attributes, or None if the place is unknown
     """
 
-    # Pulling Twitter API credentials from config.py
-    key = config.TWITTER_CONSUMER_KEY
-    key_secret = config.TWITTER_CONSUMER_SECRET
-    token = config.TWITTER_ACCESS_TOKEN
-    token_secret = config.TWITTER_ACCESS_TOKEN_SECRET
+    global geo_locator
 
-    # Attempting OAuth connection to Twitter using Twython with API credentials
-    try:
-        twitter = Twython(key, key_secret, token, token_secret)
-    except TwythonAuthError:
-        raise Exception("Twython auth error")
+    from geopy.geocoders import Nominatim
+
+    if geo_locator is None:
+        # Create geo_locator object instance
+        geo_locator = Nominatim()
 
-    return twitter
+    return geo_locator.geocode(place_name)
 
 
 def get_geo_info(place_name):
     """
-    Gets coordinates and address for a given place name using geopy.
+    Gets coordinates and address for a given place name, using the geocode cache in front of geopy.
 
     :param place_name: Name of place to search for, eg "San Francisco"
-    :return: Location object with latitude, longitude and name attributes
+    :return: Location object with latitude, longitude and address attributes
     """
 
-    from geopy.geocoders import Nominatim
-
-    # Create geo_locator object instance
-    geo_locator = Nominatim()
-
     # Attempt to obtain geo data for given place name
     try:
-        location = geo_locator.geocode(place_name)
+        location = geocode_cache.lookup(place_name, geocode)
     except Exception:
         raise Exception("Location error")
 
@@ -113,6 +189,326 @@ def get_geo_info(place_name):
     return location
 
 
+def parse_status(status, location=None):
+    """
+    Parses the data we want from a raw Twitter status.
+
+    :param status: Status returned by the Twitter API
+    :param location: Location object from geopy the status was searched within (optional)
+    :return: Dictionary containing parsed Tweet data
+    """
+
+    tweet = {}
+    tweet['tweet_id'] = status['id']
+    tweet['text'] = status['text'].strip()
+    tm = status['created_at']
+    tm = datetime.strptime(tm, '%a %b %d %H:%M:%S +0000 %Y')
+    tweet['created_at'] = tm
+    tweet['user'] = status['user']['screen_name'].strip()
+    tweet['user_fullname'] = status['user']['name']
+    tweet['profile_image_url'] = status['user']['profile_image_url']
+    if location:
+        tweet['location_geo'] = {"latitude": location.latitude, "longitude": location.longitude}
+        tweet['location_address'] = location.address
+
+    return tweet
+
+
+def is_tracked(keyword, location_search_term=None):
+    """
+    Checks whether a search is kept up to date by the streaming ingestion worker (defined in config.py),
+    in which case results can be served straight from the database.
+
+    :param keyword: Keyword to search
+    :param location_search_term: Location search term entered by user (optional)
+    :return: True if the keyword (and location, if provided) is tracked
+    """
+
+    if keyword.lower() not in tracked_keywords():
+        return False
+
+    return location_search_term is None or location_search_term.lower() in tracked_locations()
+
+
+def tracked_keywords():
+    """
+    :return: Keywords tracked by the streaming ingestion worker (defined in config.py), lowercased like searches
+    """
+
+    return [keyword.lower() for keyword in config.STREAM_TRACK_KEYWORDS]
+
+
+def tracked_locations():
+    """
+    :return: Location search terms tracked by the streaming ingestion worker (defined in config.py), lowercased
+    """
+
+    return [location.lower() for location in config.STREAM_TRACK_LOCATIONS]
+
+
+def has_stored_tweets(keyword, location_address=None):
+    """
+    :param keyword: A given search keyword
+    :param location_address: A given location address (optional)
+    :return: True if at least one Tweet is stored for the keyword (and location)
+    """
+
+    return Tweet._get_collection().find(search_match(keyword, location_address)).limit(1).count(True) > 0
+
+
+def is_stream_live():
+    """
+    :return: True if the streaming ingestion worker recorded progress within STREAM_LIVE_TIMEOUT (defined in config.py)
+    """
+
+    checkpoint = StreamCheckpoint.objects(name="stream").only("updated_at").first()
+    if checkpoint is None or checkpoint.updated_at is None:
+        return False
+
+    return checkpoint.updated_at > datetime.utcnow() - timedelta(seconds=config.STREAM_LIVE_TIMEOUT)
+
+
+# Errors raised when an upstream API's quota is exhausted, stored results may be served instead
+RATE_LIMIT_ERRORS = ("Twitter rate limit", "AlchemyAPI rate limit")
+
+
+def acquire_quota(bucket, error, calls=1, priority="high"):
+    """
+    Takes quota for upstream API calls from the shared rate limit scheduler.
+
+    :param bucket: Scheduler bucket name (defined in config.py)
+    :param error: Exception message to raise if the calls can't be admitted
+    :param calls: Number of calls about to be made
+    :param priority: "high" for interactive searches, "low" for background work
+    """
+
+    try:
+        scheduler.acquire(bucket, calls, priority)
+    except RateLimitExceeded:
+        raise Exception(error)
+
+
+def newest_tweet_id(keyword, location_address=None):
+    """
+    :param keyword: A given search keyword
+    :param location_address: A given location address (optional)
+    :return: Id of the newest stored Tweet of the keyword (and location, if provided) search, or None
+    """
+
+    # Keyword-only searches don't find the Tweets of location searches for the keyword, and vice versa
+    query = Tweet.objects(keyword_search_term=keyword, location_address=location_address)
+
+    newest = query.order_by('-tweet_id').only('tweet_id').first()
+
+    return newest.tweet_id if newest else None
+
+
+def get_high_water_mark(keyword, location_address=None):
+    """
+    :param keyword: A given search keyword
+    :param location_address: A given location address (optional)
+    :return: Id of the newest Tweet ingested by a previous search for the keyword (and location), or None
+    """
+
+    state = SearchState.objects(keyword_search_term=keyword, location_address=location_address).first()
+    if state and state.high_water_id is not None:
+        return state.high_water_id
+
+    # Searches from before high water marks were recorded
+    return newest_tweet_id(keyword, location_address)
+
+
+def set_high_water_mark(keyword, location_address, tweet_id):
+    """
+    Raises the high water mark of a keyword (and location) search, if the given Tweet id is newer.
+
+    :param keyword: A given search keyword
+    :param location_address: A given location address, or None
+    :param tweet_id: Id of the newest Tweet ingested
+    """
+
+    SearchState._get_collection().update(
+        {"keyword_search_term": keyword, "location_address": location_address},
+        {"$max": {"high_water_id": tweet_id}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def bump_generations(records):
+    """
+    Bumps the generation of each keyword (and location) search that has new Tweets stored,
+    so cached results pages for them are no longer served. Keyword-only searches show the Tweets of
+    location searches for the keyword too, so their generation is bumped as well.
+
+    :param records: Tweet records that were stored
+    """
+
+    searches = set((record.keyword_search_term, record.location_address) for record in records)
+    searches.update([(keyword, None) for keyword, location_address in searches])
+
+    for keyword, location_address in searches:
+        SearchState._get_collection().update(
+            {"keyword_search_term": keyword, "location_address": location_address},
+            {"$inc": {"generation": 1}},
+            upsert=True
+        )
+
+
+class SearchStats(object):
+    """
+    Counters for a paginated keyword search, used to report what the incremental refresh fetched and saved.
+    """
+
+    def __init__(self, count):
+        """
+        :param count: Number of Tweets requested
+        """
+
+        self.count = int(count)
+        self.since_id = None
+        self.ids = []
+        self.requests = 0
+        self.bytes = 0
+        self.reached_stored = False
+
+    @property
+    def fetched(self):
+        """
+        :return: Number of statuses returned by Twitter
+        """
+
+        return len(self.ids)
+
+    @property
+    def not_refetched(self):
+        """
+        :return: Number of requested Tweets not downloaded again because they were already stored, ie that a
+                 search from the high water mark or stopping at stored Tweets didn't fetch
+        """
+
+        if self.since_id is None and not self.reached_stored:
+            return 0
+        return max(self.count - self.fetched, 0)
+
+    @property
+    def bytes_saved(self):
+        """
+        :return: Estimated response bytes not downloaded, at the measured size per fetched Tweet,
+                 or None if nothing was fetched to measure
+        """
+
+        if not self.fetched:
+            return None
+        return self.not_refetched * self.bytes // self.fetched
+
+    def add_page(self, statuses, size=0):
+        """
+        Records a page of raw statuses returned by Twitter.
+
+        :param size: Size in bytes of the response the page came in
+        """
+
+        self.requests += 1
+        self.bytes += size
+        self.ids.extend(status['id'] for status in statuses)
+
+    def high_water_id(self, stored):
+        """
+        Newest fetched Tweet id the next search can start after. Doesn't pass Tweets which failed analysis,
+        so they are fetched again by the next search.
+
+        :param stored: Set of the fetched Tweet ids now stored in the database
+        :return: Tweet id, or None if no fetched Tweet was stored
+        """
+
+        saved = [tweet_id for tweet_id in self.ids if tweet_id in stored]
+        if not saved:
+            return None
+
+        failed = [tweet_id for tweet_id in self.ids if tweet_id not in stored]
+        if failed:
+            return min(max(saved), min(failed) - 1)
+
+        return max(saved)
+
+
+def search_pages(keyword, count, location=None, stats=None, priority="high"):
+    """
+    Performs a paginated Twitter search for a given keyword, following 'max_id' cursors back from the newest Tweet.
+    Only Tweets newer than the keyword's high water mark are requested ('since_id'), and pagination stops
+    once Twitter returns an empty page or no further page ('search_metadata.next_results'),
+    or early once a page reaches Tweets already in the database.
+    Will restrict keyword search to within 10 miles radius of given location (if provided).
+
+    :param keyword: Keyword to search
+    :param count: Maximum number of Tweets to search for
+    :param location: Location object from geopy to restrict results to (optional)
+    :param stats: SearchStats to record fetched pages in (optional)
+    :param priority: Rate limit priority of the search, "high" or "low"
+    :return: Generator of lists of dictionaries containing parsed Tweet data, one list per page
+    """
+
+    if stats is None:
+        stats = SearchStats(count)
+
+    since_id = get_high_water_mark(keyword, location.address if location else None)
+    stats.since_id = since_id
+    in_db = since_id is not None
+    found = False
+
+    count = int(count)
+    fetched = 0
+    max_id = None
+
+    while fetched < count:
+        params = {"q": keyword, "lang": "en", "count": min(count - fetched, config.TWEET_SEARCH_PAGE_SIZE)}
+        if location is not None:
+            params["geocode"] = "%s,%s,10mi" % (location.latitude, location.longitude)
+        if since_id is not None:
+            params["since_id"] = since_id
+        if max_id is not None:
+            params["max_id"] = max_id
+
+        # Attempt to query Twitter REST API using Twython, later pages failing just end the search early
+        try:
+            acquire_quota("twitter_search", "Twitter rate limit", priority=priority)
+            search_result = twitter_pool.request("search/tweets", "search", **params)
+        except Exception as e:
+            if fetched == 0:
+                if str(e) in ("Twython auth error", "Twitter rate limit"):
+                    raise
+                raise Exception("No Twitter results returned")
+            break
+
+        statuses = search_result['statuses']
+        if not statuses:
+            break
+        fetched += len(statuses)
+        stats.add_page(statuses, twitter_pool.last_response_size())
+
+        # Check which Tweets are already in DB
+        new_statuses, page_in_db = filter_new_statuses(statuses)
+        in_db = in_db or page_in_db
+
+        # Parse the data we want from each new status
+        tweets = [parse_status(status, location) for status in new_statuses]
+        if tweets:
+            found = True
+            yield tweets
+
+        # Stop at the last page or once we have reached stored Tweets, pages may be short before the last one
+        if page_in_db:
+            stats.reached_stored = True
+            break
+        if not search_result.get('search_metadata', {}).get('next_results'):
+            break
+        max_id = min(status['id'] for status in statuses) - 1
+
+    # If no search results returned and data is not in our database, raise exception
+    if not found and not in_db:
+        raise Exception("No Twitter results returned")
+
+
 def search_keyword(keyword, count, location=None):
     """
     Performs a Twitter search for a given keyword.
@@ -124,99 +520,102 @@ def search_keyword(keyword, count, location=None):
     :return: List of dictionaries containing parsed Tweet data from search
     """
 
-    # Perform OAuth connection to Twitter, creates instance of Twython
-    twitter = twitter_auth()
-
-    is_location_search = False
-    in_db = False
-
     # List to store our data
     tweets = []
 
-    # Attempt to query Twitter REST API using Twython
-    try:
-        if location is None:
-            search_result = twitter.search(q=keyword, lang="en", count=count)
-        else:
-            is_location_search = True
-            search_result = twitter.search(q=keyword, lang="en", geocode="%s,%s,10mi" % (location.latitude, location.longitude), count=count)
-    except Exception:
-        raise Exception("No Twitter results returned")
+    for page in search_pages(keyword, count, location):
+        tweets.extend(page)
 
-    # Cycle through results and parse the data we want, save as dictionary and store in 'tweets' list
-    for status in search_result['statuses']:
-        tweet_id = status['id']
-        # Check if Tweet is already in DB
-        id_query = len(Tweet.objects(tweet_id=tweet_id))
-        if id_query >= 1:
-            in_db = True
-            continue
-        tweet = {}
-        tweet['tweet_id'] = tweet_id
-        tweet['text'] = status['text'].strip()
-        tm = status['created_at']
-        tm = datetime.strptime(tm, '%a %b %d %H:%M:%S +0000 %Y')
-        tweet['created_at'] = tm
-        tweet['user'] = status['user']['screen_name'].strip()
-        tweet['user_fullname'] = status['user']['name']
-        tweet['profile_image_url'] = status['user']['profile_image_url']
-        if is_location_search:
-            tweet['location_geo'] = {"latitude": location.latitude, "longitude": location.longitude}
-            tweet['location_address'] = location.address
-        # Append parsed tweet data dictionary to results list
-        tweets.append(tweet)
+    return tweets
 
-    # If no search results returned and data is not in our database, raise exception
-    if not tweets and not in_db:
-        raise Exception("No Twitter results returned")
 
-    return tweets
+def prefetch(pages, depth=1):
+    """
+    Iterates a generator on a background thread, fetching up to 'depth' items ahead of the consumer
+    so that network I/O for the next page overlaps with processing of the current one.
+
+    :param pages: Generator to iterate
+    :param depth: Maximum number of items fetched ahead
+    :return: Generator yielding the same items, re-raising any exception raised by the original generator.
+        The background thread stops fetching once the returned generator is closed, eg when the consumer raises.
+    """
+
+    import queue
+
+    buffer = queue.Queue(maxsize=depth)
+    end = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Wait for room in the buffer, unless the consumer has gone away
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch():
+        try:
+            for page in pages:
+                if not put((page, None)):
+                    pages.close()
+                    return
+            put((end, None))
+        except Exception as e:
+            put((end, e))
 
+    t = threading.Thread(target=fetch)
+    t.daemon = True
+    t.start()
 
-def search_user(screen_name, count):
+    try:
+        while True:
+            page, error = buffer.get()
+            if page is end:
+                if error is not None:
+                    raise error
+                return
+            yield page
+    finally:
+        stop.set()
+
+
+def search_user(screen_name, count, priority="high"):
     """
     Performs a Twitter search for a given username.
 
     :param screen_name: Username of Twitter user to search for
     :param count: Number of the user's Tweets to return
+    :param priority: Rate limit priority of the search, "high" or "low"
     :return: List of dictionaries containing parsed Tweet data from search
     """
 
-    # Perform OAuth connection to Twitter, creates instance of Twython
-    twitter = twitter_auth()
-
-    in_db = False
-
     # List to store our results
     tweets = []
 
     # Attempt to query Twitter REST API using Twython
     try:
-        search_result = twitter.get_user_timeline(screen_name=screen_name, count=count)
-    except Exception:
+        acquire_quota("twitter_timeline", "Twitter rate limit", priority=priority)
+        search_result = twitter_pool.request("statuses/user_timeline", "get_user_timeline",
+                                             screen_name=screen_name, count=count)
+    except Exception as e:
+        if str(e) in ("Twython auth error", "Twitter rate limit"):
+            raise
         raise Exception("No Twitter results returned")
 
     if search_result[0]['user']['lang'] != "en":
         # If not English, we can't perform sentiment analysis (limitation of AlchemyAPI)
         raise Exception("Not an English language user")
 
+    # Check which Tweets are already in DB
+    statuses, in_db = filter_new_statuses(search_result)
+
     # Cycle through results and parse the data we want, save as dictionary and store in 'tweets' list
-    for status in search_result:
-        tweet_id = status['id']
-        # Check if Tweet is already in DB
-        id_query = len(Tweet.objects(tweet_id=tweet_id))
-        if id_query >= 1:
-            in_db = True
-            continue
-        tweet = {}
-        tweet['tweet_id'] = tweet_id
-        tweet['text'] = status['text'].strip()
-        tm = status['created_at']
-        tm = datetime.strptime(tm, '%a %b %d %H:%M:%S +0000 %Y')
-        tweet['created_at'] = tm
+    for status in statuses:
+        tweet = parse_status(status)
         tweet['user'] = screen_name[1:]
-        tweet['user_fullname'] = status['user']['name']
-        tweet['profile_image_url'] = status['user']['profile_image_url']
         # Add parsed tweet data dictionary to results list
         tweets.append(tweet)
 
@@ -227,104 +626,471 @@ def search_user(screen_name, count):
     return tweets
 
 
-def analysis_worker(in_queue, out_queue):
+def run_search(keyword, count, location=None, location_search_term=None, progress=None, priority="high"):
+    """
+    Performs search, analysis and storage of Tweets for a search form submission.
+    Searches for tracked keywords are skipped while the streaming worker is live and has stored Tweets for them,
+    as it keeps their results up to date. Otherwise they are searched like any other keyword.
+
+    :param keyword: Keyword or username (starting with "@") to search for
+    :param count: Number of Tweets to search for
+    :param location: Location object from geopy to restrict keyword search to (optional)
+    :param location_search_term: Location search term entered by user (optional)
+    :param progress: Function called with the number of Tweets analyzed so far, the maximum total and the ids
+        of the Tweets in the latest batch (optional).
+        If provided Tweets are analyzed and saved in batches so partial results can be shown.
+    :param priority: Rate limit priority of the search, "high" or "low"
+    :return: SearchStats of a keyword search, or None
+    """
+
+    stats = None
+
+    if keyword[0] == "@":
+        pages = [search_user(keyword, count, priority)]
+        location_search_term = None
+    elif is_tracked(keyword, location_search_term) and is_stream_live() and \
+            has_stored_tweets(keyword, location.address if location else None):
+        return None
+    else:
+        # Analyze each page while the next one is being fetched
+        stats = SearchStats(count)
+        pages = prefetch(search_pages(keyword, count, location, stats, priority))
+
+    size = config.ALCHEMY_BATCH_SIZE
+    analyzed = 0
+
+    if progress is not None:
+        progress(analyzed, int(count), [])
+
+    for tweets in pages:
+        if progress is None:
+            analysis_supervisor(tweets, keyword, location_search_term, priority)
+            continue
+
+        for i in range(0, len(tweets), size):
+            batch = tweets[i:i + size]
+            analysis_supervisor(batch, keyword, location_search_term, priority)
+            analyzed += len(batch)
+            progress(analyzed, max(int(count), analyzed), [tweet['tweet_id'] for tweet in batch])
+
+    # Only fetch Tweets newer than those saved on the next search
+    if stats is not None:
+        high_water_id = stats.high_water_id(existing_tweet_ids(stats.ids))
+        if high_water_id is not None:
+            set_high_water_mark(keyword, location.address if location else None, high_water_id)
+
+    return stats
+
+
+# Rate limit priority of the analysis running on each analysis pool thread
+metering = threading.local()
+
+
+def meter_alchemy(endpoint):
     """
-    Performs sentiment analysis on Tweet data using AlchemyAPI.
+    Takes quota for each outbound AlchemyAPI call, including single call fallbacks, batch validation and retries.
 
-    :param in_queue: Shared input queue of Tweet data to analyze
-    :param out_queue: Shared output queue of Tweet data to analyze
+    :param endpoint: AlchemyAPI endpoint about to be called
     """
 
-    # Attempt to create new AlchemyAPI instance
     try:
-        alchemy = AlchemyAPI()
-    except:
-        raise Exception("AlchemyAPI auth error")
+        scheduler.acquire("alchemy", 1, getattr(metering, 'priority', "high"))
+    except RateLimitExceeded:
+        raise CallRejected("AlchemyAPI rate limit")
+
+
+# HTTP transport of the AlchemyAPI client, pool sized to the analysis concurrency limit (defined in config.py)
+alchemy_transport = HTTPTransport(
+    pool_size=config.ALCHEMY_THREAD_LIMIT,
+    timeout=config.ALCHEMY_HTTP_TIMEOUT,
+    retries=config.ALCHEMY_HTTP_RETRIES,
+    backoff=config.ALCHEMY_HTTP_BACKOFF,
+    deadline=config.ALCHEMY_HTTP_DEADLINE,
+    meter=meter_alchemy
+)
+
+# AlchemyAPI instance shared by all analysis workers, created on first use
+alchemy = None
+alchemy_lock = threading.Lock()
+
+
+def get_alchemy():
+    """
+    :return: Shared AlchemyAPI instance
+    """
+
+    global alchemy
+
+    with alchemy_lock:
+        if alchemy is None:
+            # Attempt to create new AlchemyAPI instance
+            try:
+                alchemy = AlchemyAPI(alchemy_transport)
+            except:
+                raise Exception("AlchemyAPI auth error")
+
+    return alchemy
+
+
+class SentimentBackend(metaclass=ABCMeta):
+    """
+    Interface for sentiment analysis backends.
+    Backends return AlchemyAPI style 'docSentiment' responses, so results are classified the same whichever is used.
+    """
+
+    # Whether calls are slow remote calls which should be spread across the analysis pool
+    remote = False
+
+    # Number of texts sent to 'sentiment_batch' at once by the analysis pool, for remote backends
+    batch_size = 1
+
+    @abstractmethod
+    def sentiment(self, text):
+        """
+        :param text: Text to analyze
+        :return: Response with 'docSentiment' 'type' and 'score'
+        """
+
+    def sentiment_batch(self, texts):
+        """
+        Analyzes texts one at a time, backends which can do better override this.
+
+        :param texts: List of texts to analyze
+        :return: List of responses with 'docSentiment' 'type' and 'score', in the same order as texts
+        """
+
+        return [self.sentiment(text) for text in texts]
+
+
+def claim_batch_validation():
+    """
+    Atomically claims the check that batched sentiment calls agree with single calls, so only one process runs it.
+    A claim lapses after ALCHEMY_BATCH_VALIDATION_CLAIM_TIMEOUT seconds (defined in config.py) in case its holder dies.
+
+    :return: True if this process should run the check
+    """
+
+    from pymongo.errors import DuplicateKeyError
+
+    now = datetime.utcnow()
+
+    try:
+        result = BatchValidation._get_collection().update(
+            {"name": "alchemy", "batching": None,
+             "$or": [{"validating_until": None}, {"validating_until": {"$lt": now}}]},
+            {"$set": {"validating_until": now + timedelta(seconds=config.ALCHEMY_BATCH_VALIDATION_CLAIM_TIMEOUT)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The check has been made, or another process holds the claim
+        return False
+
+    return result['n'] == 1
+
+
+def release_batch_validation():
+    """
+    Releases the claim to run the batched sentiment check without a verdict, so it is run again.
+    """
+
+    BatchValidation.objects(name="alchemy").update_one(set__validating_until=None)
+
 
-    while not in_queue.empty():
-        # Get Tweet from the queue
-        tweet = in_queue.get()
-        tweet['sentiment'] = {}
+class AlchemyBackend(SentimentBackend):
+    """
+    Sentiment analysis using the remote AlchemyAPI service.
+    """
+
+    remote = True
+
+    def __init__(self):
+        self.batch_size = config.ALCHEMY_BATCH_SIZE
+        # Whether batched results agree with single calls, None until checked (sample size defined in config.py)
+        self.batching = None if config.ALCHEMY_BATCH_VALIDATION_SAMPLE else True
+        # Whether a thread of this process is running the check
+        self.validating = False
+        self.lock = threading.Lock()
+
+    def use_verdict(self, batching):
+        """
+        Switches to single calls for good if batched results didn't agree with them.
+        """
+
+        with self.lock:
+            self.batching = batching
+            if not batching:
+                self.batch_size = 1
+
+    def check_batching(self, alchemy, texts):
+        """
+        Before the first batched call, compares batched results to single calls for a sample of texts,
+        and switches to single calls for good if they don't agree often enough.
+        The verdict is stored in the database, so the check runs once per deployment. Only one thread of one
+        process runs it at a time, without holding the lock, and texts are analyzed with single calls meanwhile.
+
+        :param alchemy: AlchemyAPI instance
+        :param texts: Texts about to be analyzed, the sample is taken from them
+        :return: True if texts should be analyzed in batches
+        """
+
+        with self.lock:
+            if self.batching is not None or self.validating:
+                return bool(self.batching)
+            self.validating = True
 
-        # Attempt to call AlchemyAPI to perform document level sentiment of the Tweet text
         try:
-            sentiment = alchemy.sentiment("text", tweet['text'], {"showSourceText": 1})
-        except:
-            raise Exception("AlchemyAPI error")
+            stored = BatchValidation.objects(name="alchemy").first()
+            if stored is not None and stored.batching is not None:
+                self.use_verdict(stored.batching)
+                return stored.batching
 
-        # Add sentiment data (score + sentiment type) to Tweet dictionary
+            sample = texts[:config.ALCHEMY_BATCH_VALIDATION_SAMPLE]
+            if len(sample) < 2 or not claim_batch_validation():
+                return False
+
+            try:
+                agreement = alchemy.validate_batch(sample, max_docs=self.batch_size)
+            except:
+                release_batch_validation()
+                raise
+
+            if agreement is None:
+                # Nothing could be compared, check again with the next texts
+                release_batch_validation()
+                return False
+
+            batching = agreement >= config.ALCHEMY_BATCH_MIN_AGREEMENT
+            if not batching:
+                app.logger.warning("Batched sentiment agreed with single calls for only %.0f%% of %d texts, "
+                                   "using single calls", agreement * 100, len(sample))
+            BatchValidation.objects(name="alchemy").update_one(
+                set__batching=batching, set__agreement=agreement, set__sample=len(sample),
+                set__checked_at=datetime.utcnow(), set__validating_until=None
+            )
+            self.use_verdict(batching)
+            return batching
+        finally:
+            with self.lock:
+                self.validating = False
+
+    def sentiment(self, text):
+        return self.sentiment_batch([text])[0]
+
+    def sentiment_batch(self, texts):
+        alchemy = get_alchemy()
+
+        # Attempt to call AlchemyAPI to perform sentiment analysis of the Tweet texts in as few requests as possible
         try:
-            tweet['sentiment'] = sentiment['docSentiment']['type']
-            if tweet['sentiment'] != 'neutral':
-                tweet['sentimentScore'] = float("{0:.2f}".format((float(sentiment['docSentiment']['score'])*100)))
+            if self.check_batching(alchemy, texts):
+                results = alchemy.sentiment_batch(texts, max_docs=self.batch_size)
             else:
-                tweet['sentimentScore'] = 0
-        except KeyError:
-            tweet['sentiment'] = "neutral"
-            tweet['sentimentScore'] = 0
+                results = [alchemy.sentiment('text', text, {}) for text in texts]
+        except CallRejected:
+            raise Exception("AlchemyAPI rate limit")
         except:
-            raise Exception("Classification error")
+            raise Exception("AlchemyAPI error")
 
-        # Signal task has been complete
-        in_queue.task_done()
-        # Add analyzed Tweet to output queue
-        out_queue.put(tweet)
+        # Network and parse errors are reported by the client as an error response rather than raised
+        for sentiment in results:
+            if sentiment.get('status') == 'ERROR' and sentiment.get('statusInfo') in ('network-error', 'parse-error'):
+                raise Exception("AlchemyAPI error")
 
+        return results
 
-def analysis_supervisor(tweets, search_term, location_search_term=None):
+
+class LexiconBackend(SentimentBackend):
     """
-    Spawns and manages threads (concurrency limit defined in config.py) to perform analysis of gathered Tweet data.
-    Passes Tweet data (with newly added analysis info) to 'save_tweets' function to save to database.
+    Offline in-process sentiment analysis using a word valence lexicon.
+    """
+
+    def sentiment(self, text):
+        return lexicon.score_texts([text])[0]
+
+    def sentiment_batch(self, texts):
+        return lexicon.score_texts(texts)
+
+
+# Sentiment backends selectable with SENTIMENT_BACKEND in config.py
+BACKENDS = {"alchemy": AlchemyBackend, "lexicon": LexiconBackend}
+
+backend = None
+
+
+def check_backend():
+    """
+    Checks SENTIMENT_BACKEND in config.py names a known backend, so a typo fails at startup rather than on every search.
+    """
+
+    if config.SENTIMENT_BACKEND not in BACKENDS:
+        raise ValueError("Unknown SENTIMENT_BACKEND '%s' in config.py, expected one of: %s"
+                         % (config.SENTIMENT_BACKEND, ", ".join(sorted(BACKENDS))))
+
+
+def get_backend():
+    """
+    :return: Sentiment backend configured in config.py
+    """
+
+    global backend
+
+    if backend is None:
+        backend = BACKENDS[config.SENTIMENT_BACKEND]()
+
+    return backend
+
+
+def classify(tweet, sentiment):
+    """
+    Adds sentiment data (score + sentiment type) from a sentiment response to Tweet data.
+
+    :param tweet: Tweet data
+    :param sentiment: AlchemyAPI style sentiment response for the Tweet text
+    :return: Tweet data with sentiment type and score added
+    """
+
+    try:
+        tweet['sentiment'] = sentiment['docSentiment']['type']
+        if tweet['sentiment'] != 'neutral':
+            tweet['sentimentScore'] = float("{0:.2f}".format((float(sentiment['docSentiment']['score'])*100)))
+        else:
+            tweet['sentimentScore'] = 0
+    except KeyError:
+        tweet['sentiment'] = "neutral"
+        tweet['sentimentScore'] = 0
+    except:
+        raise Exception("Classification error")
+
+    return tweet
+
+
+def analysis_worker(tweets, priority="high"):
+    """
+    Performs sentiment analysis on a batch of Tweet data using the configured backend.
+
+    :param tweets: List of Tweet data to analyze
+    :param priority: Rate limit priority the backend's remote calls are metered at, "high" or "low"
+    :return: List of Tweet data with sentiment type and score added
+    """
+
+    metering.priority = priority
+    sentiments = get_backend().sentiment_batch([tweet['text'] for tweet in tweets])
+
+    return [classify(tweet, sentiment) for tweet, sentiment in zip(tweets, sentiments)]
+
+
+def analyze_tweets(tweets, timeout, priority="high"):
+    """
+    Runs sentiment analysis of all given Tweets, remote backends run concurrently on the process-wide analysis pool.
+    Results are yielded as they complete. If no analysis completes within 'timeout' seconds the search stops
+    waiting and reports all outstanding Tweets as failed. This is a stall timeout for the search, not a per call
+    timeout: calls already running keep their pool thread until the HTTP transport's deadline ends them.
 
     :param tweets: Parsed tweet data to analyze
-    :param search_term: Term associated with this search
+    :param timeout: Seconds to wait with no chunk of analysis completing
+    :param priority: Rate limit priority of the remote calls, "high" or "low"
+    :return: Generator of (tweet, error) tuples, error is None for successfully analyzed Tweets
     """
 
-    import queue
-    import threading
-
-    # Set concurrent thread limit
-    limit = config.ALCHEMY_THREAD_LIMIT
-
-    # Create queues
-    in_queue = queue.Queue()
-    out_queue = queue.Queue()
-
-    # List to store threads
-    threads = []
-
-    # Add Tweets to queue
-    for tweet in tweets:
-        in_queue.put(tweet)
-
-    # Get size of full queue
-    in_size = in_queue.qsize()
-
-    # Spawn threads up to concurrency limit
-    for i in range(limit):
-        # Set target for thread
-        t = threading.Thread(target=analysis_worker, args=(in_queue, out_queue))
-        # Set as daemon
-        t.daemon = True
-        # Append to threads list
-        threads.append(t)
-        # Put thread to work
-        t.start()
-
-    # Wait for threads to finish
-    in_queue.join()
-
-    while True:
-        # Check if all Tweets have been processed
-        if in_size == out_queue.qsize():
+    if not get_backend().remote:
+        # In-process backends score the whole batch at once
+        try:
+            sentiments = get_backend().sentiment_batch([tweet['text'] for tweet in tweets])
+        except Exception as e:
+            for tweet in tweets:
+                yield tweet, e
+            return
+
+        for tweet, sentiment in zip(tweets, sentiments):
+            try:
+                yield classify(tweet, sentiment), None
+            except Exception as e:
+                yield tweet, e
+        return
+
+    # Split Tweets into chunks of the backend's batch size
+    size = get_backend().batch_size
+    chunks = [tweets[i:i + size] for i in range(0, len(tweets), size)]
+
+    futures = analysis_pool.submit_batch(partial(analysis_worker, priority=priority), chunks)
+    pending = dict(zip(futures, chunks))
+
+    while pending:
+        done, not_done = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            # Stop waiting, chunks still queued are dropped while running calls end at their HTTP deadline
+            for future in not_done:
+                future.cancel()
+                for tweet in pending.pop(future):
+                    yield tweet, Exception("AlchemyAPI timeout")
             break
 
+        for future in done:
+            chunk = pending.pop(future)
+            error = future.exception()
+            for tweet in chunk:
+                yield tweet, error
+
+
+def analysis_supervisor(tweets, search_term, location_search_term=None, priority="high"):
+    """
+    Performs concurrent analysis of gathered Tweet data (concurrency limit defined in config.py).
+    Cached results are reused and each distinct uncached text is only analyzed once.
+    Passes Tweet data (with newly added analysis info) to 'save_tweets' function to save to database.
+    Tweets which fail analysis are logged and left out, the search only fails if no Tweet could be analyzed.
+    Every remote call takes quota as it is made. Low priority (background) work fails as a whole if any call
+    is shed, so it can be retried later; Tweets analyzed meanwhile are cached and cost no quota on the retry.
+
+    :param tweets: Parsed tweet data to analyze
+    :param search_term: Term associated with this search
+    :param priority: Rate limit priority of the analysis, "high" or "low"
+    :return: Tuple with number of Tweets inserted, skipped and failed
+    """
+
     # List to store our analyzed Tweet data
     output = []
+    errors = []
+
+    # Look up cached sentiment, grouping uncached Tweets with the same normalized text
+    keys = [sentiment_cache.key(tweet['text']) for tweet in tweets]
+    cached = sentiment_cache.get_many(keys)
+    uncached = {}
+    for tweet, key in zip(tweets, keys):
+        if key in cached:
+            tweet['sentiment'], tweet['sentimentScore'] = cached[key]
+            output.append(tweet)
+        else:
+            uncached.setdefault(key, []).append(tweet)
 
-    # Add processed results to list
-    while not out_queue.empty():
-        output.append(out_queue.get())
+    # Analyze one Tweet of each group and copy its result to the rest of the group
+    analyzed = {}
+    for tweet, error in analyze_tweets([group[0] for group in uncached.values()], config.ALCHEMY_STALL_TIMEOUT,
+                                       priority):
+        key = sentiment_cache.key(tweet['text'])
+        group = uncached[key]
+        if error is None:
+            analyzed[key] = (tweet['sentiment'], tweet['sentimentScore'])
+            for other in group[1:]:
+                other['sentiment'], other['sentimentScore'] = tweet['sentiment'], tweet['sentimentScore']
+            output.extend(group)
+        else:
+            errors.extend([str(error)] * len(group))
+
+    sentiment_cache.set_many(analyzed)
+
+    if errors:
+        app.logger.warning("Sentiment analysis failed for %d of %d tweets: %s", len(errors), len(tweets),
+                           ", ".join(sorted(set(errors))))
+        if priority == "low" and "AlchemyAPI rate limit" in errors:
+            raise Exception("AlchemyAPI rate limit")
+        if not output:
+            if "AlchemyAPI auth error" in errors:
+                raise Exception("AlchemyAPI auth error")
+            if "AlchemyAPI rate limit" in errors:
+                raise Exception("AlchemyAPI rate limit")
+            raise Exception("AlchemyAPI error")
 
     # Pass processed Tweets list to 'save_tweets' function to save to database
-    save_tweets(output, search_term, location_search_term)
+    inserted, skipped = save_tweets(output, search_term, location_search_term)
+
+    return inserted, skipped, len(errors)
@@ -1,7 +1,29 @@
 from app import db
+from collections import namedtuple
 from datetime import datetime
-from config import HEROKU_MODE
-import pytz
+import config
+
+
+# Stored location with the same attributes as the geopy Location objects used by the views
+Place = namedtuple("Place", ["latitude", "longitude", "address"])
+
+
+class TweetRow(object):
+    """
+    Read-only view of a stored Tweet with just the fields shown on the search results page.
+    Built from raw PyMongo documents, skipping MongoEngine document hydration and validation.
+    """
+
+    __slots__ = ("tweet_id", "tweet_time", "tweet_user", "tweet_user_fullname", "profile_image_url", "tweet_text",
+                 "sentiment_type", "sentiment_score")
+
+    def __init__(self, document):
+        """
+        :param document: Raw Tweet document, eg from a query set's 'as_pymongo'
+        """
+
+        for field in self.__slots__:
+            setattr(self, field, document.get(field))
 
 
 class Tweet(db.Document):
@@ -25,9 +47,16 @@ class Tweet(db.Document):
     stored_at = db.DateTimeField(default=datetime.now())
 
 
-    # Define database meta settings for index and ordering of 'Tweet' documents
+    # Define database meta settings for indexes and ordering of 'Tweet' documents
+    # Compound indexes match the keyword / location / sentiment / time filters used by helper.py
     meta = {
-        "index": ["-stored_at", "tweet_id"],
+        "indexes": [
+            "-stored_at",
+            ("keyword_search_term", "location_address", "tweet_time"),
+            ("keyword_search_term", "tweet_time"),
+            ("keyword_search_term", "sentiment_type"),
+            "tweet_time"
+        ],
         "ordering": ["-stored_at"]
     }
 
@@ -35,25 +64,219 @@ class Tweet(db.Document):
         """
         Calculates the time past since a given 'tweet_time'.
 
+        Pages showing many Tweets should use app.timeago.time_ago_labels for all of them at once.
+
         :return: The time in human readable format to a single precision, eg "2 hours ago".
         """
 
-        from simpledate import SimpleDate
-        from ago import human
+        from app.timeago import time_ago_labels
+
+        return time_ago_labels([self.tweet_time])[0]
+
+
+class SentimentRollup(db.Document):
+    """
+    MongoDB model for daily pre-aggregated sentiment of Tweets per keyword and location.
+    """
+
+    keyword_search_term = db.StringField(required=True)
+    location_address = db.StringField()
+    day = db.DateTimeField(required=True)
+    count = db.IntField(default=0)
+    total_score = db.FloatField(default=0)
+    positive = db.IntField(default=0)
+    neutral = db.IntField(default=0)
+    negative = db.IntField(default=0)
+
+    # Define database meta settings for collection name and indexes of 'SentimentRollup' documents
+    meta = {
+        "collection": "sentiment_rollup",
+        "indexes": [
+            {"fields": ("keyword_search_term", "location_address", "day"), "unique": True},
+            "day"
+        ]
+    }
+
+
+class CachedSentiment(db.Document):
+    """
+    MongoDB model for cached sentiment analysis results, keyed by a hash of the normalized Tweet text.
+    """
+
+    key = db.StringField(required=True, unique=True)
+    sentiment_type = db.StringField()
+    sentiment_score = db.FloatField()
+    stored_at = db.DateTimeField()
+
+    # Define database meta settings for collection name and TTL index of 'CachedSentiment' documents
+    # MongoDB removes expired results in the background, changing the TTL needs the index changing with collMod
+    meta = {
+        "collection": "sentiment_cache",
+        "indexes": [
+            {"fields": ["stored_at"], "expireAfterSeconds": config.SENTIMENT_CACHE_TTL}
+        ]
+    }
+
+
+class GeocodedPlace(db.Document):
+    """
+    MongoDB model for cached geocoding results, keyed by normalized place name.
+    """
 
-        # Localize time to UTC using pytz
-        tm = pytz.utc.localize(self.tweet_time)
+    name = db.StringField(required=True, unique=True)
+    # False if the place couldn't be geocoded
+    found = db.BooleanField()
+    latitude = db.FloatField()
+    longitude = db.FloatField()
+    address = db.StringField()
+    stored_at = db.DateTimeField()
 
-        if HEROKU_MODE:
-            tm = str(tm)
-            tm = tm.split("+")
-        else:
-            # Convert to BST time using SimpleDate and remove microseconds
-            tm = str(SimpleDate(tm).convert(country='GB'))
-            tm = tm.split('.')
+    # Define database meta settings for collection name and TTL index of 'GeocodedPlace' documents
+    # Unknown places expire sooner, which is still checked when they are read
+    meta = {
+        "collection": "geocode_cache",
+        "indexes": [
+            {"fields": ["stored_at"], "expireAfterSeconds": max(config.GEOCODE_CACHE_TTL, config.GEOCODE_NEGATIVE_TTL)}
+        ]
+    }
+
+
+class StreamCheckpoint(db.Document):
+    """
+    MongoDB model for the progress of the streaming ingestion worker.
+    """
 
-        # Convert to datetime object
-        tm = datetime.strptime(tm[0], '%Y-%m-%d %H:%M:%S')
+    name = db.StringField(required=True, unique=True)
+    last_tweet_id = db.IntField()
+    processed = db.IntField(default=0)
+    saved = db.IntField(default=0)
+    updated_at = db.DateTimeField()
 
-        # Use human to calculate and convert the time to an 'ago' format
-        return human(tm, 1)
\ No newline at end of file
+    # Define database meta settings for collection name of 'StreamCheckpoint' documents
+    meta = {
+        "collection": "stream_checkpoint"
+    }
+
+
+class SearchState(db.Document):
+    """
+    MongoDB model for the high water mark (newest ingested Tweet id) of keyword / location searches,
+    and a generation counter bumped whenever new Tweets are stored for them.
+    """
+
+    keyword_search_term = db.StringField(required=True)
+    location_address = db.StringField()
+    high_water_id = db.IntField()
+    generation = db.IntField(default=0)
+    updated_at = db.DateTimeField()
+
+    # Define database meta settings for collection name and index of 'SearchState' documents
+    meta = {
+        "collection": "search_state",
+        "indexes": [{"fields": ("keyword_search_term", "location_address"), "unique": True}]
+    }
+
+
+class SearchJob(db.Document):
+    """
+    MongoDB model for searches queued for the background worker.
+    """
+
+    keyword = db.StringField(required=True)
+    count = db.IntField(required=True)
+    location_search_term = db.StringField()
+    # One of "queued", "running", "done" or "failed"
+    status = db.StringField(default="queued")
+    error = db.StringField()
+    analyzed = db.IntField(default=0)
+    total = db.IntField(default=0)
+    # Ids of the Tweets found by the search so far, to show the job's own results while it runs
+    tweet_ids = db.ListField(db.IntField())
+    location_address = db.StringField()
+    location_latitude = db.FloatField()
+    location_longitude = db.FloatField()
+    created_at = db.DateTimeField(default=datetime.utcnow)
+    started_at = db.DateTimeField()
+    # Refreshed as each batch completes, a running job without a recent heartbeat was abandoned
+    heartbeat_at = db.DateTimeField()
+    finished_at = db.DateTimeField()
+
+    # Define database meta settings for collection name and index of 'SearchJob' documents
+    meta = {
+        "collection": "search_job",
+        "indexes": [("status", "created_at")]
+    }
+
+    def location(self):
+        """
+        :return: Location the search was restricted to, or None
+        """
+
+        if self.location_address is None:
+            return None
+
+        return Place(self.location_latitude, self.location_longitude, self.location_address)
+
+
+class RateBucket(db.Document):
+    """
+    MongoDB model for the state of a token bucket rate limiter shared by all dynos.
+    """
+
+    name = db.StringField(required=True, unique=True)
+    tokens = db.FloatField()
+    # Unix time the bucket was last updated
+    updated = db.FloatField()
+
+    # Define database meta settings for collection name of 'RateBucket' documents
+    meta = {
+        "collection": "rate_bucket"
+    }
+
+
+class TrendsSnapshot(db.Document):
+    """
+    MongoDB model for the materialized top 10 positive / negative sentiment trends.
+    """
+
+    name = db.StringField(required=True, unique=True)
+    positive = db.ListField(db.DictField())
+    negative = db.ListField(db.DictField())
+    computed_at = db.DateTimeField()
+    # Number of Tweets ingested since the snapshot was computed
+    pending_tweets = db.IntField(default=0)
+    # Time until which a process holds the claim to recompute the snapshot
+    refreshing_until = db.DateTimeField()
+
+    # Define database meta settings for collection name of 'TrendsSnapshot' documents
+    meta = {
+        "collection": "trends_snapshot"
+    }
+
+    def age(self):
+        """
+        :return: Number of seconds since the snapshot was computed
+        """
+
+        return (datetime.utcnow() - self.computed_at).total_seconds()
+
+
+class BatchValidation(db.Document):
+    """
+    MongoDB model for the verdict of the check that batched sentiment calls agree with single calls,
+    so it is made once per deployment rather than once per process.
+    """
+
+    name = db.StringField(required=True, unique=True)
+    # Whether texts are analyzed in batches, None until checked
+    batching = db.BooleanField()
+    agreement = db.FloatField()
+    sample = db.IntField()
+    checked_at = db.DateTimeField()
+    # Time until which a process holds the claim to run the check
+    validating_until = db.DateTimeField()
+
+    # Define database meta settings for collection name of 'BatchValidation' documents
+    meta = {
+        "collection": "batch_validation"
+    }
\ No newline at end of file
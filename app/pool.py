@@ -0,0 +1,89 @@
+from collections import deque
+from concurrent.futures import Future
+import threading
+
+
+class AnalysisPool(object):
+    """
+    Process-wide pool of worker threads shared by all in-flight requests.
+    Work is queued per request and workers take items from the queued requests in turn,
+    so one large search can't starve smaller searches submitted after it.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: Number of worker threads, the global concurrency cap
+        """
+
+        self.size = size
+        self.condition = threading.Condition()
+        # Queue of per-request deques of (future, function, item) tuples
+        self.batches = deque()
+        self.busy = 0
+        self.completed = 0
+
+        for i in range(size):
+            t = threading.Thread(target=self.worker, name="analysis-%d" % i)
+            t.daemon = True
+            t.start()
+
+    def submit_batch(self, fn, items):
+        """
+        Queues a request's items for processing.
+
+        :param fn: Function to call with each item
+        :param items: List of items
+        :return: List of futures, one for each item
+        """
+
+        batch = deque((Future(), fn, item) for item in items)
+        futures = [future for future, fn, item in batch]
+
+        if batch:
+            with self.condition:
+                self.batches.append(batch)
+                self.condition.notify(len(batch))
+
+        return futures
+
+    def worker(self):
+        """
+        Worker thread loop, takes the next item from the request at the front of the queue
+        then moves that request to the back.
+        """
+
+        while True:
+            with self.condition:
+                while not self.batches:
+                    self.condition.wait()
+                batch = self.batches.popleft()
+                future, fn, item = batch.popleft()
+                if batch:
+                    self.batches.append(batch)
+                self.busy += 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(item))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self.condition:
+                    self.busy -= 1
+                    self.completed += 1
+
+    def metrics(self):
+        """
+        :return: Dictionary with pool size, utilization, queue depth, number of queued requests and completed items
+        """
+
+        with self.condition:
+            return {
+                "size": self.size,
+                "busy": self.busy,
+                "utilization": float(self.busy) / self.size,
+                "queue_depth": sum(len(batch) for batch in self.batches),
+                "queued_requests": len(self.batches),
+                "completed": self.completed
+            }
@@ -0,0 +1,225 @@
+from app.models import Tweet, SentimentRollup
+from datetime import datetime
+
+
+def day_of(tm):
+    """
+    :param tm: A datetime
+    :return: Datetime at midnight of the same (UTC) day
+    """
+
+    return datetime(tm.year, tm.month, tm.day)
+
+
+def rollup_key(keyword, location, day):
+    """
+    :return: Raw MongoDB query identifying a single rollup document
+    """
+
+    return {"keyword_search_term": keyword, "location_address": location, "day": day}
+
+
+def update_rollups(records):
+    """
+    Increments daily sentiment rollups for newly saved Tweets using a single bulk of '$inc' upserts.
+
+    :param records: List of Tweet documents that have just been inserted
+    """
+
+    # Sum up increments per (keyword, location, day) locally first
+    increments = {}
+    for record in records:
+        key = (record.keyword_search_term, record.location_address, day_of(record.tweet_time))
+        inc = increments.setdefault(key, {"count": 0, "total_score": 0.0, "positive": 0, "neutral": 0, "negative": 0})
+        inc["count"] += 1
+        inc["total_score"] += record.sentiment_score or 0
+        if record.sentiment_type in ("positive", "neutral", "negative"):
+            inc[record.sentiment_type] += 1
+
+    if not increments:
+        return
+
+    bulk = SentimentRollup._get_collection().initialize_unordered_bulk_op()
+    for (keyword, location, day), inc in increments.items():
+        bulk.find(rollup_key(keyword, location, day)).upsert().update_one({"$inc": inc})
+    bulk.execute()
+
+
+# Values kept by each rollup document
+ROLLUP_FIELDS = ("count", "total_score", "positive", "neutral", "negative")
+
+
+def aggregate_raw():
+    """
+    Recomputes daily sentiment rollups from the raw Tweet collection.
+
+    :return: Dictionary mapping (keyword, location, day) to rollup values
+    """
+
+    # Get raw PyMongo collection
+    collection = Tweet._get_collection()
+
+    def count_type(sentiment_type):
+        return {"$sum": {"$cond": [{"$eq": ["$sentiment_type", sentiment_type]}, 1, 0]}}
+
+    result = collection.aggregate([
+        {
+            "$group":
+                {
+                    "_id":
+                    {
+                        "keyword": "$keyword_search_term",
+                        "location": "$location_address",
+                        "year": {"$year": "$tweet_time"},
+                        "month": {"$month": "$tweet_time"},
+                        "day": {"$dayOfMonth": "$tweet_time"}
+                    },
+                    "count": {"$sum": 1},
+                    "total_score": {"$sum": "$sentiment_score"},
+                    "positive": count_type("positive"),
+                    "neutral": count_type("neutral"),
+                    "negative": count_type("negative")
+                }
+        }
+    ], allowDiskUse=True)
+
+    rollups = {}
+    for i in result['result']:
+        key = (i['_id']['keyword'], i['_id'].get('location'),
+               datetime(i['_id']['year'], i['_id']['month'], i['_id']['day']))
+        rollups[key] = dict((field, i[field]) for field in ROLLUP_FIELDS)
+
+    return rollups
+
+
+# Maximum reconcile passes after a backfill
+BACKFILL_RECONCILE_PASSES = 3
+
+
+def backfill_rollups():
+    """
+    Rebuilds the rollup collection from existing Tweet data.
+
+    The new rollups are built in a staging collection which is then renamed over the live one, so readers never
+    see missing rollups. Increments applied to the old collection while the new one was built are reconciled after.
+
+    :return: Number of rollup documents written
+    """
+
+    rollups = aggregate_raw()
+
+    collection = SentimentRollup._get_collection()
+    staging = collection.database[collection.name + "_backfill"]
+    staging.drop()
+
+    # Create the model's indexes first, so concurrent upserts can't duplicate rollups once it goes live
+    for spec in SentimentRollup._meta['index_specs']:
+        staging.ensure_index(spec['fields'], unique=spec.get('unique', False))
+
+    documents = []
+    for (keyword, location, day), values in rollups.items():
+        document = rollup_key(keyword, location, day)
+        document.update(values)
+        documents.append(document)
+
+    if documents:
+        staging.insert(documents)
+
+    staging.rename(collection.name, dropTarget=True)
+
+    # Tweets saved after the raw aggregation incremented the old collection, add them back.
+    # Rollups busy with live increments are skipped by a pass, so make a few
+    for i in range(BACKFILL_RECONCILE_PASSES):
+        if not reconcile_rollups():
+            break
+
+    return len(documents)
+
+
+def reconcile_rollups():
+    """
+    Corrects rollups that differ from the raw Tweet collection by incrementing them by the difference,
+    and deletes rollups without any raw Tweets. Rollups receiving live '$inc' updates while the raw Tweets
+    are aggregated are left alone (see 'check_rollups'), so this is safe to run alongside them.
+
+    :return: Number of rollup documents corrected
+    """
+
+    mismatches = check_rollups()
+    if not mismatches:
+        return 0
+
+    bulk = SentimentRollup._get_collection().initialize_unordered_bulk_op()
+    for (keyword, location, day), want, have in mismatches:
+        if want is None:
+            # Only delete the rollup as it was read, not one a live update has just incremented
+            bulk.find(dict(rollup_key(keyword, location, day), count=have['count'])).remove_one()
+            continue
+        have = have or {}
+        inc = dict((field, want[field] - have.get(field, 0)) for field in ROLLUP_FIELDS)
+        bulk.find(rollup_key(keyword, location, day)).upsert().update_one({"$inc": inc})
+    bulk.execute()
+
+    return len(mismatches)
+
+
+def stored_rollups():
+    """
+    :return: Dictionary mapping (keyword, location, day) to the stored rollup values
+    """
+
+    stored = {}
+    for i in SentimentRollup._get_collection().find():
+        key = (i['keyword_search_term'], i.get('location_address'), i['day'])
+        stored[key] = dict((field, i.get(field, 0)) for field in ROLLUP_FIELDS)
+
+    return stored
+
+
+def check_rollups():
+    """
+    Compares the rollup collection to the raw Tweet collection.
+
+    The rollups are read before and after the (slow) raw aggregation. A rollup which changed in between was
+    incremented for Tweets the aggregation may or may not have counted, so it can't be compared and is skipped,
+    a later check picks it up once it is quiet. The only window left is a Tweet counted by the aggregation
+    whose increment lands after the second read, save_tweets increments right after inserting so it is brief.
+
+    :return: List of (key, expected values, stored values) tuples for every inconsistent rollup,
+        expected values are None for rollups without any raw Tweets
+    """
+
+    before = stored_rollups()
+    expected = aggregate_raw()
+    stored = stored_rollups()
+
+    mismatches = []
+    for key in set(expected) | set(stored):
+        have = stored.get(key)
+        if have != before.get(key):
+            continue
+        want = expected.get(key)
+        if want is None or have is None or any(abs(want[field] - have[field]) > 1e-6 for field in want):
+            mismatches.append((key, want, have))
+
+    return mismatches
+
+
+if __name__ == '__main__':
+    """
+    Maintenance commands for the daily sentiment rollups, run using: python -m app.rollup backfill|check|reconcile
+    """
+
+    import sys
+    if len(sys.argv) == 2 and sys.argv[1] == "backfill":
+        print("Wrote %d rollup documents" % backfill_rollups())
+    elif len(sys.argv) == 2 and sys.argv[1] == "check":
+        mismatches = check_rollups()
+        for key, want, have in mismatches:
+            print("%s: expected %s, stored %s" % (key, want, have))
+        print("%d inconsistent rollup documents" % len(mismatches))
+        sys.exit(1 if mismatches else 0)
+    elif len(sys.argv) == 2 and sys.argv[1] == "reconcile":
+        print("Corrected %d rollup documents" % reconcile_rollups())
+    else:
+        print("Usage: python -m app.rollup backfill|check|reconcile")
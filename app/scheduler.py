@@ -0,0 +1,132 @@
+from app.models import RateBucket
+import threading
+import time
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when work can't be admitted within the maximum wait and is shed.
+    """
+
+
+class Scheduler(object):
+    """
+    Token bucket rate limiter for upstream APIs, shared by all threads and, through MongoDB, all dynos.
+    Low priority work is only admitted while a bucket holds more than its reserve, leaving the reserve for
+    interactive requests. Work which can't be admitted waits for tokens to refill, up to a maximum wait,
+    and is otherwise shed.
+    """
+
+    # Retries of the optimistic compare-and-set update of a bucket before giving up
+    MAX_CONFLICTS = 5
+
+    def __init__(self, buckets, low_priority_reserve, max_wait):
+        """
+        :param buckets: Dictionary mapping bucket name to (capacity, tokens refilled per second)
+        :param low_priority_reserve: Fraction of each bucket's capacity only high priority work may use
+        :param max_wait: Maximum seconds to wait for tokens before shedding work
+        """
+
+        self.buckets = buckets
+        self.low_priority_reserve = low_priority_reserve
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.admitted = dict((name, 0) for name in buckets)
+        self.waited = dict((name, 0) for name in buckets)
+        self.shed = dict((name, 0) for name in buckets)
+
+    def refill(self, name, document, now):
+        """
+        :return: Number of tokens in a bucket document at the given time
+        """
+
+        capacity, rate = self.buckets[name]
+        return min(capacity, document['tokens'] + (now - document['updated']) * rate)
+
+    def take(self, name, tokens, reserve):
+        """
+        Attempts to take tokens from a bucket, leaving at least 'reserve' tokens behind.
+
+        :return: Tuple with whether the tokens were taken and the number of tokens available
+        """
+
+        collection = RateBucket._get_collection()
+        capacity, rate = self.buckets[name]
+
+        for i in range(self.MAX_CONFLICTS):
+            now = time.time()
+            document = collection.find_and_modify(
+                query={"name": name},
+                update={"$setOnInsert": {"tokens": float(capacity), "updated": now}},
+                upsert=True,
+                new=True
+            )
+
+            available = self.refill(name, document, now)
+            if available - tokens < reserve:
+                return False, available
+
+            # Only succeeds if no other thread or dyno updated the bucket since we read it
+            result = collection.update(
+                {"name": name, "tokens": document['tokens'], "updated": document['updated']},
+                {"$set": {"tokens": available - tokens, "updated": now}}
+            )
+            if result['n'] == 1:
+                return True, available - tokens
+
+        return False, 0
+
+    def acquire(self, name, tokens=1, priority="high"):
+        """
+        Takes tokens from a bucket, waiting for them to refill if necessary.
+        Raises RateLimitExceeded ("<name> rate limit") when the work has to be shed.
+
+        :param name: Bucket name, eg "twitter_search"
+        :param tokens: Number of calls about to be made
+        :param priority: "high" for interactive requests, "low" for background work
+        """
+
+        capacity, rate = self.buckets[name]
+        reserve = capacity * self.low_priority_reserve if priority == "low" else 0
+        deadline = time.time() + self.max_wait
+        waited = False
+
+        while True:
+            taken, available = self.take(name, tokens, reserve)
+            if taken:
+                with self.lock:
+                    self.admitted[name] += 1
+                    if waited:
+                        self.waited[name] += 1
+                return
+
+            # Wait until enough tokens should have refilled, if that is within the maximum wait
+            delay = max((tokens + reserve - available) / rate, 0.1)
+            if time.time() + delay > deadline:
+                with self.lock:
+                    self.shed[name] += 1
+                raise RateLimitExceeded(name + " rate limit")
+
+            waited = True
+            time.sleep(delay)
+
+    def metrics(self):
+        """
+        :return: Dictionary with each bucket's remaining budget, capacity and admitted / waited / shed counters
+        """
+
+        now = time.time()
+        documents = dict((document['name'], document) for document in RateBucket._get_collection().find())
+
+        with self.lock:
+            result = {}
+            for name, (capacity, rate) in self.buckets.items():
+                document = documents.get(name)
+                result[name] = {
+                    "remaining": self.refill(name, document, now) if document else float(capacity),
+                    "capacity": capacity,
+                    "admitted": self.admitted[name],
+                    "waited": self.waited[name],
+                    "shed": self.shed[name]
+                }
+            return result
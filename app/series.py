@@ -0,0 +1,184 @@
+from app.models import Tweet, SentimentRollup
+from datetime import datetime, timedelta
+
+
+# Width of the buckets of each supported series granularity
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1)
+}
+
+# Label format of the buckets of each granularity
+LABEL_FORMATS = {
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-%m-%d"
+}
+
+
+def bucket_start(tm, granularity):
+    """
+    :param tm: A (local) datetime
+    :param granularity: "hour", "day" or "week"
+    :return: Start of the bucket the time falls in, weeks start on Monday
+    """
+
+    if granularity == "hour":
+        return datetime(tm.year, tm.month, tm.day, tm.hour)
+
+    day = datetime(tm.year, tm.month, tm.day)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def bucket_starts(granularity, periods, now):
+    """
+    :param granularity: "hour", "day" or "week"
+    :param periods: Number of buckets
+    :param now: Local time the last bucket contains
+    :return: Sorted list with the start of each bucket of the window
+    """
+
+    step = GRANULARITIES[granularity]
+    last = bucket_start(now, granularity)
+    return [last - step * i for i in range(periods - 1, -1, -1)]
+
+
+def date_parts(field, granularity, tz_offset):
+    """
+    Builds the group key of a date field, shifted by a timezone offset, with the date parts needed for a granularity.
+
+    :param field: Name of the date field, eg "tweet_time"
+    :param granularity: "hour", "day" or "week"
+    :param tz_offset: Offset from UTC in minutes
+    :return: Dictionary for use as a '$group' stage '_id'
+    """
+
+    date = "$" + field
+    if tz_offset:
+        # Adding milliseconds to a date gives a date
+        date = {"$add": [date, tz_offset * 60 * 1000]}
+
+    parts = {"year": {"$year": date}, "month": {"$month": date}, "day": {"$dayOfMonth": date}}
+    if granularity == "hour":
+        parts["hour"] = {"$hour": date}
+
+    return parts
+
+
+def query_rollups(match, start, end):
+    """
+    Sums the daily rollups of a search within a UTC date range.
+
+    :return: List of (day, count, total score) tuples
+    """
+
+    match = dict(match, day={"$gte": start, "$lt": end})
+
+    result = SentimentRollup._get_collection().aggregate([
+        {
+            "$match": match
+        },
+        {
+            "$group":
+                {
+                    "_id": "$day",
+                    "count": {"$sum": "$count"},
+                    "total": {"$sum": "$total_score"}
+                }
+        }
+    ])
+
+    return [(i['_id'], i['count'], i['total']) for i in result['result']]
+
+
+def query_tweets(match, start, end, granularity, tz_offset):
+    """
+    Groups the Tweets of a search within a UTC time range by their local date parts.
+    The range is matched on the (keyword, location, tweet time) index, or the (keyword, tweet time) index
+    for keyword-only searches.
+
+    :return: List of (local time, count, total score) tuples
+    """
+
+    match = dict(match, tweet_time={"$gte": start, "$lt": end})
+
+    result = Tweet._get_collection().aggregate([
+        {
+            "$match": match
+        },
+        {
+            "$group":
+                {
+                    "_id": date_parts("tweet_time", granularity, tz_offset),
+                    "count": {"$sum": 1},
+                    "total": {"$sum": "$sentiment_score"}
+                }
+        }
+    ])
+
+    return [(datetime(i['_id']['year'], i['_id']['month'], i['_id']['day'], i['_id'].get('hour', 0)),
+             i['count'], i['total']) for i in result['result']]
+
+
+def sentiment_series(match, granularity="day", periods=10, tz_offset=0, now=None):
+    """
+    Gets a dense series of sentiment counts and score totals for the most recent buckets of a given granularity.
+    Whole days in UTC are read from the daily rollups, anything finer or offset from UTC from the raw Tweets,
+    so no reprocessing is needed to chart new granularities.
+
+    :param match: Raw MongoDB query of the search, as built by 'helper.search_match'
+    :param granularity: "hour", "day" or "week"
+    :param periods: Number of buckets, ending with the bucket containing the current time
+    :param tz_offset: Offset from UTC in minutes the buckets are aligned to
+    :param now: Current UTC time (optional)
+    :return: Sorted list of (bucket start, count, total score) tuples, with zeros for buckets without Tweets
+    """
+
+    if granularity not in GRANULARITIES:
+        raise ValueError("Unknown series granularity: " + str(granularity))
+
+    offset = timedelta(minutes=tz_offset)
+    starts = bucket_starts(granularity, periods, (now or datetime.utcnow()) + offset)
+
+    # UTC range covered by the window
+    start = starts[0] - offset
+    end = starts[-1] + GRANULARITIES[granularity] - offset
+
+    if granularity != "hour" and not tz_offset:
+        rows = query_rollups(match, start, end)
+    else:
+        rows = query_tweets(match, start, end, granularity, tz_offset)
+
+    # Fold query rows into their buckets
+    buckets = dict((bucket, [0, 0.0]) for bucket in starts)
+    for tm, count, total in rows:
+        bucket = buckets.get(bucket_start(tm, granularity))
+        if bucket is not None:
+            bucket[0] += count
+            bucket[1] += total
+
+    return [(bucket, buckets[bucket][0], buckets[bucket][1]) for bucket in starts]
+
+
+def series_averages(series, granularity):
+    """
+    :param series: Series as returned by 'sentiment_series'
+    :param granularity: Granularity of the series
+    :return: List of [label, average score] pairs for charting, with None for buckets without Tweets
+        so charts show a gap rather than a neutral score
+    """
+
+    return [[bucket.strftime(LABEL_FORMATS[granularity]), "{0:.2f}".format(total / count) if count else None]
+            for bucket, count, total in series]
+
+
+def chart_points(averages):
+    """
+    :param averages: List of [label, average score] pairs, as returned by 'series_averages'
+    :return: The pairs of buckets with Tweets, for charts which would otherwise plot a missing average as zero
+    """
+
+    return [point for point in averages if point[1] is not None]
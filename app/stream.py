@@ -0,0 +1,280 @@
+from twython import TwythonStreamer
+from app import app, manager
+from app.models import StreamCheckpoint
+from datetime import datetime
+import json
+import math
+import queue
+import re
+import threading
+import time
+import config
+
+
+# Radius (miles) around a tracked location, matching the radius of location searches
+LOCATION_RADIUS = 10
+
+# Words of a status text or keyword, leading "#" and "@" are not part of a word
+WORD = re.compile(r"\w+")
+
+
+def mentions(keyword, words):
+    """
+    Matches a tracked keyword like Twitter's 'track' parameter: every word of the keyword must appear as a whole
+    word of the status, so "cat" doesn't match "category". Hashtags and mentions match their bare word.
+
+    :param keyword: Tracked keyword (lowercase)
+    :param words: Set of the (lowercase) words of a status text
+    :return: True if the status mentions the keyword
+    """
+
+    terms = WORD.findall(keyword)
+
+    return bool(terms) and all(term in words for term in terms)
+
+
+def distance(latitude1, longitude1, latitude2, longitude2):
+    """
+    :return: Great circle distance in miles between two points
+    """
+
+    latitude1, longitude1, latitude2, longitude2 = map(math.radians, (latitude1, longitude1, latitude2, longitude2))
+    a = math.sin((latitude2 - latitude1) / 2) ** 2 + \
+        math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2
+    return 3959 * 2 * math.asin(math.sqrt(a))
+
+
+def bounding_box(location):
+    """
+    :param location: Location object from geopy
+    :return: Streaming API bounding box ("sw_lon,sw_lat,ne_lon,ne_lat") covering the location search radius
+    """
+
+    latitude = float(location.latitude)
+    longitude = float(location.longitude)
+    d_latitude = LOCATION_RADIUS / 69.0
+    d_longitude = LOCATION_RADIUS / (69.0 * math.cos(math.radians(latitude)))
+    return "%.4f,%.4f,%.4f,%.4f" % (longitude - d_longitude, latitude - d_latitude,
+                                    longitude + d_longitude, latitude + d_latitude)
+
+
+class StreamPipeline(object):
+    """
+    Parses, de-duplicates, analyzes and bulk saves streamed statuses for the tracked keywords and locations.
+    Statuses are held in a bounded buffer, when it is full the stream reader blocks until the pipeline catches up.
+    """
+
+    def __init__(self, keywords, locations, name="stream"):
+        """
+        :param keywords: List of tracked keywords
+        :param locations: Dictionary mapping tracked location search terms to geopy Location objects
+        :param name: Name the pipeline's checkpoint is stored under
+        """
+
+        self.keywords = keywords
+        self.locations = locations
+        self.buffer = queue.Queue(maxsize=config.STREAM_BUFFER_SIZE)
+
+        self.checkpoint = StreamCheckpoint.objects(name=name).first() or StreamCheckpoint(name=name)
+        if self.checkpoint.last_tweet_id:
+            app.logger.info("Resuming stream ingestion after Tweet %d", self.checkpoint.last_tweet_id)
+
+        t = threading.Thread(target=self.run)
+        t.daemon = True
+        t.start()
+
+    def put(self, status):
+        """
+        Adds a status to the buffer, blocking while the buffer is full.
+        """
+
+        self.buffer.put(status)
+
+    def drain(self):
+        """
+        Blocks until every buffered status has been processed.
+        """
+
+        self.buffer.join()
+
+    def run(self):
+        """
+        Pipeline thread loop, processes buffered statuses in batches of up to STREAM_BATCH_SIZE,
+        or whatever has arrived within STREAM_FLUSH_INTERVAL seconds.
+        Batches shed for lack of upstream quota are retried after STREAM_RETRY_INTERVAL seconds,
+        while new statuses wait in the buffer.
+        """
+
+        deferred = []
+
+        while True:
+            if deferred:
+                time.sleep(config.STREAM_RETRY_INTERVAL)
+                batch, deferred = deferred, []
+            else:
+                batch = [self.buffer.get()]
+                deadline = time.time() + config.STREAM_FLUSH_INTERVAL
+                while len(batch) < config.STREAM_BATCH_SIZE:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self.buffer.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+            try:
+                self.process(batch)
+            except Exception as e:
+                if str(e) in manager.RATE_LIMIT_ERRORS:
+                    app.logger.warning("Stream batch of %d statuses shed (%s), retrying in %d seconds",
+                                       len(batch), e, config.STREAM_RETRY_INTERVAL)
+                    deferred = batch
+                    continue
+                app.logger.error("Stream batch of %d statuses failed: %s", len(batch), e)
+
+            # Deferred statuses stay unfinished, so 'drain' waits for their retry
+            for i in batch:
+                self.buffer.task_done()
+
+    def locate(self, status):
+        """
+        :param status: Streamed status
+        :return: Search term of the tracked location the status was posted within, or None
+        """
+
+        coordinates = status.get('coordinates')
+        if not coordinates:
+            return None
+
+        longitude, latitude = coordinates['coordinates']
+        for name, location in self.locations.items():
+            if distance(latitude, longitude, float(location.latitude), float(location.longitude)) <= LOCATION_RADIUS:
+                return name
+
+        return None
+
+    def process(self, statuses):
+        """
+        Saves a batch of statuses under the first tracked keyword each one mentions, then updates the checkpoint.
+        Statuses may arrive out of order, those already stored are skipped by their id rather than the checkpoint.
+
+        :param statuses: List of streamed messages
+        """
+
+        # Skip delete / limit notices and non English statuses
+        statuses = [status for status in statuses if 'text' in status and status.get('lang') == "en"]
+
+        new_statuses, in_db = manager.filter_new_statuses(statuses)
+
+        # Group parsed Tweets by keyword and location
+        groups = {}
+        for status in new_statuses:
+            words = set(WORD.findall(status['text'].lower()))
+            for keyword in self.keywords:
+                if mentions(keyword, words):
+                    name = self.locate(status)
+                    tweet = manager.parse_status(status, self.locations.get(name))
+                    groups.setdefault((keyword, name), []).append(tweet)
+                    break
+
+        saved = 0
+        for (keyword, name), tweets in groups.items():
+            inserted, skipped, failed = manager.analysis_supervisor(tweets, keyword, name, "low")
+            saved += inserted
+
+        # Record progress
+        if statuses:
+            self.checkpoint.last_tweet_id = max([status['id'] for status in statuses] +
+                                                [self.checkpoint.last_tweet_id or 0])
+        self.checkpoint.processed += len(statuses)
+        self.checkpoint.saved += saved
+        self.checkpoint.updated_at = datetime.utcnow()
+        self.checkpoint.save()
+
+
+class FilterStreamer(TwythonStreamer):
+    """
+    Twitter filter stream feeding a StreamPipeline.
+    """
+
+    def __init__(self, pipeline):
+        """
+        :param pipeline: StreamPipeline to pass statuses to
+        """
+
+        TwythonStreamer.__init__(self, config.TWITTER_CONSUMER_KEY, config.TWITTER_CONSUMER_SECRET,
+                                 config.TWITTER_ACCESS_TOKEN, config.TWITTER_ACCESS_TOKEN_SECRET)
+        self.pipeline = pipeline
+
+    def on_success(self, data):
+        self.pipeline.put(data)
+
+    def on_error(self, status_code, data):
+        app.logger.warning("Twitter stream error %s: %s", status_code, data)
+        if status_code == 420:
+            # Being rate limited, back off before reconnecting
+            time.sleep(60)
+
+
+def create_pipeline():
+    """
+    :return: StreamPipeline for the keywords and locations tracked in config.py
+    """
+
+    keywords = manager.tracked_keywords()
+    locations = dict((name, manager.get_geo_info(name)) for name in manager.tracked_locations())
+
+    return StreamPipeline(keywords, locations)
+
+
+def run():
+    """
+    Holds a filtered stream for the tracked keywords and locations, reconnecting when it drops.
+    Refuses to start when no keywords are tracked, as statuses are only stored under a tracked keyword.
+    """
+
+    if not config.STREAM_TRACK_KEYWORDS:
+        app.logger.error("No keywords to stream, set STREAM_TRACK_KEYWORDS in config.py")
+        return
+
+    pipeline = create_pipeline()
+
+    track = ",".join(pipeline.keywords)
+    boxes = ",".join(bounding_box(location) for location in pipeline.locations.values())
+
+    while True:
+        streamer = FilterStreamer(pipeline)
+        try:
+            if boxes:
+                streamer.statuses.filter(track=track, locations=boxes)
+            else:
+                streamer.statuses.filter(track=track)
+        except Exception as e:
+            app.logger.warning("Twitter stream disconnected: %s", e)
+        time.sleep(5)
+
+
+def replay(path, pipeline=None):
+    """
+    Feeds a recorded stream (one JSON message per line) through the pipeline.
+    Statuses at or before the pipeline's checkpoint were ingested by an earlier replay and are skipped,
+    so an interrupted replay can be resumed.
+
+    :param path: Path of the recorded stream file
+    :param pipeline: StreamPipeline to feed (optional, defaults to one for the keywords tracked in config.py)
+    """
+
+    pipeline = pipeline or create_pipeline()
+    last_tweet_id = pipeline.checkpoint.last_tweet_id or 0
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                status = json.loads(line)
+                if 'id' in status and status['id'] <= last_tweet_id:
+                    continue
+                pipeline.put(status)
+
+    pipeline.drain()
@@ -0,0 +1,50 @@
+from config import HEROKU_MODE
+from datetime import datetime
+import pytz
+
+
+# Timezone 'ago' labels are shown in when not running on Heroku (the only timezone of country 'GB')
+LOCAL_TIMEZONE = pytz.timezone("Europe/London")
+
+
+def local_times(times):
+    """
+    Converts UTC Tweet times to the naive local times the 'ago' labels are calculated from.
+    On Heroku times stay in UTC, otherwise they are converted to UK time. The UK offset only changes on the hour,
+    so it is looked up once per hour the results fall in rather than once per Tweet.
+
+    :param times: Naive UTC datetimes
+    :return: List of naive local datetimes without microseconds
+    """
+
+    offsets = {}
+    converted = []
+
+    for tm in times:
+        tm = tm.replace(microsecond=0)
+        if not HEROKU_MODE:
+            hour = tm.replace(minute=0, second=0)
+            offset = offsets.get(hour)
+            if offset is None:
+                offset = offsets[hour] = pytz.utc.localize(hour).astimezone(LOCAL_TIMEZONE).utcoffset()
+            tm += offset
+        converted.append(tm)
+
+    return converted
+
+
+def time_ago_labels(times, now=None):
+    """
+    Calculates the time past since each of a set of Tweet times, in one pass against a single 'now'.
+
+    :param times: Naive UTC datetimes, eg the 'tweet_time' of each search result
+    :param now: Local time to measure from (optional, defaults to the current time)
+    :return: List of times in human readable format to a single precision, eg "2 hours ago"
+    """
+
+    from ago import human
+
+    if now is None:
+        now = datetime.now()
+
+    return [human(now - tm, 1) for tm in local_times(times)]
@@ -0,0 +1,136 @@
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+import requests
+import threading
+import time
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class CallRejected(Exception):
+    """
+    Raised by a transport's meter to refuse a call, before anything is sent.
+    """
+
+
+class HTTPTransport(object):
+    """
+    Pooled HTTP session with timeouts, retries with exponential backoff and per-endpoint latency histograms.
+    Safe to share between threads.
+    """
+
+    # Errors clients should raise to their caller rather than handle as a failed request
+    passthrough_errors = (CallRejected,)
+
+    def __init__(self, pool_size=10, timeout=None, retries=0, backoff=0.5, retry_statuses=(429, 500, 502, 503, 504),
+                 deadline=None, meter=None):
+        """
+        :param pool_size: Maximum number of kept-alive connections per host, should match the concurrency limit
+        :param timeout: Seconds to wait for the connection and for each read (None waits forever)
+        :param retries: Number of times a failed request is retried
+        :param backoff: Seconds to wait before the first retry, doubled for each further retry
+        :param retry_statuses: HTTP status codes which are retried
+        :param deadline: Seconds a call may take in total including retries and backoff (None for no limit)
+        :param meter: Function called with the endpoint before every attempt, including retries (optional).
+            It may raise CallRejected to refuse the attempt, eg when out of quota.
+        """
+
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_statuses = retry_statuses
+        self.meter = meter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        # Maps endpoint to a list of bucket counts, the last bucket counting requests slower than all bounds
+        self.histograms = {}
+        self.retried = 0
+
+    def post(self, endpoint, url, data=None):
+        """
+        Posts to a URL, retrying on connection errors, timeouts and retryable status codes.
+        No attempt or backoff runs past the deadline, so a call never holds its thread longer than that.
+        Every attempt is passed to the meter first, if there is one.
+
+        :param endpoint: Name the request's latency is recorded under
+        :param url: Full URL to post to
+        :param data: Request body
+        :return: Response of the last attempt
+        """
+
+        attempt = 0
+        expires = time.time() + self.deadline if self.deadline is not None else None
+
+        while True:
+            # Shorten the last attempt's timeout to what is left of the deadline
+            timeout = self.timeout
+            if expires is not None:
+                remaining = max(expires - time.time(), 0.001)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+
+            if self.meter is not None:
+                self.meter(endpoint)
+
+            start = time.time()
+            try:
+                response = self.session.post(url=url, data=data, timeout=timeout)
+            except (ConnectionError, Timeout):
+                self.record(endpoint, time.time() - start)
+                if attempt >= self.retries or self.expired(expires, attempt):
+                    raise
+            else:
+                self.record(endpoint, time.time() - start)
+                if response.status_code not in self.retry_statuses or attempt >= self.retries \
+                        or self.expired(expires, attempt):
+                    return response
+
+            # Back off exponentially before retrying
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+            with self.lock:
+                self.retried += 1
+
+    def expired(self, expires, attempt):
+        """
+        :param expires: Time the call's deadline expires, or None
+        :param attempt: Number of the attempt that just failed
+        :return: True if backing off for another attempt would pass the deadline
+        """
+
+        return expires is not None and time.time() + self.backoff * (2 ** attempt) >= expires
+
+    def record(self, endpoint, elapsed):
+        """
+        Adds a request's latency to the endpoint's histogram.
+        """
+
+        with self.lock:
+            histogram = self.histograms.setdefault(endpoint, [0] * (len(LATENCY_BUCKETS) + 1))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[-1] += 1
+
+    def metrics(self):
+        """
+        :return: Dictionary with number of retries and per-endpoint latency histograms
+        """
+
+        labels = ["<=%ss" % bound for bound in LATENCY_BUCKETS] + [">%ss" % LATENCY_BUCKETS[-1]]
+
+        with self.lock:
+            return {
+                "retried": self.retried,
+                "latency": dict((endpoint, dict(zip(labels, histogram)))
+                                for endpoint, histogram in self.histograms.items())
+            }
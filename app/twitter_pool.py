@@ -0,0 +1,193 @@
+from twython import Twython, TwythonAuthError, TwythonRateLimitError
+from queue import Queue, Empty
+import threading
+import time
+import config
+
+
+def twitter_auth():
+    """
+    Imports Twitter API credentials from config file and performs OAuth2 using app credentials from config.py.
+    Used by the process-wide Twitter client pool to create its clients.
+
+    :return: Authorized instance of Twython
+    """
+
+    # Pulling Twitter API credentials from config.py
+    key = config.TWITTER_CONSUMER_KEY
+    key_secret = config.TWITTER_CONSUMER_SECRET
+    token = config.TWITTER_ACCESS_TOKEN
+    token_secret = config.TWITTER_ACCESS_TOKEN_SECRET
+
+    # Attempting OAuth connection to Twitter using Twython with API credentials
+    try:
+        twitter = Twython(key, key_secret, token, token_secret)
+    except TwythonAuthError:
+        raise Exception("Twython auth error")
+
+    return twitter
+
+
+class TwitterPool(object):
+    """
+    Process-wide pool of authenticated Twython clients, each keeping its own kept-alive HTTP session.
+    A client is only used by one thread at a time. Rate limit headers returned by Twitter are tracked
+    per resource, so calls are rejected locally once a window is exhausted rather than hitting 429s.
+    """
+
+    def __init__(self, size, factory):
+        """
+        :param size: Maximum number of clients, ie concurrent Twitter calls
+        :param factory: Function returning a new authenticated Twython client
+        """
+
+        self.size = size
+        self.factory = factory
+        self.clients = Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+        # Maps resource (eg "search/tweets") to {"limit", "remaining", "reset"}
+        self.limits = {}
+        self.calls = 0
+        self.rejected = 0
+        # Response bytes received in total, and by each thread's last call
+        self.received = 0
+        self.last = threading.local()
+
+    def acquire(self):
+        """
+        :return: An idle client, creating one if the pool isn't full, otherwise waiting for one to be released
+        """
+
+        try:
+            return self.clients.get_nowait()
+        except Empty:
+            pass
+
+        with self.lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+
+        if create:
+            try:
+                return self.factory()
+            except:
+                with self.lock:
+                    self.created -= 1
+                raise
+
+        return self.clients.get()
+
+    def release(self, client):
+        """
+        Returns a client to the pool.
+        """
+
+        self.clients.put(client)
+
+    def remaining(self, resource):
+        """
+        :param resource: Twitter API resource, eg "search/tweets"
+        :return: Number of calls remaining in the resource's current window, or None if unknown
+        """
+
+        with self.lock:
+            limit = self.limits.get(resource)
+            if limit is None or limit["reset"] <= time.time():
+                return None
+            return limit["remaining"]
+
+    def request(self, resource, method, **params):
+        """
+        Calls a Twython method using a pooled client.
+
+        :param resource: Twitter API resource the method calls, eg "search/tweets"
+        :param method: Name of the Twython method, eg "search"
+        :param params: Parameters to pass to the method
+        :return: The method's result
+        """
+
+        if self.remaining(resource) == 0:
+            with self.lock:
+                self.rejected += 1
+            raise Exception("Twitter rate limit")
+
+        client = self.acquire()
+        try:
+            result = getattr(client, method)(**params)
+            self.update(resource, client)
+            size = self.response_size(client)
+            self.last.size = size
+            with self.lock:
+                self.received += size
+            return result
+        except TwythonRateLimitError:
+            # Window exhausted, block further calls until the reset time in the 429's headers (or for 15 minutes)
+            self.update(resource, client)
+            with self.lock:
+                limit = self.limits.get(resource)
+                if limit is None or limit["reset"] <= time.time():
+                    limit = {"limit": limit and limit["limit"], "reset": time.time() + 15 * 60}
+                limit["remaining"] = 0
+                self.limits[resource] = limit
+            raise Exception("Twitter rate limit")
+        finally:
+            with self.lock:
+                self.calls += 1
+            self.release(client)
+
+    def update(self, resource, client):
+        """
+        Records the rate limit headers of a client's last call.
+        """
+
+        remaining = client.get_lastfunction_header("x-rate-limit-remaining")
+        if remaining is None:
+            return
+
+        limit = client.get_lastfunction_header("x-rate-limit-limit")
+        reset = client.get_lastfunction_header("x-rate-limit-reset")
+
+        with self.lock:
+            self.limits[resource] = {
+                "limit": int(limit) if limit else None,
+                "remaining": int(remaining),
+                "reset": float(reset) if reset else time.time() + 15 * 60
+            }
+
+    def response_size(self, client):
+        """
+        :return: Size in bytes of a client's last response, as sent by Twitter if known, otherwise once decoded
+        """
+
+        length = client.get_lastfunction_header("content-length")
+        if length:
+            return int(length)
+
+        # Twython keeps the decoded body of the last call, but has no public accessor for it
+        return len(client._last_call["content"].encode("utf-8"))
+
+    def last_response_size(self):
+        """
+        :return: Size in bytes of the response to the calling thread's last successful request
+        """
+
+        return getattr(self.last, "size", 0)
+
+    def metrics(self):
+        """
+        :return: Dictionary with pool size, clients created, calls made / rejected, bytes received and
+                 per-resource rate limits
+        """
+
+        with self.lock:
+            return {
+                "size": self.size,
+                "created": self.created,
+                "idle": self.clients.qsize(),
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "received": self.received,
+                "rate_limits": dict((resource, dict(limit)) for resource, limit in self.limits.items())
+            }
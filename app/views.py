@@ -1,8 +1,9 @@
-from flask import render_template, flash, redirect, url_for, request
+from flask import render_template, flash, redirect, url_for, request, jsonify, abort, make_response
 from mongoengine import *
-from app import app
-from app.models import Tweet
+from app import app, analysis_pool, sentiment_cache, geocode_cache, twitter_pool, scheduler, response_cache
+from app.models import Tweet, TweetRow, SearchJob
 from app.forms import SearchFrom
+from bson import ObjectId
 import config
 
 
@@ -41,190 +42,403 @@ def contact():
     return render_template("contact.html", page=page)
 
 
+def search_error_message(e, keyword, location_search_term=None):
+    """
+    :param e: Message of an exception raised while retrieving / analyzing / saving data
+    :param keyword: Search keyword
+    :param location_search_term: Location search term (optional)
+    :return: Message to show the user
+    """
+
+    if e == "No Twitter results returned":
+        if location_search_term:
+            return "Sorry, Twitter returned no results for: \"" + keyword + "\" near " + "\"" + \
+                   location_search_term + "\""
+        else:
+            return "Sorry, Twitter returned no results for: \"" + keyword + "\""
+    elif e == "Twython auth error":
+        return "Oops, it appears we're having trouble connecting to Twitter. Please try again later."
+    elif e == "Twitter rate limit":
+        return "Phew, TweetVibe is popular right now and we've hit Twitter's search limit. Please try again in a few minutes."
+    elif e == "AlchemyAPI auth error":
+        return "Oops, it appears we're having trouble connecting to our language processing API. " \
+               "Please try again later."
+    elif e == "AlchemyAPI rate limit":
+        return "Phew, TweetVibe is popular right now and we've used up our language processing quota. " \
+               "Please try again later."
+    elif e == "AlchemyAPI error":
+        return "Oops, it appears we had trouble analyzing one or more of the results for that search"
+    elif e == "Not an English language user":
+        return "Sorry, it appears that account " + keyword + " is not an English language user. Presently, " \
+               "Tweetvibe can only analyze English tweets."
+    elif e == "Location error":
+        return "Oops, it appears we had trouble identifying location " + "\"" + location_search_term + "\""
+    elif e == "Database error":
+        return "Oops, it appears we are experiencing a problem interacting with our database."
+    else:
+        return "Oops, something went wrong. A team of highly trained engineer monkeys have been dispatched to" \
+               " fix the problem. Please try again later."
+
+
+def query_results(keyword, count, location=None):
+    """
+    :param keyword: Search keyword
+    :param count: Number of results
+    :param location: Location object the search was restricted to (optional)
+    :return: List of TweetRow for the most recent results for a search
+    """
+
+    if location:
+        query = Tweet.objects(Q(keyword_search_term=keyword) & Q(location_address=location.address)).order_by('-stored_at', '-tweet_time').limit(int(count))
+    else:
+        query = Tweet.objects(keyword_search_term=keyword).order_by('-stored_at', '-tweet_time').limit(int(count))
+
+    # Fetch only the displayed fields as raw documents
+    return [TweetRow(document) for document in query.only(*TweetRow.__slots__).as_pymongo()]
+
+
+def job_results(job):
+    """
+    :param job: Search job
+    :return: List of TweetRow for the Tweets the job has analyzed so far, most recent first
+    """
+
+    query = Tweet.objects(tweet_id__in=job.tweet_ids).order_by('-tweet_time')
+
+    return [TweetRow(document) for document in query.only(*TweetRow.__slots__).as_pymongo()]
+
+
+def get_job_or_404(job_id):
+    """
+    :param job_id: Id of a search job, as given in the URL
+    :return: The search job, aborts with 404 if the id is malformed or unknown
+    """
+
+    if not ObjectId.is_valid(job_id):
+        abort(404)
+
+    job = SearchJob.objects(id=job_id).first()
+    if job is None:
+        abort(404)
+
+    return job
+
+
+def has_stored_results(keyword, location=None):
+    """
+    :param keyword: Search keyword
+    :param location: Location object the search was restricted to (optional)
+    :return: True if the database holds results for the search
+    """
+
+    from app import helper
+
+    try:
+        return helper.count_tweets(keyword, location.address if location else None) > 0
+    except Exception:
+        return False
+
+
+def render_results(keyword, count, location, location_search_term, started, finished=None, refresh=None, stale=False):
+    """
+    Gets results of a completed search from the database and renders the search template with them.
+
+    :param keyword: Search keyword
+    :param count: Number of results
+    :param location: Location object the search was restricted to (optional)
+    :param location_search_term: Location search term (optional)
+    :param started: Time the search was started
+    :param finished: Time the search finished (optional, defaults to now)
+    :param refresh: SearchStats of the keyword search, reporting what the incremental refresh fetched (optional)
+    :param stale: Whether only previously stored results could be shown because an upstream quota ran out
+    :return: Rendered template with search results, or redirect to homepage if an exception occurs
+    """
+
+    from app import helper
+    import time
+
+    page = "search"
+
+    # Attempt to get results from database
+    try:
+        results = query_results(keyword, count, location)
+    except:
+        flash("Oops, it appears we are experiencing a problem querying our database.")
+        return redirect(url_for('index'))
+
+    # Attempt to calculate statistics for results page
+    try:
+        if location:
+            summary = helper.SearchSummary(keyword, results, location.address)
+        else:
+            summary = helper.SearchSummary(keyword, results)
+    except:
+        flash("Oops, something went wrong. A team of highly trained engineer monkeys have been dispatched to"
+              " fix the problem. Please try again later.")
+        return redirect(url_for('index'))
+
+    # Calculate time taken to perform search and analysis
+    t2 = finished or time.time()
+    time_taken = t2 - started
+
+    if location:
+        # Format location latitude/longitude to 2 decimal places
+        longitude = "{:.2f}".format(float(location.longitude))
+        latitude = "{:.2f}".format(float(location.latitude))
+        return render_template(
+            "search.html",
+            time_taken=time_taken,
+            page=page,
+            keyword=keyword,
+            location_search_term=location_search_term,
+            location=location.address,
+            longitude=longitude,
+            latitude=latitude,
+            search_count=count,
+            refresh=refresh,
+            stale=stale,
+            **summary.context()
+        )
+    elif keyword[0] == "@":
+        return render_template(
+            "search.html",
+            time_taken=time_taken,
+            page=page,
+            user=keyword,
+            search_count=count,
+            refresh=refresh,
+            stale=stale,
+            **summary.context()
+        )
+    else:
+        return render_template(
+            "search.html",
+            time_taken=time_taken,
+            page=page,
+            keyword=keyword,
+            search_count=count,
+            refresh=refresh,
+            stale=stale,
+            **summary.context()
+        )
+
+
+def conditional_response(body, etag):
+    """
+    :param body: Rendered page
+    :param etag: ETag of the page
+    :return: 304 Not Modified response if the client already holds the page, otherwise the page with its ETag
+    """
+
+    if etag in request.if_none_match:
+        response_cache.record_not_modified()
+        response = make_response("", 304)
+    else:
+        response = make_response(body)
+    response.set_etag(etag)
+    return response
+
+
+def search_params(form):
+    """
+    Validates the parameters of a search, flashing a message for the user if they are invalid.
+
+    :param form: Submitted form or query string arguments, with 'keyword', 'count' and 'location'
+    :return: Tuple with keyword, count and location search term (or None), or None if the search is invalid
+    """
+
+    # Get form data with trailing spaces removed
+    keyword = form.get('keyword', '').strip()
+    count = form.get('count', '').strip()
+    location = form.get('location', '').strip()
+
+    # Check if search term has been provided
+    if not keyword:
+        flash("Blessed are the forgetful! Looks like you didn't enter a search parameter.")
+        return None
+
+    # If user hasn't specified a number of Tweets to search for, use defualt (15)
+    if not count:
+        count = config.TWEET_SEARCH_LIMIT_DEFAULT
+
+    # Check supplied count is a valid number
+    try:
+        count = int(count)
+    except ValueError:
+        count = 0
+
+    # Queued searches run in the background, so may fetch more pages than searches answered directly
+    limit = config.TWEET_SEARCH_LIMIT_MAX_JOB if config.SEARCH_JOB_MODE else config.TWEET_SEARCH_LIMIT_MAX
+
+    # If count provided, check to sure it does not exceed max (defined in config.py)
+    if count > limit:
+        # If exceeds max, set count to max
+        count = limit
+
+    # Check if supplied count is negative
+    if count <= 0:
+        flash("Please enter a valid number of Tweets to search (1-" + str(limit) + ")")
+        return None
+
+    keyword = keyword.lower()
+    location_search_term = None
+
+    # User searches are not restricted to a location
+    if location and keyword[0] != "@":
+        location_search_term = location.lower()
+
+    return keyword, count, location_search_term
+
+
 @app.route("/search", methods=['GET', 'POST'])
 def search():
     """
-    Handles post request from index page search form, processes form and calls manager functions accordingly.
-    Passes results to rendered search template, or redirects user to homepage if exception occurs.
+    Handles post request from index page search form, redirecting to the results URL of the search
+    (/search?keyword=...&location=...&count=...) so results pages can be cached, bookmarked and revalidated.
+    Get requests call manager functions to perform the search and pass results to rendered search template,
+    or redirect user to homepage if exception occurs.
+    In job mode (defined in config.py) the search is queued for the background worker instead.
+    Repeats of a recent search are served from the results page cache until new Tweets are stored for it,
+    with an ETag so clients holding the page get a 304 Not Modified.
 
     :return:    Rendered template with search results
     """
 
     from app import manager
-    from app import helper
     import time
 
-    page = "search"
+    form = request.form if request.method == 'POST' else request.args
 
-    if request.method == 'POST':
-        # Get form data with trailing spaces removed
-        keyword = request.form['keyword'].strip()
-        count = request.form['count'].strip()
-        location = request.form['location'].strip()
-
-        # Check if search term has been provided
-        if not keyword:
-            flash("Blessed are the forgetful! Looks like you didn't enter a search parameter.")
-            return redirect(url_for('index'))
+    # Plain visits to the results URL go to the search form
+    if request.method == 'GET' and 'keyword' not in form:
+        return redirect(url_for('index'))
+
+    params = search_params(form)
+    if params is None:
+        return redirect(url_for('index'))
 
-        # If user hasn't specified a number of Tweets to search for, use defualt (15)
-        if not count:
-            count = config.TWEET_SEARCH_LIMIT_DEFAULT
+    keyword, count, location_search_term = params
 
-        # If count provided, check to sure it does not exceed max (100)
-        if int(count) > config.TWEET_SEARCH_LIMIT_MAX:
-            # If exceeds max, set count to max
-            count = config.TWEET_SEARCH_LIMIT_MAX
+    # Queue search for the background worker
+    if config.SEARCH_JOB_MODE:
+        job = SearchJob(keyword=keyword, count=count, location_search_term=location_search_term).save()
+        return redirect(url_for('search_job', job_id=str(job.id)))
 
-        # Check if supplied count is negative
-        if int(count) <= 0:
-            flash("Please enter a valid number of Tweets to search (1-100)")
-            return redirect(url_for('index'))
+    key = (keyword, location_search_term, count)
 
-        user_search = False
-        location_search_term = None
-
-        # Get time
-        t1 = time.time()
-
-        # Attempt to perform search, analysis and storage
-        try:
-            if keyword and not location:
-                keyword = keyword.lower()
-                # Check if searching for a user
-                if keyword[0] == "@":
-                    user_search = True
-                    manager.analysis_supervisor(manager.search_user(keyword, count), keyword)
-                else:
-                    manager.analysis_supervisor(manager.search_keyword(keyword, count), keyword)
-            if keyword and location:
-                keyword = keyword.lower()
-                location = location.lower()
-                # Check if searching for a user
-                if keyword[0] == "@":
-                    user_search = True
-                    manager.analysis_supervisor(manager.search_user(keyword, count), keyword)
-                else:
-                    location_search_term = location
-                    location = manager.get_geo_info(location_search_term)
-                    manager.analysis_supervisor(manager.search_keyword(keyword, count, location), keyword, location_search_term)
-        except Exception as e:
+    if request.method == 'POST':
+        # Conditional posts can't be answered with 304, the precondition failed if the client holds the page
+        if request.if_none_match:
+            cached = response_cache.get(key)
+            if cached and cached[1] in request.if_none_match:
+                abort(412)
+
+        return redirect(url_for('search', keyword=keyword, location=location_search_term or "", count=count), 303)
+
+    # Serve a recently rendered page for the same search
+    cached = response_cache.get(key)
+    if cached:
+        return conditional_response(*cached)
+
+    # Get time
+    t1 = time.time()
+
+    location = None
+    refresh = None
+    stale = False
+
+    # Attempt to perform search, analysis and storage
+    try:
+        if location_search_term:
+            location = manager.get_geo_info(location_search_term)
+        refresh = manager.run_search(keyword, count, location, location_search_term)
+    except Exception as e:
+        # Serve stored results when an upstream quota has run out, if there are any
+        if str(e) in manager.RATE_LIMIT_ERRORS and has_stored_results(keyword, location):
+            stale = True
+        else:
             # Exception handling for any errors that may occur in retrieving / analyzing / saving data
-            e = str(e)
-            if e == "No Twitter results returned":
-                if location_search_term:
-                    flash("Sorry, Twitter returned no results for: \"" + keyword + "\" near " + "\"" +
-                          location_search_term + "\"")
-                else:
-                    flash("Sorry, Twitter returned no results for: \"" + keyword + "\"")
-            elif e == "Twython auth error":
-                flash("Oops, it appears we're having trouble connecting to Twitter. Please try again later.")
-            elif e == "AlchemyAPI auth error":
-                flash("Oops, it appears we're having trouble connecting to our language processing API. "
-                      "Please try again later.")
-            elif e == "AlchemyAPI error":
-                flash("Oops, it appears we had trouble analyzing one or more of the results for that search")
-            elif e == "Not an English language user":
-                flash("Sorry, it appears that account " + keyword + " is not an English language user. Presently, "
-                      "Tweetvibe can only analyze English tweets.")
-            elif e == "Location error":
-                flash("Oops, it appears we had trouble identifying location " + "\"" + location_search_term + "\"")
-            elif e == "Database error":
-                flash("Oops, it appears we are experiencing a problem interacting with our database.")
-            else:
-                flash("Oops, something went wrong. A team of highly trained engineer monkeys have been dispatched to"
-                      " fix the problem. Please try again later.")
+            flash(search_error_message(str(e), keyword, location_search_term))
             # Redirect to index with flash message
             return redirect(url_for('index'))
 
-        # Attempt to get results from database
-        try:
-            if location:
-                results = Tweet.objects(Q(keyword_search_term=keyword) & Q(location_address=location.address)).order_by('-stored_at', '-tweet_time').limit(int(count))
-            else:
-                results = Tweet.objects(keyword_search_term=keyword).order_by('-stored_at', '-tweet_time').limit(int(count))
-        except:
-            flash("Oops, it appears we are experiencing a problem querying our database.")
-            return redirect(url_for('index'))
+    # Read the search's generation before rendering, so Tweets stored meanwhile invalidate the page
+    location_address = location.address if location else None
+    generation = response_cache.generation(keyword, location_address)
 
-        try:
-            search_aggregate = helper.aggregate_sentiment(results)
-            search_avg = helper.get_query_sentiment_avg(results)
-        except:
-            flash("Oops, something went wrong. A team of highly trained engineer monkeys have been dispatched to"
-                  " fix the problem. Please try again later.")
-            return redirect(url_for('index'))
+    page = render_results(keyword, count, location, location_search_term, t1, refresh=refresh, stale=stale)
 
-        # Calculate time taken to perform search and analysis
-        t2 = time.time()
-        time_taken = t2 - t1
+    # Redirects and pages of stored results shown in place of a failed search aren't cached
+    if stale or not isinstance(page, str):
+        return page
 
-        if location:
-            # Format location latitude/longitude to 2 decimal places
-            longitude = "{:.2f}".format(float(location.longitude))
-            latitude = "{:.2f}".format(float(location.latitude))
-            hist_avg = helper.get_historical_sentiment_avg(keyword, location.address)
-            hist_data = helper.get_historical_sentiment(keyword, location.address)
-            hist_predominant_sentiment = helper.predominant_sentiment(hist_data)
-            return render_template(
-                "search.html",
-                time_taken=time_taken,
-                results=results,
-                page=page,
-                keyword=keyword,
-                location_search_term=location_search_term,
-                location=location.address,
-                longitude=longitude,
-                latitude=latitude,
-                search_count=count,
-                search_aggregate=search_aggregate,
-                search_avg=search_avg,
-                search_stats=helper.get_query_statistics(results, search_aggregate),
-                dom_sentiment=hist_predominant_sentiment,
-                hist_data=hist_data,
-                hist_avg=hist_avg,
-                overtime_data=helper.get_sentiment_overtime(keyword, location.address)
-            )
-        elif user_search:
-            hist_avg = helper.get_historical_sentiment_avg(keyword)
-            hist_data = helper.get_historical_sentiment(keyword)
-            hist_predominant_sentiment = helper.predominant_sentiment(hist_data)
-            return render_template(
-                "search.html",
-                results=results,
-                time_taken=time_taken,
-                page=page,
-                user=keyword,
-                search_count=count,
-                search_aggregate=search_aggregate,
-                search_avg=search_avg,
-                search_stats=helper.get_query_statistics(results, search_aggregate),
-                dom_sentiment=hist_predominant_sentiment,
-                hist_data=hist_data,
-                hist_avg=hist_avg,
-                overtime_data=helper.get_sentiment_overtime(keyword)
-            )
-        else:
-            hist_avg = helper.get_historical_sentiment_avg(keyword)
-            hist_data = helper.get_historical_sentiment(keyword)
-            hist_predominant_sentiment = helper.predominant_sentiment(hist_data)
-            return render_template(
-                "search.html",
-                results=results,
-                time_taken=time_taken,
-                page=page,
-                keyword=keyword,
-                search_count=count,
-                search_aggregate=search_aggregate,
-                search_avg=search_avg,
-                search_stats=helper.get_query_statistics(results, search_aggregate),
-                dom_sentiment=hist_predominant_sentiment,
-                hist_data=hist_data,
-                hist_avg=hist_avg,
-                overtime_data=helper.get_sentiment_overtime(keyword)
-            )
-    else:
+    etag = response_cache.set(key, page, keyword, location_address, generation)
+    return conditional_response(page, etag)
+
+
+@app.route("/search/job/<job_id>")
+def search_job(job_id):
+    """
+    :return:    Rendered template which polls the status of a queued search
+    """
+
+    page = "search"
+
+    job = get_job_or_404(job_id)
+
+    return render_template("job.html", page=page, job=job)
+
+
+@app.route("/search/job/<job_id>/status")
+def search_job_status(job_id):
+    """
+    :return:    JSON with the status, progress and results analyzed so far of a queued search
+    """
+
+    job = get_job_or_404(job_id)
+
+    results = []
+    if job.status in ("running", "done"):
+        for tweet in job_results(job):
+            results.append({
+                "user": tweet.tweet_user,
+                "text": tweet.tweet_text,
+                "sentiment_type": tweet.sentiment_type,
+                "sentiment_score": tweet.sentiment_score
+            })
+
+    return jsonify(
+        status=job.status,
+        analyzed=job.analyzed,
+        total=job.total,
+        results=results,
+        results_url=url_for('search_job_results', job_id=job_id)
+    )
+
+
+@app.route("/search/job/<job_id>/results")
+def search_job_results(job_id):
+    """
+    :return:    Rendered template with results of a completed queued search
+    """
+
+    import calendar
+
+    job = get_job_or_404(job_id)
+
+    if job.status == "failed":
+        flash(search_error_message(job.error, job.keyword, job.location_search_term))
         return redirect(url_for('index'))
+    elif job.status != "done":
+        return redirect(url_for('search_job', job_id=job_id))
+
+    # Report the time from queueing to completion rather than the time until this page was requested
+    started = calendar.timegm(job.created_at.utctimetuple())
+    finished = calendar.timegm(job.finished_at.utctimetuple())
+
+    # Jobs completed with an error only have stored results to show
+    return render_results(job.keyword, job.count, job.location(), job.location_search_term, started, finished,
+                          stale=job.error is not None)
 
 
 @app.route("/trends")
@@ -239,15 +453,67 @@ def trends():
 
     page = "trends"
 
-    # Get 7 day trends for top positive and negative sentiments
-    positive_trends = helper.get_sentiment_trends(-1)
-    negative_trends = helper.get_sentiment_trends(1)
+    # Get materialized 7 day trends for top positive and negative sentiments
+    snapshot = helper.get_trends_snapshot()
 
     return render_template(
         "trends.html",
         page=page,
-        positive_trends=positive_trends,
-        negative_trends=negative_trends
+        positive_trends=snapshot.positive,
+        negative_trends=snapshot.negative,
+        trends_age=snapshot.age()
+    )
+
+
+@app.route("/series")
+def series():
+    """
+    Gets average sentiment over time for a keyword, for live dashboards.
+    Query parameters: keyword, location (address, optional), granularity (hour/day/week), periods and tz_offset (minutes).
+
+    :return:    JSON with a dense, sorted list of [label, average score] pairs, null for buckets without Tweets
+    """
+
+    from app import helper
+    from app.series import GRANULARITIES
+
+    keyword = request.args.get("keyword", "").strip().lower()
+    location = request.args.get("location") or None
+    granularity = request.args.get("granularity", "day")
+
+    try:
+        periods = int(request.args.get("periods", 10))
+        tz_offset = int(request.args.get("tz_offset", config.SENTIMENT_SERIES_TZ_OFFSET))
+    except ValueError:
+        abort(400)
+
+    if not keyword or granularity not in GRANULARITIES or not 0 < periods <= config.SENTIMENT_SERIES_MAX_PERIODS:
+        abort(400)
+
+    return jsonify(
+        keyword=keyword,
+        location=location,
+        granularity=granularity,
+        series=helper.get_sentiment_overtime(keyword, location, granularity, periods, tz_offset)
+    )
+
+
+@app.route("/metrics")
+def metrics():
+    """
+    :return:    JSON with internal performance metrics
+    """
+
+    from app import manager
+
+    return jsonify(
+        analysis_pool=analysis_pool.metrics(),
+        sentiment_cache=sentiment_cache.metrics(),
+        geocode_cache=geocode_cache.metrics(),
+        twitter=twitter_pool.metrics(),
+        response_cache=response_cache.metrics(),
+        rate_limits=scheduler.metrics(),
+        alchemy_http=manager.alchemy_transport.metrics()
     )
 
 
@@ -0,0 +1,11 @@
+"""
+Benchmarks seed large collections and rebuild materialized data, so they run against a database of their own,
+named after the one configured in config.py plus "_benchmark". It is claimed here, before any benchmark imports
+the app (which connects on import) or the tests package (which would claim the test database).
+"""
+
+import config
+
+config.MONGODB_DB_SUFFIX = "_benchmark"
+
+import tests
@@ -0,0 +1,61 @@
+"""
+Compares server-side counting and the single '$group' aggregation of the historical statistics to the
+len(Tweet.objects(...)) counting they replaced, at several collection sizes.
+Run using: python -m benchmarks.aggregation [sizes...]  (default 10000 100000 1000000)
+"""
+
+from mongoengine import Q
+from app import helper
+from app.models import Tweet
+from benchmarks.common import BENCHMARK_PREFIX, seed_tweets, cleanup, timed, peak_memory, report
+import sys
+
+
+KEYWORD = BENCHMARK_PREFIX + "aggregation"
+
+
+def historical_by_len(search_term):
+    """
+    The original statistics: three len() counts and a full iteration for the average.
+    """
+
+    positive = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(sentiment_type="positive")))
+    negative = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(sentiment_type="negative")))
+    neutral = len(Tweet.objects(Q(keyword_search_term=search_term) & Q(sentiment_type="neutral")))
+
+    total = 0
+    tweets = Tweet.objects(Q(keyword_search_term=search_term))
+    count = len(tweets)
+    for tweet in tweets:
+        total += tweet.sentiment_score
+
+    return [["Positive", positive], ["Neutral", neutral], ["Negative", negative]], total / count
+
+
+def historical_by_group(search_term):
+    """
+    The current statistics: a server-side count and one '$group' aggregation.
+    """
+
+    helper.count_tweets(search_term)
+    groups = helper.get_historical_groups(search_term)
+    return helper.historical_sentiment_from_groups(groups), helper.historical_avg_from_groups(groups)
+
+
+def main(sizes):
+    try:
+        for size in sizes:
+            cleanup(KEYWORD)
+            seed_tweets(KEYWORD, size)
+            report("%d stored Tweets" % size, [
+                ("len() counting (s)", "%.3f" % timed(lambda: historical_by_len(KEYWORD), repeat=1)),
+                ("len() counting peak memory (KB)", peak_memory(lambda: historical_by_len(KEYWORD)) // 1024),
+                ("count + $group (s)", "%.3f" % timed(lambda: historical_by_group(KEYWORD))),
+                ("count + $group peak memory (KB)", peak_memory(lambda: historical_by_group(KEYWORD)) // 1024)
+            ])
+    finally:
+        cleanup(KEYWORD)
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
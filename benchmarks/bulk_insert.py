@@ -0,0 +1,51 @@
+"""
+Compares the bulk save path of 'manager.save_tweets' to the per-row loop it replaced.
+Run using: python -m benchmarks.bulk_insert [number of tweets]
+"""
+
+from app import manager
+from app.models import Tweet
+from benchmarks.common import BENCHMARK_PREFIX, fake_status, cleanup, timed, report
+import sys
+
+
+KEYWORD = BENCHMARK_PREFIX + "bulk_insert"
+
+
+def save_tweets_per_row(tweets, search_term):
+    """
+    The original save loop: one existence query and one save per Tweet.
+    """
+
+    for status in tweets:
+        if len(Tweet.objects(tweet_id=status['tweet_id'])) == 0:
+            manager.build_record(status, search_term).save()
+
+
+def main(count):
+    tweets = [fake_status(n) for n in range(count)]
+    # Half of the Tweets are already stored when the repeated search runs
+    repeated = tweets[:count // 2] + [fake_status(n) for n in range(count, count + count // 2)]
+
+    def reset():
+        cleanup(KEYWORD)
+
+    def reset_half():
+        cleanup(KEYWORD)
+        manager.save_tweets(tweets[:count // 2], KEYWORD)
+
+    try:
+        report("Saving %d new Tweets" % count, [
+            ("per-row loop (s)", "%.3f" % timed(lambda: save_tweets_per_row(tweets, KEYWORD), setup=reset)),
+            ("bulk save_tweets (s)", "%.3f" % timed(lambda: manager.save_tweets(tweets, KEYWORD), setup=reset))
+        ])
+        report("Saving %d Tweets, half already stored" % len(repeated), [
+            ("per-row loop (s)", "%.3f" % timed(lambda: save_tweets_per_row(repeated, KEYWORD), setup=reset_half)),
+            ("bulk save_tweets (s)", "%.3f" % timed(lambda: manager.save_tweets(repeated, KEYWORD), setup=reset_half))
+        ])
+    finally:
+        cleanup(KEYWORD)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
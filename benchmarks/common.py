@@ -0,0 +1,127 @@
+"""
+Shared helpers for the benchmark scripts, run from the repository root using: python -m benchmarks.<name>
+Benchmarks use the benchmark database (see benchmarks/__init__.py), never the live one. Everything they store
+uses keywords starting with BENCHMARK_PREFIX and is removed again when they finish.
+"""
+
+from app.models import Tweet, SentimentRollup, SearchState
+from datetime import datetime, timedelta
+import random
+import time
+import tracemalloc
+
+
+# Prefix of the keywords benchmark data is stored under
+BENCHMARK_PREFIX = "__benchmark__"
+
+# Tweet ids of benchmark data start here, far above the ids of real Tweets
+BENCHMARK_ID_BASE = 9 * 10 ** 18
+
+SENTIMENT_TYPES = ("positive", "neutral", "negative")
+
+
+def fake_status(n, now=None):
+    """
+    :param n: Sequence number of the status, making its Tweet id unique
+    :param now: Time the newest status was posted (optional)
+    :return: Analyzed Tweet data dictionary, as passed to 'manager.save_tweets'
+    """
+
+    now = now or datetime.utcnow()
+    sentiment = random.choice(SENTIMENT_TYPES)
+
+    return {
+        'tweet_id': BENCHMARK_ID_BASE + n,
+        'created_at': now - timedelta(minutes=n % (60 * 24 * 7)),
+        'text': "benchmark tweet number %d" % n,
+        'user': "benchmark",
+        'user_fullname': "Benchmark User",
+        'profile_image_url': "http://example.com/benchmark.png",
+        'sentiment': sentiment,
+        'sentimentScore': {"positive": 0.5, "neutral": 0.0, "negative": -0.5}[sentiment]
+    }
+
+
+def seed_tweets(keyword, count, chunk=10000):
+    """
+    Stores raw Tweet documents directly, bypassing the application's save path so large collections seed quickly.
+
+    :param keyword: Keyword the Tweets are stored under
+    :param count: Number of Tweets to store
+    """
+
+    collection = Tweet._get_collection()
+    now = datetime.utcnow()
+
+    for start in range(0, count, chunk):
+        documents = []
+        for n in range(start, min(start + chunk, count)):
+            status = fake_status(n, now)
+            documents.append({
+                'tweet_id': status['tweet_id'],
+                'tweet_time': status['created_at'],
+                'tweet_text': status['text'],
+                'tweet_user': status['user'],
+                'sentiment_type': status['sentiment'],
+                'sentiment_score': status['sentimentScore'],
+                'keyword_search_term': keyword,
+                'stored_at': now
+            })
+        collection.insert(documents)
+
+
+def cleanup(keyword):
+    """
+    Removes everything stored for a benchmark keyword.
+    """
+
+    Tweet._get_collection().remove({'keyword_search_term': keyword})
+    SentimentRollup._get_collection().remove({'keyword_search_term': keyword})
+    SearchState._get_collection().remove({'keyword_search_term': keyword})
+
+
+def timed(function, repeat=3, setup=None):
+    """
+    :param function: Function to time
+    :param repeat: Number of runs
+    :param setup: Function called before each run, not timed (optional)
+    :return: Fastest run in seconds
+    """
+
+    best = None
+    for i in range(repeat):
+        if setup:
+            setup()
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def peak_memory(function):
+    """
+    :param function: Function to measure
+    :return: Peak Python memory allocated while the function ran, in bytes
+    """
+
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(title, rows):
+    """
+    Prints a table of benchmark results.
+
+    :param title: Heading of the table
+    :param rows: List of (label, value) tuples
+    """
+
+    print(title)
+    for label, value in rows:
+        print("  %-40s %s" % (label, value))
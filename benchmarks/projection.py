@@ -0,0 +1,39 @@
+"""
+Compares reading search results as raw projected TweetRow objects, as the results page does, to reading the
+same results as fully hydrated Tweet documents, at several result counts.
+Run using: python -m benchmarks.projection [counts...]  (default 100 1000 10000)
+"""
+
+from app.models import Tweet
+from app.views import query_results
+from benchmarks.common import BENCHMARK_PREFIX, seed_tweets, cleanup, timed, peak_memory, report
+import sys
+
+
+KEYWORD = BENCHMARK_PREFIX + "projection"
+
+
+def hydrated_results(keyword, count):
+    """
+    The original results query: every field of every result loaded into a Tweet document.
+    """
+
+    return list(Tweet.objects(keyword_search_term=keyword).order_by('-stored_at', '-tweet_time').limit(int(count)))
+
+
+def main(counts):
+    try:
+        seed_tweets(KEYWORD, max(counts))
+        for count in counts:
+            report("%d search results" % count, [
+                ("hydrated Tweet documents (s)", "%.3f" % timed(lambda: hydrated_results(KEYWORD, count))),
+                ("hydrated peak memory (KB)", peak_memory(lambda: hydrated_results(KEYWORD, count)) // 1024),
+                ("projected TweetRow objects (s)", "%.3f" % timed(lambda: query_results(KEYWORD, count))),
+                ("projected peak memory (KB)", peak_memory(lambda: query_results(KEYWORD, count)) // 1024)
+            ])
+    finally:
+        cleanup(KEYWORD)
+
+
+if __name__ == '__main__':
+    main([int(count) for count in sys.argv[1:]] or [100, 1000, 10000])
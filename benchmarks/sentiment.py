@@ -0,0 +1,74 @@
+"""
+Compares sentiment analysis throughput (tweets/sec) of the in-process lexicon backend to the remote AlchemyAPI path,
+and the number of requests made by single and batched remote calls, using a local HTTP stand-in for AlchemyAPI
+with a fixed latency per request.
+Run using: python -m benchmarks.sentiment [number of tweets] [stand-in latency in seconds]
+"""
+
+from app import lexicon
+from app.alchemyapi import AlchemyAPI
+from app.transport import HTTPTransport
+from benchmarks.common import report
+from concurrent.futures import ThreadPoolExecutor
+from tests.fake_alchemy import FakeAlchemyServer
+import config
+import sys
+import time
+
+
+TEXTS = ["what a great game, love it", "awful service and bad food", "just had lunch", "so happy today"]
+
+
+def stand_in_client(server):
+    """
+    :param server: Running FakeAlchemyServer
+    :return: AlchemyAPI client sending its requests to the stand-in
+    """
+
+    AlchemyAPI.BASE_URL = server.base_url
+    client = AlchemyAPI.__new__(AlchemyAPI)
+    client.apikey = "0" * 40
+    client.transport = HTTPTransport(pool_size=config.ALCHEMY_THREAD_LIMIT, timeout=10)
+    return client
+
+
+def throughput(function, count, server=None):
+    """
+    :param server: FakeAlchemyServer to count the requests of (optional)
+    :return: Tweets per second analyzed by the function, and the number of requests it made
+    """
+
+    requests = server.total_requests() if server else 0
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+
+    if server:
+        return "%.0f (%d requests)" % (count / elapsed, server.total_requests() - requests)
+    return "%.0f" % (count / elapsed)
+
+
+def main(count, latency):
+    texts = [TEXTS[i % len(TEXTS)] + " %d" % i for i in range(count)]
+    batch = config.ALCHEMY_BATCH_SIZE
+    chunks = [texts[i:i + batch] for i in range(0, count, batch)]
+    base_url = AlchemyAPI.BASE_URL
+
+    try:
+        with FakeAlchemyServer(latency=latency) as server, \
+                ThreadPoolExecutor(config.ALCHEMY_THREAD_LIMIT) as pool:
+            client = stand_in_client(server)
+            report("Analyzing %d Tweets, %.0f ms per remote request" % (count, latency * 1000), [
+                ("lexicon backend (tweets/sec)", throughput(lambda: lexicon.score_texts(texts), count)),
+                ("remote, one text per request (tweets/sec)", throughput(
+                    lambda: list(pool.map(lambda text: client.sentiment("text", text, {}), texts)), count, server)),
+                ("remote, batched requests (tweets/sec)", throughput(
+                    lambda: list(pool.map(lambda chunk: client.sentiment_batch(chunk, max_docs=batch), chunks)),
+                    count, server))
+            ])
+    finally:
+        AlchemyAPI.BASE_URL = base_url
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000, float(sys.argv[2]) if len(sys.argv) > 2 else 0.05)
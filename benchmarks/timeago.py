@@ -0,0 +1,29 @@
+"""
+Compares computing the 'ago' labels of a page of search results one Tweet at a time, through the SimpleDate
+conversion 'Tweet.calc_time_ago' used to make, to computing them in one pass with app.timeago.time_ago_labels.
+Run using: python -m benchmarks.timeago [number of rows] [number of runs]
+"""
+
+from app.timeago import time_ago_labels
+from benchmarks.common import report, timed
+from datetime import datetime, timedelta
+from tests.test_timeago import old_calc_time_ago
+import sys
+
+
+def main(rows, repeat):
+    now = datetime.utcnow()
+    times = [now - timedelta(minutes=17 * n, microseconds=n) for n in range(rows)]
+
+    per_row = timed(lambda: [old_calc_time_ago(tm) for tm in times], repeat)
+    one_pass = timed(lambda: time_ago_labels(times), repeat)
+
+    report("Labelling %d search result rows, fastest of %d runs" % (rows, repeat), [
+        ("per row SimpleDate conversion (ms)", "%.2f" % (per_row * 1000)),
+        ("one pass time_ago_labels (ms)", "%.2f" % (one_pass * 1000)),
+        ("speedup", "%.1fx" % (per_row / one_pass))
+    ])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100, int(sys.argv[2]) if len(sys.argv) > 2 else 20)
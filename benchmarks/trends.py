@@ -0,0 +1,59 @@
+"""
+Shows /trends latency served from the materialized snapshot stays flat as the Tweet collection grows,
+compared to recomputing the trends on every request. The snapshot refreshed is the benchmark database's,
+the live /trends snapshot is never touched.
+Run using: python -m benchmarks.trends [sizes...]  (default 10000 100000 1000000)
+"""
+
+from app import app, helper
+from app.models import Tweet, SentimentRollup
+from app.rollup import rollup_key
+from benchmarks.common import BENCHMARK_PREFIX, seed_tweets, cleanup, timed, report
+from datetime import datetime
+import sys
+
+
+KEYWORD = BENCHMARK_PREFIX + "trends"
+
+
+def seed_rollups(keyword):
+    """
+    Builds the daily rollups of the seeded Tweets, which the trends are computed from.
+    """
+
+    result = Tweet._get_collection().aggregate([
+        {"$match": {"keyword_search_term": keyword}},
+        {"$group": {
+            "_id": {"year": {"$year": "$tweet_time"}, "month": {"$month": "$tweet_time"},
+                    "day": {"$dayOfMonth": "$tweet_time"}},
+            "count": {"$sum": 1},
+            "total_score": {"$sum": "$sentiment_score"}
+        }}
+    ], allowDiskUse=True)
+
+    collection = SentimentRollup._get_collection()
+    for i in result['result']:
+        day = datetime(i['_id']['year'], i['_id']['month'], i['_id']['day'])
+        collection.update(rollup_key(keyword, None, day),
+                          {"$set": {"count": i['count'], "total_score": i['total_score']}}, upsert=True)
+
+
+def main(sizes):
+    client = app.test_client()
+
+    try:
+        for size in sizes:
+            cleanup(KEYWORD)
+            seed_tweets(KEYWORD, size)
+            seed_rollups(KEYWORD)
+            helper.refresh_trends_snapshot()
+            report("%d stored Tweets" % size, [
+                ("/trends from snapshot (s)", "%.4f" % timed(lambda: client.get("/trends"), repeat=10)),
+                ("recomputing trends (s)", "%.4f" % timed(helper.refresh_trends_snapshot))
+            ])
+    finally:
+        cleanup(KEYWORD)
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,74 @@
+"""
+Compares Twitter search calls made with a new authenticated client per call, as searches did before the client pool,
+to calls made through the process-wide TwitterPool, using a local HTTP stand-in for the Twitter search API
+with a fixed latency per request.
+Run using: python -m benchmarks.twitter_pool [number of calls] [stand-in latency in seconds]
+"""
+
+from app.twitter_pool import TwitterPool, twitter_auth
+from benchmarks.common import report
+from concurrent.futures import ThreadPoolExecutor
+from tests.fake_twitter import FakeTwitterServer
+import config
+import sys
+import time
+
+
+def stand_in_auth(server):
+    """
+    :param server: Running FakeTwitterServer
+    :return: Function authenticating a client like 'twitter_auth', which sends its requests to the stand-in
+    """
+
+    def auth():
+        client = twitter_auth()
+        client.api_url = server.api_url
+        return client
+
+    return auth
+
+
+def calls_per_second(function, count, server):
+    """
+    :param server: FakeTwitterServer to count the requests of
+    :return: Calls per second made by the function, and the number of requests which reached the stand-in
+    """
+
+    requests = server.requests
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+
+    return "%.0f (%d requests)" % (count / elapsed, server.requests - requests)
+
+
+def main(count, latency):
+    threads = config.TWITTER_POOL_SIZE
+
+    with FakeTwitterServer(limit=count * 4, latency=latency) as server, ThreadPoolExecutor(threads) as executor:
+        auth = stand_in_auth(server)
+        pool = TwitterPool(threads, auth)
+
+        def per_call(i):
+            return auth().search(q="benchmark", count=100)
+
+        def pooled(i):
+            return pool.request("search/tweets", "search", q="benchmark", count=100)
+
+        rows = [
+            ("new client per call (calls/sec)", calls_per_second(lambda: list(map(per_call, range(count))),
+                                                                  count, server)),
+            ("pooled client (calls/sec)", calls_per_second(lambda: list(map(pooled, range(count))), count, server)),
+            ("new client per call, %d threads" % threads, calls_per_second(
+                lambda: list(executor.map(per_call, range(count))), count, server)),
+            ("pooled clients, %d threads" % threads, calls_per_second(
+                lambda: list(executor.map(pooled, range(count))), count, server))
+        ]
+        rows.append(("pooled clients created", pool.metrics()["created"]))
+        rows.append(("calls remaining in rate limit window", pool.remaining("search/tweets")))
+
+        report("Making %d Twitter search calls, %.0f ms per request" % (count, latency * 1000), rows)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, float(sys.argv[2]) if len(sys.argv) > 2 else 0.02)
@@ -6,6 +6,20 @@ TWITTER_CONSUMER_SECRET = ""
 TWITTER_ACCESS_TOKEN = ""
 TWITTER_ACCESS_TOKEN_SECRET = ""
 
+# Defining number of pooled Twitter API clients (concurrent Twitter calls per process)
+TWITTER_POOL_SIZE = 4
+
+# Defining upstream API quotas shared by all dynos, as (capacity, calls refilled per second)
+RATE_LIMITS = {
+    "twitter_search": (180, 180 / 900.0),
+    "twitter_timeline": (180, 180 / 900.0),
+    "alchemy": (1000, 1000 / 86400.0)
+}
+
+# Defining fraction of each quota reserved for interactive searches and max seconds to wait for quota
+RATE_LIMIT_LOW_PRIORITY_RESERVE = 0.25
+RATE_LIMIT_MAX_WAIT = 5
+
 # Defining Mongolab MongoDB connection
 MONGODB_DB = "tweetvibe"
 MONGODB_HOST = "mongodb://"
@@ -18,13 +32,91 @@ MONGODB_PASSWORD = ""
 CSRF_ENABLED = True
 SECRET_KEY = ""
 
-# Defining search limits for Tweets
+# Defining search limits for Tweets (searches above 100 Tweets are paginated)
 TWEET_SEARCH_LIMIT_MAX = 100
 TWEET_SEARCH_LIMIT_DEFAULT = 15
 
+# Defining search limit for Tweets in job mode, where long paginated searches run in the background worker
+TWEET_SEARCH_LIMIT_MAX_JOB = 1000
+
+# Defining number of Tweets requested per page of a search (Twitter allows up to 100)
+TWEET_SEARCH_PAGE_SIZE = 100
+
+# Defining geocode cache in-process size (entries), time to live for found and unknown places (seconds)
+GEOCODE_CACHE_SIZE = 1000
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60
+GEOCODE_NEGATIVE_TTL = 24 * 60 * 60
+
+# Defining keywords and location search terms kept up to date by the streaming ingestion worker (run-stream.py)
+STREAM_TRACK_KEYWORDS = []
+STREAM_TRACK_LOCATIONS = []
+
+# Defining streaming ingestion buffer size, batch size and max seconds between batches
+STREAM_BUFFER_SIZE = 1000
+STREAM_BATCH_SIZE = 100
+STREAM_FLUSH_INTERVAL = 5
+
+# Defining seconds without streaming progress after which searches for tracked keywords use the REST search again
+STREAM_LIVE_TIMEOUT = 60
+
+# Defining seconds the streaming ingestion worker waits before retrying a batch shed for lack of quota
+STREAM_RETRY_INTERVAL = 60
+
+# Toggle job mode, where searches are queued and run by the background worker (run-jobs.py)
+SEARCH_JOB_MODE = False
+
+# Defining seconds between job queue polls and seconds after which a running job is considered abandoned
+JOB_POLL_INTERVAL = 1
+JOB_TIMEOUT = 300
+
+# Defining trends snapshot max age (seconds) and number of newly ingested Tweets which trigger a recompute
+TRENDS_SNAPSHOT_TTL = 600
+TRENDS_SNAPSHOT_THRESHOLD = 500
+
+# Defining seconds a process may hold the claim to recompute the trends snapshot before another may take over
+TRENDS_REFRESH_CLAIM_TIMEOUT = 60
+
+# Defining sentiment analysis backend, "alchemy" (remote AlchemyAPI) or "lexicon" (offline, in-process)
+SENTIMENT_BACKEND = "alchemy"
+
 # Defining AlchemyAPI thread limit
 ALCHEMY_THREAD_LIMIT = 5
 
+# Defining number of Tweets packed into a single AlchemyAPI request
+ALCHEMY_BATCH_SIZE = 20
+
+# Defining number of Tweets whose batched sentiment is compared to single requests before batching is used,
+# and the fraction of them which must agree (0 sample skips the check)
+ALCHEMY_BATCH_VALIDATION_SAMPLE = 20
+ALCHEMY_BATCH_MIN_AGREEMENT = 0.9
+
+# Defining seconds a process may hold the claim to compare batched and single AlchemyAPI calls before another
+# may take over
+ALCHEMY_BATCH_VALIDATION_CLAIM_TIMEOUT = 300
+
+# Defining AlchemyAPI HTTP timeout (seconds), number of retries, initial retry backoff (seconds)
+# and per call deadline including retries (seconds), which bounds how long a call can hold an analysis thread
+ALCHEMY_HTTP_TIMEOUT = 5
+ALCHEMY_HTTP_RETRIES = 3
+ALCHEMY_HTTP_BACKOFF = 0.5
+ALCHEMY_HTTP_DEADLINE = 15
+
+# Defining seconds a search waits with no analysis call completing before reporting its remaining Tweets as failed
+ALCHEMY_STALL_TIMEOUT = 30
+
+# Defining sentiment cache in-process size (entries) and time to live (seconds)
+SENTIMENT_CACHE_SIZE = 50000
+SENTIMENT_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Defining search results page cache size (entries) and time to live (seconds)
+# Cached pages keep the "Search took" time and "ago" labels of the original search, keep the TTL short
+RESPONSE_CACHE_SIZE = 200
+RESPONSE_CACHE_TTL = 60
+
+# Defining offset from UTC (minutes) sentiment over time buckets are aligned to, and max buckets per series request
+SENTIMENT_SERIES_TZ_OFFSET = 0
+SENTIMENT_SERIES_MAX_PERIODS = 168
+
 # Toggle Debug Mode
 DEBUG_MODE = False
 
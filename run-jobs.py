@@ -0,0 +1,5 @@
+from app import jobs
+
+# Run background search job worker
+if __name__ == "__main__":
+    jobs.run()
@@ -0,0 +1,9 @@
+from app import stream
+import sys
+
+# Run streaming ingestion worker, or replay a recorded stream file with: python run-stream.py --replay FILE
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--replay":
+        stream.replay(sys.argv[2])
+    else:
+        stream.run()
@@ -0,0 +1,31 @@
+"""
+Tests never touch live data: they run against a database of their own, named after the one configured in
+config.py plus "_test". The switch happens here, before any test imports the app, which connects on import.
+Benchmarks set MONGODB_DB_SUFFIX in config before importing this package, to use a database of their own instead.
+"""
+
+import config
+
+
+def use_database(suffix):
+    """
+    Points the MongoDB settings of config.py at a separate database, the configured database name plus a suffix.
+    Only the first call in a process has an effect.
+
+    :param suffix: Suffix of the database name, eg "_test"
+    """
+
+    if getattr(config, "MONGODB_DATABASE_SWITCHED", False):
+        return
+    config.MONGODB_DATABASE_SWITCHED = True
+
+    config.MONGODB_DB += suffix
+
+    # A database named in the connection URI takes precedence over MONGODB_DB
+    address, slash, database = config.MONGODB_HOST_ADDRESS.partition("/")
+    if database:
+        name, question, options = database.partition("?")
+        config.MONGODB_HOST_ADDRESS = address + "/" + name + suffix + question + options
+
+
+use_database(getattr(config, "MONGODB_DB_SUFFIX", "_test"))
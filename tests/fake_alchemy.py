@@ -0,0 +1,153 @@
+"""
+Local stand-in for the AlchemyAPI text sentiment endpoints, used by the tests and benchmarks.
+It can inject latency and error responses, and counts the requests made to each endpoint.
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+from collections import Counter
+import json
+import re
+import threading
+import time
+
+
+POSITIVE_WORDS = set(["good", "great", "love", "happy"])
+NEGATIVE_WORDS = set(["bad", "awful", "hate", "sad"])
+
+
+def score(text):
+    """
+    :param text: Text to score
+    :return: 'docSentiment' style dictionary, scored by counting a handful of positive and negative words
+    """
+
+    words = re.findall(r"[a-z]+", text.lower())
+    total = sum(1 for word in words if word in POSITIVE_WORDS) - sum(1 for word in words if word in NEGATIVE_WORDS)
+
+    if total > 0:
+        return {"type": "positive", "score": "%.6f" % min(total / 4.0, 1)}
+    elif total < 0:
+        return {"type": "negative", "score": "%.6f" % max(total / 4.0, -1)}
+    return {"type": "neutral"}
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeAlchemyServer(object):
+    """
+    Serves TextGetTextSentiment and TextGetTargetedSentiment on a free local port while used as a context manager.
+    Targeted sentiment matches targets loosely, like the real service: a target matches the first
+    double newline separated segment containing it.
+    """
+
+    def __init__(self, latency=0, errors=None, hang=0):
+        """
+        :param latency: Seconds to wait before answering each request
+        :param errors: HTTP status codes answered to the first requests, in order, before answering normally
+        :param hang: Number of the first requests which get no answer until the server stops
+        """
+
+        self.latency = latency
+        self.errors = list(errors or [])
+        self.hang = hang
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.server = ThreadingServer(("127.0.0.1", 0), self.handler())
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%d/calls" % self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def total_requests(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def next_action(self, endpoint):
+        """
+        Counts a request and decides how to answer it.
+
+        :return: "hang", an HTTP error status code, or None to answer normally
+        """
+
+        with self.lock:
+            self.requests[endpoint] += 1
+            if self.hang:
+                self.hang -= 1
+                return "hang"
+            if self.errors:
+                return self.errors.pop(0)
+        return None
+
+    def respond(self, endpoint, form):
+        """
+        :param endpoint: Last part of the request path, eg "TextGetTextSentiment"
+        :param form: Parsed request body
+        :return: Response dictionary
+        """
+
+        text = form.get("text", [""])[0]
+
+        if endpoint == "TextGetTextSentiment":
+            return {"status": "OK", "docSentiment": score(text)}
+
+        if endpoint == "TextGetTargetedSentiment":
+            targets = (form.get("targets") or form.get("target") or [""])[0].split("|")
+            segments = text.split("\n\n")
+            results = []
+            for target in targets:
+                for segment in segments:
+                    if target and target.lower() in segment.lower():
+                        results.append({"text": target, "sentiment": score(segment.replace(target, ""))})
+                        break
+            return {"status": "OK", "results": results}
+
+        return {"status": "ERROR", "statusInfo": "unsupported-endpoint"}
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                endpoint = urlparse(self.path).path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length") or 0)
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+
+                action = fake.next_action(endpoint)
+                if action == "hang":
+                    fake.stopping.wait()
+                    return
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if action is not None:
+                    self.send_response(action)
+                    self.end_headers()
+                    return
+
+                body = json.dumps(fake.respond(endpoint, form)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
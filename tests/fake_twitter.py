@@ -0,0 +1,118 @@
+"""
+Local stand-in for the Twitter search API, used by the tests and benchmarks.
+It answers search/tweets with rate limit headers like Twitter's, can inject latency, and counts the requests made.
+"""
+
+from http.server import BaseHTTPRequestHandler
+from tests.fake_alchemy import ThreadingServer
+from urllib.parse import urlparse, parse_qs
+import json
+import threading
+import time
+
+
+class FakeTwitterServer(object):
+    """
+    Serves GET /1.1/search/tweets.json on a free local port while used as a context manager.
+    Each answer counts down the x-rate-limit-remaining header from the window's limit; once the window is
+    exhausted requests are answered with 429, as Twitter does.
+    """
+
+    def __init__(self, limit=180, latency=0, statuses=15):
+        """
+        :param limit: Number of requests allowed in the rate limit window
+        :param latency: Seconds to wait before answering each request
+        :param statuses: Number of statuses in each answer
+        """
+
+        self.limit = limit
+        self.remaining = limit
+        self.reset = int(time.time()) + 15 * 60
+        self.latency = latency
+        self.statuses = statuses
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingServer(("127.0.0.1", 0), self.handler())
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def api_url(self):
+        """
+        API URL template for Twython clients, ie their 'api_url' attribute
+        """
+
+        return "http://127.0.0.1:%d/%%s" % self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def next_remaining(self):
+        """
+        Counts a request against the rate limit window.
+
+        :return: Number of requests remaining after this one, or None if the window was already exhausted
+        """
+
+        with self.lock:
+            self.requests += 1
+            if self.remaining == 0:
+                return None
+            self.remaining -= 1
+            return self.remaining
+
+    def respond(self, query):
+        """
+        :param query: Parsed query string of the search request
+        :return: Search response dictionary
+        """
+
+        max_id = int(query.get("max_id", [10 ** 6])[0])
+        statuses = [{"id": max_id - n, "text": "%s status %d" % (query.get("q", [""])[0], max_id - n), "lang": "en",
+                     "created_at": "Mon Oct 12 10:00:00 +0000 2026",
+                     "user": {"screen_name": "searcher", "name": "Searcher",
+                              "profile_image_url": "http://example.com/s.png"}}
+                    for n in range(self.statuses)]
+        return {"statuses": statuses, "search_metadata": {"next_results": "?max_id=%d" % (max_id - self.statuses)}}
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/1.1/search/tweets.json":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                remaining = fake.next_remaining()
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if remaining is None:
+                    status = 429
+                    body = json.dumps({"errors": [{"code": 88, "message": "Rate limit exceeded"}]}).encode("utf-8")
+                else:
+                    status = 200
+                    body = json.dumps(fake.respond(parse_qs(url.query))).encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("x-rate-limit-limit", str(fake.limit))
+                self.send_header("x-rate-limit-remaining", str(remaining or 0))
+                self.send_header("x-rate-limit-reset", str(fake.reset))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
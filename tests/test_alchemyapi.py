@@ -0,0 +1,95 @@
+"""
+Tests of the AlchemyAPI client's batched sentiment against a local fake AlchemyAPI server.
+Run using: python -m pytest tests
+"""
+
+from app.alchemyapi import AlchemyAPI
+from app.transport import HTTPTransport, CallRejected
+from tests.fake_alchemy import FakeAlchemyServer, score
+import unittest
+
+
+def fake_client(server, retries=0, meter=None):
+    """
+    :param server: Running FakeAlchemyServer
+    :param retries: Number of retries of the client's transport
+    :param meter: Meter of the client's transport (optional)
+    :return: AlchemyAPI client sending its requests to the fake server
+    """
+
+    AlchemyAPI.BASE_URL = server.base_url
+    client = AlchemyAPI.__new__(AlchemyAPI)
+    client.apikey = "0" * 40
+    client.transport = HTTPTransport(timeout=5, retries=retries, backoff=0.01, meter=meter)
+    return client
+
+
+class SentimentBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base_url = AlchemyAPI.BASE_URL
+
+    def tearDown(self):
+        AlchemyAPI.BASE_URL = self.base_url
+
+    def test_batches_map_back_to_texts(self):
+        texts = [("good great day %d" if i % 3 == 0 else "bad awful day %d" if i % 3 == 1 else "a day %d") % i
+                 for i in range(45)]
+
+        with FakeAlchemyServer() as server:
+            results = fake_client(server).sentiment_batch(texts, max_docs=20)
+
+        self.assertEqual(server.requests["TextGetTargetedSentiment"], 3)
+        self.assertEqual(server.requests["TextGetTextSentiment"], 0)
+        self.assertEqual([result["docSentiment"]["type"] for result in results],
+                         [score(text)["type"] for text in texts])
+
+    def test_markers_do_not_overlap(self):
+        # Texts 1 and 10 onwards share leading digits, each must still get its own result
+        texts = ["good %d" % i if i in (1, 10, 11) else "bad %d" % i for i in range(12)]
+
+        with FakeAlchemyServer() as server:
+            results = fake_client(server).sentiment_batch(texts, max_docs=20)
+
+        self.assertEqual([result["docSentiment"]["type"] for result in results],
+                         ["positive" if i in (1, 10, 11) else "negative" for i in range(12)])
+
+    def test_failed_batch_is_not_retried_per_text(self):
+        texts = ["good %d" % i for i in range(10)]
+
+        with FakeAlchemyServer(errors=[500]) as server:
+            results = fake_client(server).sentiment_batch(texts, max_docs=20)
+
+        self.assertEqual(server.total_requests(), 1)
+        self.assertTrue(all(result["status"] == "ERROR" for result in results))
+
+    def test_single_text_uses_document_sentiment(self):
+        with FakeAlchemyServer() as server:
+            results = fake_client(server).sentiment_batch(["good day"])
+
+        self.assertEqual(server.requests["TextGetTextSentiment"], 1)
+        self.assertEqual(results[0]["docSentiment"]["type"], "positive")
+
+    def test_validate_batch(self):
+        texts = ["good %d" % i if i % 2 else "bad %d" % i for i in range(10)]
+
+        with FakeAlchemyServer() as server:
+            agreement = fake_client(server).validate_batch(texts)
+
+        self.assertEqual(agreement, 1.0)
+        self.assertEqual(server.requests["TextGetTextSentiment"], 10)
+
+    def test_rejected_call_is_raised(self):
+        # A call refused by the meter isn't reported as a network error response
+        def meter(endpoint):
+            raise CallRejected("AlchemyAPI rate limit")
+
+        with FakeAlchemyServer() as server:
+            client = fake_client(server, meter=meter)
+            self.assertRaises(CallRejected, client.sentiment, 'text', "good day", {})
+
+        self.assertEqual(server.total_requests(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Checks the check that batched AlchemyAPI sentiment agrees with single calls runs once, without blocking analysis.
+Runs against the test database (see tests/__init__.py), using: python -m pytest tests
+"""
+
+from app import manager
+from app.models import BatchValidation
+from unittest import mock
+import config
+import threading
+import unittest
+
+
+TEXTS = ["text %d" % i for i in range(5)]
+
+
+class StandInAlchemy(object):
+    """
+    Answers the batch check with a fixed agreement, optionally waiting until released. Counts the checks made.
+    """
+
+    def __init__(self, agreement, release=None):
+        self.agreement = agreement
+        self.release = release
+        self.started = threading.Event()
+        self.checks = 0
+
+    def validate_batch(self, texts, max_docs=20):
+        self.checks += 1
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        return self.agreement
+
+
+class BatchValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cleanup()
+        self.addCleanup(self.cleanup)
+        patches = [
+            mock.patch.object(config, 'ALCHEMY_BATCH_VALIDATION_SAMPLE', 5),
+            mock.patch.object(config, 'ALCHEMY_BATCH_MIN_AGREEMENT', 0.9)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def cleanup(self):
+        BatchValidation._get_collection().remove({"name": "alchemy"})
+
+    def test_verdict_stored_for_other_processes(self):
+        alchemy = StandInAlchemy(0.5)
+        self.assertFalse(manager.AlchemyBackend().check_batching(alchemy, TEXTS))
+
+        # A backend of another process uses the stored verdict
+        other = manager.AlchemyBackend()
+        self.assertFalse(other.check_batching(alchemy, TEXTS))
+        self.assertEqual(other.batch_size, 1)
+        self.assertEqual(alchemy.checks, 1)
+        self.assertEqual(BatchValidation.objects(name="alchemy").first().agreement, 0.5)
+
+    def test_single_calls_while_checking(self):
+        release = threading.Event()
+        alchemy = StandInAlchemy(1.0, release)
+        backend = manager.AlchemyBackend()
+        verdicts = []
+
+        thread = threading.Thread(target=lambda: verdicts.append(backend.check_batching(alchemy, TEXTS)))
+        thread.start()
+        self.assertTrue(alchemy.started.wait(5))
+
+        # Other threads don't wait for the check
+        self.assertFalse(backend.check_batching(alchemy, TEXTS))
+        release.set()
+        thread.join(5)
+
+        self.assertEqual(verdicts, [True])
+        self.assertTrue(backend.check_batching(alchemy, TEXTS))
+        self.assertEqual(alchemy.checks, 1)
+
+    def test_inconclusive_check_runs_again(self):
+        alchemy = StandInAlchemy(None)
+        backend = manager.AlchemyBackend()
+
+        self.assertFalse(backend.check_batching(alchemy, TEXTS))
+        self.assertFalse(backend.check_batching(alchemy, TEXTS))
+        self.assertEqual(alchemy.checks, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
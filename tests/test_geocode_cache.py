@@ -0,0 +1,100 @@
+"""
+Checks the two tier geocode cache with a local stand-in geocoder.
+Runs against the test database (see tests/__init__.py), using: python -m pytest tests
+"""
+
+from app.cache import GeocodeCache
+from app.models import GeocodedPlace, Place
+from datetime import datetime, timedelta
+import unittest
+
+
+# Places known to the stand-in geocoder, by normalized name
+PLACES = {
+    "testville, ts": Place(53.3, -6.2, "Testville, Test State"),
+    "othertown": Place(40.7, -74.0, "Othertown")
+}
+UNKNOWN = "nowhere at all"
+FAILING = "geocoder down"
+
+
+class StandInGeocoder(object):
+    """
+    Geocodes the places in PLACES, counting calls. Raises for FAILING, as geopy does on network errors.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, place_name):
+        self.calls.append(place_name)
+        if place_name == FAILING:
+            raise Exception("Geocoder timed out")
+        return PLACES.get(place_name)
+
+
+class GeocodeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cleanup()
+        self.addCleanup(self.cleanup)
+        self.cache = GeocodeCache(10, ttl=3600, negative_ttl=60)
+        self.geocode = StandInGeocoder()
+
+    def cleanup(self):
+        GeocodedPlace._get_collection().remove({"name": {"$in": list(PLACES) + [UNKNOWN, FAILING]}})
+
+    def age(self, name, seconds):
+        # Backdate a cached entry in both tiers
+        stored_at = datetime.utcnow() - timedelta(seconds=seconds)
+        place, old = self.cache.lru.entries[name]
+        self.cache.lru.put(name, (place, stored_at))
+        GeocodedPlace.objects(name=name).update_one(set__stored_at=stored_at)
+
+    def test_spellings_share_an_entry(self):
+        first = self.cache.lookup("  Testville ,TS ", self.geocode)
+        second = self.cache.lookup("testville,   ts.", self.geocode)
+
+        self.assertEqual(first, PLACES["testville, ts"])
+        self.assertEqual(second, first)
+        self.assertEqual(self.geocode.calls, ["testville, ts"])
+        self.assertEqual(self.cache.metrics()["memory_hits"], 1)
+
+    def test_unknown_place_is_cached_for_negative_ttl(self):
+        self.assertIsNone(self.cache.lookup(UNKNOWN, self.geocode))
+        self.assertIsNone(self.cache.lookup(UNKNOWN, self.geocode))
+        self.assertEqual(len(self.geocode.calls), 1)
+
+        # Past the negative TTL, though well within the TTL of found places
+        self.age(UNKNOWN, 120)
+        self.assertIsNone(self.cache.lookup(UNKNOWN, self.geocode))
+        self.assertEqual(len(self.geocode.calls), 2)
+
+    def test_found_place_outlives_negative_ttl(self):
+        self.cache.lookup("othertown", self.geocode)
+        self.age("othertown", 120)
+
+        self.cache.lookup("othertown", self.geocode)
+        self.assertEqual(len(self.geocode.calls), 1)
+
+    def test_errors_are_not_cached(self):
+        for i in range(2):
+            self.assertRaises(Exception, self.cache.lookup, FAILING, self.geocode)
+
+        self.assertEqual(len(self.geocode.calls), 2)
+        self.assertIsNone(GeocodedPlace.objects(name=FAILING).first())
+
+    def test_database_tier_shared_between_processes(self):
+        self.cache.lookup("othertown", self.geocode)
+
+        # A second process starts with an empty in-process tier
+        other = GeocodeCache(10, ttl=3600, negative_ttl=60)
+        place = other.lookup("Othertown", self.geocode)
+
+        self.assertEqual(place, PLACES["othertown"])
+        self.assertEqual(len(self.geocode.calls), 1)
+        self.assertEqual(other.metrics()["db_hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Checks the hot Tweet queries are served by the indexes declared on app.models.Tweet rather than collection scans,
+and the cache collections expire their entries.
+Runs against the test database (see tests/__init__.py), using: python -m pytest tests
+"""
+
+from app import helper
+from app.models import Tweet, CachedSentiment, GeocodedPlace
+from datetime import datetime, timedelta
+import config
+import unittest
+
+
+KEYWORD = "__test__indexes"
+LOCATION = "Test Location"
+
+KEYWORD_LOCATION_TIME = "keyword_search_term_1_location_address_1_tweet_time_1"
+KEYWORD_TIME = "keyword_search_term_1_tweet_time_1"
+KEYWORD_SENTIMENT = "keyword_search_term_1_sentiment_type_1"
+TWEET_TIME = "tweet_time_1"
+
+
+def winning_plan(explain):
+    """
+    :param explain: Output of a cursor's explain(), in the MongoDB 2.6 or 3.0+ format
+    :return: Tuple with whether the plan scans the collection and the set of index names it uses
+    """
+
+    # MongoDB 2.6: "BasicCursor" for a collection scan, "BtreeCursor <index name>" for an index scan
+    if "cursor" in explain:
+        cursor = explain["cursor"]
+        if cursor.startswith("BtreeCursor"):
+            return False, set([cursor.split()[1]])
+        return True, set()
+
+    # MongoDB 3.0+: tree of plan stages
+    collscan = False
+    indexes = set()
+    stages = [explain["queryPlanner"]["winningPlan"]]
+    while stages:
+        stage = stages.pop()
+        if stage.get("stage") == "COLLSCAN":
+            collscan = True
+        if "indexName" in stage:
+            indexes.add(stage["indexName"])
+        if "inputStage" in stage:
+            stages.append(stage["inputStage"])
+        stages.extend(stage.get("inputStages", []))
+
+    return collscan, indexes
+
+
+class TweetIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Tweet.ensure_indexes()
+        now = datetime.utcnow()
+        Tweet._get_collection().insert([{
+            "tweet_id": -1 - n,
+            "tweet_time": now - timedelta(hours=n),
+            "keyword_search_term": KEYWORD,
+            "location_address": LOCATION if n % 2 else None,
+            "sentiment_type": ("positive", "neutral", "negative")[n % 3],
+            "sentiment_score": 0.0,
+            "stored_at": now
+        } for n in range(30)])
+
+    @classmethod
+    def tearDownClass(cls):
+        Tweet._get_collection().remove({"keyword_search_term": KEYWORD})
+
+    def explain(self, query, sort=None):
+        cursor = Tweet._get_collection().find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        return winning_plan(cursor.explain())
+
+    def assertUsesIndex(self, query, *candidates):
+        collscan, indexes = self.explain(query)
+        self.assertFalse(collscan, "%s scans the collection" % query)
+        self.assertTrue(indexes & set(candidates), "%s uses %s" % (query, indexes))
+
+    def test_keyword_match(self):
+        # count_tweets and get_historical_groups without a location, the compound indexes start with the keyword
+        self.assertUsesIndex(helper.search_match(KEYWORD), KEYWORD_LOCATION_TIME, KEYWORD_TIME, KEYWORD_SENTIMENT)
+
+    def test_keyword_location_match(self):
+        # count_tweets and get_historical_groups with a location
+        self.assertUsesIndex(helper.search_match(KEYWORD, LOCATION), KEYWORD_LOCATION_TIME)
+
+    def test_keyword_time_range(self):
+        # Raw Tweet sentiment series
+        match = helper.search_match(KEYWORD, LOCATION)
+        match["tweet_time"] = {"$gte": datetime.utcnow() - timedelta(days=1)}
+        self.assertUsesIndex(match, KEYWORD_LOCATION_TIME)
+
+    def test_keyword_only_time_range(self):
+        # Raw Tweet sentiment series of keyword-only searches, the range must bound the index scan
+        match = helper.search_match(KEYWORD)
+        match["tweet_time"] = {"$gte": datetime.utcnow() - timedelta(days=1)}
+        self.assertUsesIndex(match, KEYWORD_TIME)
+
+    def test_keyword_sentiment(self):
+        self.assertUsesIndex({"keyword_search_term": KEYWORD, "sentiment_type": "positive"}, KEYWORD_SENTIMENT)
+
+    def test_time_range(self):
+        self.assertUsesIndex({"tweet_time": {"$gte": datetime.utcnow() - timedelta(days=7)}}, TWEET_TIME)
+
+    def test_search_results(self):
+        # views.query_results sorts by time stored, either the keyword or the stored_at index may serve it
+        query = {"keyword_search_term": KEYWORD, "location_address": LOCATION}
+        collscan, indexes = self.explain(query, [("stored_at", -1), ("tweet_time", -1)])
+        self.assertFalse(collscan)
+        self.assertTrue(indexes)
+
+
+class CacheIndexTest(unittest.TestCase):
+
+    def assertExpires(self, model, ttl):
+        model.ensure_indexes()
+        indexes = model._get_collection().index_information()
+        expiring = [index for index in indexes.values() if index["key"] == [("stored_at", 1)]]
+        self.assertEqual([index.get("expireAfterSeconds") for index in expiring], [ttl])
+
+    def test_sentiment_cache_expires(self):
+        self.assertExpires(CachedSentiment, config.SENTIMENT_CACHE_TTL)
+
+    def test_geocode_cache_expires(self):
+        self.assertExpires(GeocodedPlace, max(config.GEOCODE_CACHE_TTL, config.GEOCODE_NEGATIVE_TTL))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Checks search job claiming, failure handling and the job pages.
+Runs against the test database (see tests/__init__.py), using: python -m pytest tests
+"""
+
+from app import app, jobs, manager
+from app.models import SearchJob, Tweet
+from datetime import datetime, timedelta
+from unittest import mock
+import config
+import unittest
+
+
+KEYWORD = "__test__jobs"
+TWEET_ID = -900
+
+
+class SearchJobTest(unittest.TestCase):
+
+    def setUp(self):
+        SearchJob._get_collection().remove({"keyword": KEYWORD})
+        self.addCleanup(SearchJob._get_collection().remove, {"keyword": KEYWORD})
+        self.addCleanup(Tweet._get_collection().remove, {"keyword_search_term": KEYWORD})
+        self.client = app.test_client()
+
+    def claim_own_job(self):
+        # Only ever claim this test's jobs, whatever else is queued
+        collection = SearchJob._get_collection()
+        find_and_modify = collection.find_and_modify
+
+        def scoped(query, **kwargs):
+            return find_and_modify(query={"$and": [query, {"keyword": KEYWORD}]}, **kwargs)
+
+        with mock.patch.object(collection, 'find_and_modify', scoped):
+            return jobs.claim_job()
+
+    def search(self, count):
+        response = self.client.post("/search", data={"keyword": KEYWORD, "count": str(count), "location": ""})
+        self.assertEqual(response.status_code, 302)
+        return SearchJob.objects(keyword=KEYWORD).first()
+
+    def test_job_mode_allows_longer_searches(self):
+        with mock.patch.object(config, 'SEARCH_JOB_MODE', True), \
+                mock.patch.object(config, 'TWEET_SEARCH_LIMIT_MAX', 100), \
+                mock.patch.object(config, 'TWEET_SEARCH_LIMIT_MAX_JOB', 1000):
+            self.assertEqual(self.search(500).count, 500)
+
+    def test_job_mode_limit_applies(self):
+        with mock.patch.object(config, 'SEARCH_JOB_MODE', True), \
+                mock.patch.object(config, 'TWEET_SEARCH_LIMIT_MAX_JOB', 1000):
+            self.assertEqual(self.search(5000).count, 1000)
+
+    def test_malformed_job_id(self):
+        for url in ("/search/job/not-an-id", "/search/job/not-an-id/status", "/search/job/not-an-id/results"):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_heartbeat_keeps_job_claimed(self):
+        job = SearchJob(keyword=KEYWORD, count=10).save()
+        stale = datetime.utcnow() - timedelta(seconds=config.JOB_TIMEOUT * 2)
+        SearchJob.objects(id=job.id).update_one(set__status="running", set__started_at=stale,
+                                                set__heartbeat_at=datetime.utcnow())
+
+        self.assertIsNone(self.claim_own_job())
+
+    def test_abandoned_job_is_reclaimed(self):
+        job = SearchJob(keyword=KEYWORD, count=10).save()
+        stale = datetime.utcnow() - timedelta(seconds=config.JOB_TIMEOUT * 2)
+        SearchJob.objects(id=job.id).update_one(set__status="running", set__started_at=stale,
+                                                set__heartbeat_at=stale)
+
+        self.assertEqual(self.claim_own_job().id, job.id)
+
+    def test_failure_after_saved_batch_completes(self):
+        job = SearchJob(keyword=KEYWORD, count=10).save()
+
+        def run_search(keyword, count, location, location_search_term, progress):
+            Tweet._get_collection().insert({"tweet_id": TWEET_ID, "keyword_search_term": KEYWORD,
+                                            "tweet_text": "saved before the failure", "tweet_time": datetime.utcnow()})
+            progress(1, 10, [TWEET_ID])
+            raise Exception("Search failed")
+
+        with mock.patch.object(manager, 'run_search', run_search):
+            jobs.run_job(job)
+
+        job.reload()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.tweet_ids, [TWEET_ID])
+
+        status = self.client.get("/search/job/%s/status" % job.id)
+        self.assertEqual(status.status_code, 200)
+        self.assertIn("saved before the failure", status.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
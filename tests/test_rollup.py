@@ -0,0 +1,73 @@
+"""
+Checks rollup reconciliation against the raw Tweets.
+Runs against the test database (see tests/__init__.py), using: python -m pytest tests
+"""
+
+from app import rollup
+from app.models import Tweet, SentimentRollup
+from datetime import datetime
+from unittest import mock
+import unittest
+
+
+KEYWORD = "__test__rollup"
+DAY = datetime(2026, 10, 1)
+
+
+def raw_tweet(n, score):
+    return {"tweet_id": -2000 - n, "keyword_search_term": KEYWORD, "location_address": None,
+            "tweet_time": DAY.replace(hour=n), "sentiment_type": "positive", "sentiment_score": score}
+
+
+class ReconcileRollupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(self.cleanup)
+        self.cleanup()
+
+    def cleanup(self):
+        Tweet._get_collection().remove({"keyword_search_term": KEYWORD})
+        SentimentRollup._get_collection().remove({"keyword_search_term": KEYWORD})
+
+    def rollup(self, day=DAY):
+        return SentimentRollup._get_collection().find_one(rollup.rollup_key(KEYWORD, None, day))
+
+    def test_missing_rollup_is_added(self):
+        Tweet._get_collection().insert([raw_tweet(1, 20.0), raw_tweet(2, 40.0)])
+
+        rollup.reconcile_rollups()
+
+        self.assertEqual((self.rollup()['count'], self.rollup()['total_score']), (2, 60.0))
+
+    def test_rollup_without_tweets_is_deleted(self):
+        empty_day = datetime(2026, 9, 1)
+        SentimentRollup._get_collection().insert(dict(rollup.rollup_key(KEYWORD, None, empty_day), count=0,
+                                                      total_score=0.0, positive=0, neutral=0, negative=0))
+
+        rollup.reconcile_rollups()
+
+        self.assertIsNone(self.rollup(empty_day))
+        self.assertFalse([m for m in rollup.check_rollups() if m[0][0] == KEYWORD])
+
+    def test_rollup_updated_during_aggregation_is_skipped(self):
+        Tweet._get_collection().insert([raw_tweet(1, 20.0)])
+        aggregate_raw = rollup.aggregate_raw
+
+        def aggregate_then_save():
+            # A Tweet saved and rolled up after the aggregation read the raw Tweets
+            result = aggregate_raw()
+            Tweet._get_collection().insert([raw_tweet(2, 40.0)])
+            rollup.update_rollups([Tweet._from_son(raw_tweet(2, 40.0))])
+            return result
+
+        with mock.patch.object(rollup, 'aggregate_raw', aggregate_then_save):
+            rollup.reconcile_rollups()
+
+        # Left for the next pass rather than corrected by a negative increment
+        self.assertEqual(self.rollup()['count'], 1)
+        rollup.reconcile_rollups()
+        self.assertEqual(self.rollup()['count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
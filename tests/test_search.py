@@ -0,0 +1,128 @@
+"""
+Checks paginated Twitter searches against canned search responses, and the page prefetcher.
+Runs with the application configured in config.py and the test database, using: python -m pytest tests
+"""
+
+from app import manager
+from unittest import mock
+import threading
+import unittest
+
+
+def status(tweet_id):
+    return {"id": tweet_id, "text": "status %d" % tweet_id, "created_at": "Mon Oct 12 10:00:00 +0000 2026",
+            "user": {"screen_name": "searcher", "name": "Searcher", "profile_image_url": "http://example.com/s.png"}}
+
+
+def page(ids, more):
+    metadata = {"next_results": "?max_id=%d" % (min(ids) - 1)} if more else {}
+    return {"statuses": [status(i) for i in ids], "search_metadata": metadata}
+
+
+class SearchPagesTest(unittest.TestCase):
+
+    def search(self, responses, count=10):
+        requests = []
+
+        def request(endpoint, method, **params):
+            requests.append(params)
+            return responses[len(requests) - 1]
+
+        with mock.patch.object(manager, 'get_high_water_mark', return_value=None), \
+                mock.patch.object(manager, 'acquire_quota'), \
+                mock.patch.object(manager, 'existing_tweet_ids', return_value=set()), \
+                mock.patch.object(manager.twitter_pool, 'request', request), \
+                mock.patch.object(manager.config, 'TWEET_SEARCH_PAGE_SIZE', 4):
+            pages = list(manager.search_pages("keyword", count))
+
+        return pages, requests
+
+    def test_short_page_continues(self):
+        # Twitter may return fewer statuses than asked for before the last page
+        pages, requests = self.search([page([10, 9], True), page([8, 7, 6, 5], True), page([4], False)])
+
+        self.assertEqual([[tweet['tweet_id'] for tweet in tweets] for tweets in pages], [[10, 9], [8, 7, 6, 5], [4]])
+        self.assertEqual(requests[1]["max_id"], 8)
+
+    def test_stops_without_next_results(self):
+        pages, requests = self.search([page([10, 9, 8, 7], False)])
+
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(len(requests), 1)
+
+    def test_stops_on_empty_page(self):
+        pages, requests = self.search([page([10, 9, 8, 7], True), {"statuses": [], "search_metadata": {}}])
+
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(len(requests), 2)
+
+
+class SearchStatsTest(unittest.TestCase):
+
+    def stats(self, *pages):
+        stats = manager.SearchStats(10)
+        for ids in pages:
+            stats.add_page([status(i) for i in ids])
+        return stats
+
+    def test_high_water_id_all_saved(self):
+        self.assertEqual(self.stats([10, 9], [8]).high_water_id(set([10, 9, 8])), 10)
+
+    def test_high_water_id_stops_before_failed(self):
+        self.assertEqual(self.stats([10, 9], [8]).high_water_id(set([10, 8])), 8)
+
+    def test_high_water_id_nothing_saved(self):
+        self.assertIsNone(self.stats([10, 9]).high_water_id(set()))
+
+    def test_counts_requests(self):
+        stats = self.stats([10, 9], [8])
+        self.assertEqual((stats.fetched, stats.requests), (3, 2))
+
+    def test_full_search_saves_nothing(self):
+        stats = self.stats([10, 9], [8])
+        self.assertEqual(stats.not_refetched, 0)
+
+    def test_incremental_search_reports_savings(self):
+        stats = manager.SearchStats(10)
+        stats.since_id = 7
+        stats.add_page([status(10), status(9)], 1000)
+
+        self.assertEqual(stats.not_refetched, 8)
+        self.assertEqual(stats.bytes_saved, 4000)
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def test_yields_pages_in_order(self):
+        self.assertEqual(list(manager.prefetch(iter(range(5)))), list(range(5)))
+
+    def test_reraises_producer_error(self):
+        def pages():
+            yield 1
+            raise Exception("No Twitter results returned")
+
+        with self.assertRaises(Exception):
+            list(manager.prefetch(pages()))
+
+    def test_producer_stops_when_consumer_raises(self):
+        closed = threading.Event()
+
+        def pages():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.set()
+
+        def consume():
+            for page in manager.prefetch(pages()):
+                raise ValueError("Analysis failed")
+
+        with self.assertRaises(ValueError):
+            consume()
+
+        self.assertTrue(closed.wait(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Checks the search form redirects to the results URL, and the results page cache's ETags and invalidation.
+Runs against the test database (see tests/__init__.py), using: python -m pytest tests
+"""
+
+from app import app, manager, response_cache
+from app.models import SearchState
+from collections import namedtuple
+from unittest import mock
+import config
+import unittest
+
+
+KEYWORD = "__test__cache"
+LOCATION = "Test Location"
+
+Record = namedtuple("Record", ["keyword_search_term", "location_address"])
+
+
+class SearchCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        SearchState._get_collection().remove({"keyword_search_term": KEYWORD})
+        self.addCleanup(SearchState._get_collection().remove, {"keyword_search_term": KEYWORD})
+        patch = mock.patch.object(config, 'SEARCH_JOB_MODE', False)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.client = app.test_client()
+
+    def cache_page(self):
+        key = (KEYWORD, None, 10)
+        return response_cache.set(key, "<html>cached</html>", KEYWORD, None, response_cache.generation(KEYWORD))
+
+    def test_post_redirects_to_results_url(self):
+        response = self.client.post("/search", data={"keyword": KEYWORD, "count": "10", "location": ""})
+
+        self.assertEqual(response.status_code, 303)
+        self.assertIn("/search?", response.headers["Location"])
+        self.assertIn("count=10", response.headers["Location"])
+
+    def test_get_serves_cached_page_with_etag(self):
+        etag = self.cache_page()
+
+        with mock.patch.object(manager, 'run_search') as run_search:
+            response = self.client.get("/search?keyword=%s&count=10&location=" % KEYWORD)
+            revalidated = self.client.get("/search?keyword=%s&count=10&location=" % KEYWORD,
+                                          headers={"If-None-Match": '"%s"' % etag})
+
+        self.assertFalse(run_search.called)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_conditional_post_fails_precondition(self):
+        etag = self.cache_page()
+
+        response = self.client.post("/search", data={"keyword": KEYWORD, "count": "10", "location": ""},
+                                    headers={"If-None-Match": '"%s"' % etag})
+
+        self.assertEqual(response.status_code, 412)
+
+    def test_location_results_invalidate_keyword_pages(self):
+        self.cache_page()
+
+        manager.bump_generations([Record(KEYWORD, LOCATION)])
+
+        self.assertIsNone(response_cache.get((KEYWORD, None, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
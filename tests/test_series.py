@@ -0,0 +1,27 @@
+"""
+Checks the charted sentiment series.
+Run using: python -m pytest tests
+"""
+
+from app.series import series_averages, chart_points
+from datetime import datetime
+import unittest
+
+
+class SeriesAveragesTest(unittest.TestCase):
+
+    def test_empty_buckets_are_gaps(self):
+        series = [(datetime(2026, 10, 1), 2, 50.0), (datetime(2026, 10, 2), 0, 0.0), (datetime(2026, 10, 3), 1, 10.0)]
+
+        self.assertEqual(series_averages(series, "day"),
+                         [["2026-10-01", "25.00"], ["2026-10-02", None], ["2026-10-03", "10.00"]])
+
+    def test_chart_skips_empty_buckets(self):
+        averages = [["2026-10-01", "25.00"], ["2026-10-02", None], ["2026-10-03", "10.00"]]
+
+        self.assertEqual(chart_points(averages), [["2026-10-01", "25.00"], ["2026-10-03", "10.00"]])
+        self.assertEqual(chart_points([["2026-10-01", None], ["2026-10-02", None]]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Drives the streaming ingestion pipeline with the recorded stream in tests/data/stream.jsonl.
+Runs against the test database (see tests/__init__.py), using: python -m pytest tests
+"""
+
+from app import manager, stream
+from app.cache import SentimentCache
+from app.models import Tweet, SentimentRollup, SearchState, StreamCheckpoint
+from unittest import mock
+import config
+import json
+import os
+import unittest
+
+
+KEYWORD = "teststreamword"
+CHECKPOINT = "__test__stream"
+RECORDING = os.path.join(os.path.dirname(__file__), "data", "stream.jsonl")
+
+# Ids of the English statuses in the recording, and of those mentioning the keyword as a whole word
+BASE_ID = 8 * 10 ** 18
+ENGLISH_IDS = [BASE_ID + 1, BASE_ID + 2, BASE_ID + 4, BASE_ID + 5, BASE_ID + 6]
+MATCHING_IDS = [BASE_ID + 1, BASE_ID + 2, BASE_ID + 5]
+
+
+def cleanup():
+    """
+    Removes everything stored by a replay.
+    """
+
+    Tweet._get_collection().remove({'keyword_search_term': KEYWORD})
+    SentimentRollup._get_collection().remove({'keyword_search_term': KEYWORD})
+    SearchState._get_collection().remove({'keyword_search_term': KEYWORD})
+    StreamCheckpoint._get_collection().remove({'name': CHECKPOINT})
+
+
+class StreamReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        cleanup()
+        patches = [
+            # Analyze locally, with a cache of our own, and flush batches without waiting
+            mock.patch.object(manager, 'backend', manager.LexiconBackend()),
+            mock.patch.object(manager, 'sentiment_cache', SentimentCache(100, 60, "__test__stream")),
+            mock.patch.object(config, 'STREAM_FLUSH_INTERVAL', 0.1)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(cleanup)
+
+    def replay(self):
+        stream.replay(RECORDING, stream.StreamPipeline([KEYWORD], {}, CHECKPOINT))
+        return StreamCheckpoint.objects(name=CHECKPOINT).first()
+
+    def stored_ids(self):
+        return sorted(tweet['tweet_id'] for tweet in Tweet._get_collection().find({'keyword_search_term': KEYWORD}))
+
+    def test_replay_saves_matching_statuses(self):
+        checkpoint = self.replay()
+
+        self.assertEqual(self.stored_ids(), MATCHING_IDS)
+        self.assertEqual(checkpoint.last_tweet_id, max(ENGLISH_IDS))
+        self.assertEqual(checkpoint.processed, len(ENGLISH_IDS))
+        self.assertEqual(checkpoint.saved, len(MATCHING_IDS))
+
+    def test_replay_again_saves_nothing(self):
+        self.replay()
+        checkpoint = self.replay()
+
+        self.assertEqual(self.stored_ids(), MATCHING_IDS)
+        self.assertEqual(checkpoint.processed, len(ENGLISH_IDS))
+        self.assertEqual(checkpoint.saved, len(MATCHING_IDS))
+
+    def test_replay_resumes_after_checkpoint(self):
+        StreamCheckpoint(name=CHECKPOINT, last_tweet_id=BASE_ID + 2).save()
+        checkpoint = self.replay()
+
+        self.assertEqual(self.stored_ids(), [BASE_ID + 5])
+        self.assertEqual(checkpoint.last_tweet_id, max(ENGLISH_IDS))
+
+    def test_out_of_order_statuses_saved(self):
+        with open(RECORDING) as f:
+            statuses = dict((status['id'], status) for status in map(json.loads, f) if 'id' in status)
+
+        pipeline = stream.StreamPipeline([KEYWORD], {}, CHECKPOINT)
+        pipeline.process([statuses[BASE_ID + 5]])
+        # Posted earlier, but delivered in the next batch
+        pipeline.process([statuses[BASE_ID + 2]])
+
+        self.assertEqual(self.stored_ids(), [BASE_ID + 2, BASE_ID + 5])
+
+
+class StreamConfigTest(unittest.TestCase):
+
+    def test_tracked_lists_lowercased(self):
+        with mock.patch.object(config, 'STREAM_TRACK_KEYWORDS', ["TestStreamWord"]), \
+                mock.patch.object(config, 'STREAM_TRACK_LOCATIONS', ["London"]):
+            self.assertTrue(manager.is_tracked(KEYWORD))
+            self.assertTrue(manager.is_tracked(KEYWORD, "london"))
+            self.assertFalse(manager.is_tracked(KEYWORD, "paris"))
+
+    def test_keywords_match_whole_words(self):
+        words = set(stream.WORD.findall("category news from my #cat"))
+        self.assertTrue(stream.mentions("cat", words))
+        self.assertFalse(stream.mentions("dog", words))
+        self.assertFalse(stream.mentions("categories", words))
+        self.assertTrue(stream.mentions("news category", words))
+
+    def test_tracked_search_needs_live_stream(self):
+        with mock.patch.object(config, 'STREAM_TRACK_KEYWORDS', [KEYWORD]), \
+                mock.patch.object(manager, 'has_stored_tweets', return_value=True), \
+                mock.patch.object(manager, 'is_stream_live', return_value=False), \
+                mock.patch.object(manager, 'search_pages', return_value=iter([])) as search_pages, \
+                mock.patch.object(manager, 'existing_tweet_ids', return_value=set()):
+            manager.run_search(KEYWORD, 10)
+
+        self.assertTrue(search_pages.called)
+
+    def test_run_refuses_without_keywords(self):
+        with mock.patch.object(config, 'STREAM_TRACK_KEYWORDS', []), \
+                mock.patch.object(stream, 'create_pipeline') as create_pipeline:
+            stream.run()
+            self.assertFalse(create_pipeline.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
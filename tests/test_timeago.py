@@ -0,0 +1,85 @@
+"""
+Checks the one pass 'ago' labels give the same strings as the per-Tweet SimpleDate conversion they replaced,
+including around the UK daylight saving transitions.
+Runs using: python -m pytest tests
+"""
+
+from app import timeago
+from datetime import datetime, timedelta
+from unittest import mock
+import pytz
+import unittest
+
+
+def old_calc_time_ago(tweet_time, now=None, heroku_mode=False):
+    """
+    The 'Tweet.calc_time_ago' implementation replaced by app.timeago, kept as the reference its labels must match.
+
+    :param tweet_time: Naive UTC datetime
+    :param now: Local time to measure from (optional, defaults to the current time as before)
+    :param heroku_mode: Value of config.HEROKU_MODE to convert with
+    :return: The time in human readable format to a single precision, eg "2 hours ago"
+    """
+
+    from simpledate import SimpleDate
+    from ago import human
+
+    # Localize time to UTC using pytz
+    tm = pytz.utc.localize(tweet_time)
+
+    if heroku_mode:
+        tm = str(tm)
+        tm = tm.split("+")
+    else:
+        # Convert to BST time using SimpleDate and remove microseconds
+        tm = str(SimpleDate(tm).convert(country='GB'))
+        tm = tm.split('.')
+
+    # Convert to datetime object
+    tm = datetime.strptime(tm[0], '%Y-%m-%d %H:%M:%S')
+
+    return human(tm if now is None else now - tm, 1)
+
+
+def times_around(start, hours, step):
+    """
+    :return: Naive UTC datetimes from start for the given number of hours, 'step' apart, with microseconds
+    """
+
+    count = int(timedelta(hours=hours) / step)
+    return [start + step * n + timedelta(microseconds=n * 7919 % 10 ** 6) for n in range(count)]
+
+
+class TimeAgoTest(unittest.TestCase):
+
+    def assertLabelsMatch(self, times, now, heroku_mode=False):
+        with mock.patch.object(timeago, 'HEROKU_MODE', heroku_mode):
+            labels = timeago.time_ago_labels(times, now)
+        self.assertEqual(labels, [old_calc_time_ago(tm, now, heroku_mode) for tm in times])
+
+    def test_labels_match_old_path(self):
+        now = datetime(2014, 7, 1, 12, 0, 0)
+        times = [now - timedelta(seconds=seconds) for seconds in
+                 (5, 59, 61, 3599, 3601, 7200, 86399, 86401, 86400 * 9, 86400 * 400)]
+
+        self.assertLabelsMatch(times, now)
+        self.assertLabelsMatch(times, now, heroku_mode=True)
+
+    def test_labels_match_around_spring_transition(self):
+        # UK clocks went forward at 01:00 UTC on 30 March 2014
+        times = times_around(datetime(2014, 3, 29, 23, 0), 4, timedelta(minutes=7, seconds=13))
+        self.assertLabelsMatch(times, datetime(2014, 3, 30, 6, 0, 0))
+
+    def test_labels_match_around_autumn_transition(self):
+        # UK clocks went back at 01:00 UTC on 26 October 2014
+        times = times_around(datetime(2014, 10, 25, 23, 0), 4, timedelta(minutes=7, seconds=13))
+        self.assertLabelsMatch(times, datetime(2014, 10, 26, 6, 0, 0))
+
+    def test_single_row_wrapper_matches(self):
+        tweet_time = datetime.utcnow() - timedelta(hours=3)
+        with mock.patch.object(timeago, 'HEROKU_MODE', False):
+            self.assertEqual(timeago.time_ago_labels([tweet_time])[0], old_calc_time_ago(tweet_time))
+
+
+if __name__ == '__main__':
+    unittest.main()
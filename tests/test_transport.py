@@ -0,0 +1,109 @@
+"""
+Tests of the HTTP transport's retries, timeouts and latency histograms against a local fake AlchemyAPI server
+which injects latency and errors.
+Run using: python -m pytest tests
+"""
+
+from app.transport import HTTPTransport, CallRejected
+from requests.exceptions import Timeout
+from tests.fake_alchemy import FakeAlchemyServer
+import time
+import unittest
+
+
+ENDPOINT = "/text/TextGetTextSentiment"
+
+
+def post(transport, server):
+    return transport.post(ENDPOINT, server.base_url + ENDPOINT + "?apikey=test&outputMode=json", {"text": "good"})
+
+
+class HTTPTransportTest(unittest.TestCase):
+
+    def test_retries_server_errors(self):
+        transport = HTTPTransport(timeout=5, retries=3, backoff=0.01)
+
+        with FakeAlchemyServer(errors=[503, 500]) as server:
+            response = post(transport, server)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.total_requests(), 3)
+        self.assertEqual(transport.metrics()["retried"], 2)
+
+    def test_retries_rate_limit_responses(self):
+        transport = HTTPTransport(timeout=5, retries=1, backoff=0.01)
+
+        with FakeAlchemyServer(errors=[429]) as server:
+            response = post(transport, server)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_gives_up_after_retries(self):
+        transport = HTTPTransport(timeout=5, retries=2, backoff=0.01)
+
+        with FakeAlchemyServer(errors=[500] * 5) as server:
+            response = post(transport, server)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(server.total_requests(), 3)
+
+    def test_client_errors_are_not_retried(self):
+        transport = HTTPTransport(timeout=5, retries=3, backoff=0.01)
+
+        with FakeAlchemyServer(errors=[400]) as server:
+            response = post(transport, server)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(server.total_requests(), 1)
+
+    def test_read_timeout(self):
+        transport = HTTPTransport(timeout=0.1, retries=0)
+
+        with FakeAlchemyServer(latency=1) as server:
+            self.assertRaises(Timeout, post, transport, server)
+
+    def test_deadline_bounds_retries(self):
+        transport = HTTPTransport(timeout=0.2, retries=10, backoff=0.05, deadline=0.6)
+
+        with FakeAlchemyServer(hang=20) as server:
+            start = time.time()
+            self.assertRaises(Timeout, post, transport, server)
+            elapsed = time.time() - start
+
+        self.assertLess(elapsed, 1.5)
+        self.assertLess(server.total_requests(), 11)
+
+    def test_meter_sees_every_attempt(self):
+        metered = []
+        transport = HTTPTransport(timeout=5, retries=3, backoff=0.01, meter=metered.append)
+
+        with FakeAlchemyServer(errors=[503, 500]) as server:
+            post(transport, server)
+
+        self.assertEqual(metered, [ENDPOINT] * 3)
+
+    def test_meter_rejects_before_sending(self):
+        def meter(endpoint):
+            raise CallRejected("AlchemyAPI rate limit")
+
+        transport = HTTPTransport(timeout=5, meter=meter)
+
+        with FakeAlchemyServer() as server:
+            self.assertRaises(CallRejected, post, transport, server)
+
+        self.assertEqual(server.total_requests(), 0)
+
+    def test_latency_histogram(self):
+        transport = HTTPTransport(timeout=5)
+
+        with FakeAlchemyServer(latency=0.3) as server:
+            post(transport, server)
+            post(transport, server)
+
+        histogram = transport.metrics()["latency"][ENDPOINT]
+        self.assertEqual(sum(histogram.values()), 2)
+        self.assertEqual(histogram["<=0.5s"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
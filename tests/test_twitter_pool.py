@@ -0,0 +1,101 @@
+"""
+Checks the Twitter client pool's rate limit tracking and response sizes against a local stand-in for the Twitter search API.
+Runs using: python -m pytest tests
+"""
+
+from app.twitter_pool import TwitterPool
+from tests.fake_twitter import FakeTwitterServer
+from twython import Twython
+import json
+import time
+import unittest
+
+
+RESOURCE = "search/tweets"
+
+
+def stand_in_factory(server):
+    """
+    :param server: Running FakeTwitterServer
+    :return: Function creating Twython clients which send their requests to the stand-in
+    """
+
+    def factory():
+        client = Twython("key", "secret", "token", "token_secret")
+        client.api_url = server.api_url
+        return client
+
+    return factory
+
+
+class TwitterPoolTest(unittest.TestCase):
+
+    def pool(self, server, size=2):
+        return TwitterPool(size, stand_in_factory(server))
+
+    def test_tracks_rate_limit_headers(self):
+        with FakeTwitterServer(limit=5) as server:
+            pool = self.pool(server)
+            self.assertIsNone(pool.remaining(RESOURCE))
+
+            result = pool.request(RESOURCE, "search", q="test", count=15)
+
+        self.assertEqual(len(result["statuses"]), 15)
+        self.assertEqual(pool.remaining(RESOURCE), 4)
+        self.assertEqual(pool.metrics()["rate_limits"][RESOURCE],
+                         {"limit": 5, "remaining": 4, "reset": float(server.reset)})
+
+    def test_rejects_locally_once_window_exhausted(self):
+        with FakeTwitterServer(limit=2) as server:
+            pool = self.pool(server)
+            for i in range(2):
+                pool.request(RESOURCE, "search", q="test")
+
+            self.assertRaises(Exception, pool.request, RESOURCE, "search", q="test")
+
+        # The third call never reached Twitter
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(pool.metrics()["rejected"], 1)
+
+    def test_window_reset_allows_calls(self):
+        with FakeTwitterServer(limit=1) as server:
+            pool = self.pool(server)
+            pool.request(RESOURCE, "search", q="test")
+            self.assertEqual(pool.remaining(RESOURCE), 0)
+
+            # Once Twitter's reset time has passed, the exhausted window no longer applies
+            pool.limits[RESOURCE]["reset"] = time.time() - 1
+            self.assertIsNone(pool.remaining(RESOURCE))
+
+    def test_rate_limit_error_blocks_until_reset(self):
+        with FakeTwitterServer(limit=0) as server:
+            pool = self.pool(server)
+            self.assertRaises(Exception, pool.request, RESOURCE, "search", q="test")
+            self.assertRaises(Exception, pool.request, RESOURCE, "search", q="test")
+
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(pool.remaining(RESOURCE), 0)
+        self.assertEqual(pool.limits[RESOURCE]["reset"], float(server.reset))
+
+    def test_clients_reused(self):
+        with FakeTwitterServer() as server:
+            pool = self.pool(server)
+            for i in range(3):
+                pool.request(RESOURCE, "search", q="test")
+
+        self.assertEqual(pool.metrics()["created"], 1)
+        self.assertEqual(pool.metrics()["calls"], 3)
+
+    def test_measures_response_sizes(self):
+        with FakeTwitterServer(statuses=5) as server:
+            pool = self.pool(server)
+            self.assertEqual(pool.last_response_size(), 0)
+            result = pool.request(RESOURCE, "search", q="test")
+
+        size = len(json.dumps(result).encode("utf-8"))
+        self.assertEqual(pool.last_response_size(), size)
+        self.assertEqual(pool.metrics()["received"], size)
+
+
+if __name__ == '__main__':
+    unittest.main()